@@ -122,7 +122,10 @@ setup(
     entry_points={
         "gui_scripts": ["xicam=xicam.run_xicam:main"],
         "xicam.plugins.DataHandlerPlugin": ["npy = xicam.core.formats.NPYPlugin:NPYPlugin"],
-        "databroker.ingestors": ["application/x-npy = xicam.core.formats.NPYPlugin:ingest_npy"],
+        "databroker.ingestors": ["application/x-npy = xicam.core.formats.NPYPlugin:ingest_npy",
+                                 "application/x-hdf5 = xicam.core.formats.HDF5Plugin:ingest_hdf5",
+                                 "application/x-tiff-series = xicam.core.formats.TIFFSeriesPlugin:ingest_tiff_series"],
+        "databroker.sniffers": ["application/x-hdf5 = xicam.core.formats.HDF5Plugin:sniff_hdf5"],
         "xicam.plugins.PluginType": [
             "CatalogPlugin = xicam.plugins.catalogplugin:CatalogPlugin",
             "ControllerPlugin = xicam.plugins.controllerplugin:ControllerPlugin",
@@ -160,6 +163,7 @@ setup(
             "low_band_pass = xicam.core.operations:low_band_pass",
             "inverse_fourier_transform = xicam.core.operations:inverse_fourier_transform",
             "absolute_square = xicam.core.operations:absolute_square",
+            "roi_statistics = xicam.core.operations:roi_statistics",
             "tuple_test = xicam.core.operations:tuple_test",
         ],
         "xicam.plugins.IntentCanvasPlugin": [
@@ -1,12 +1,16 @@
+from collections import defaultdict
 from pathlib import Path
 from typing import Union, List, Set
 
+import numpy as np
+
 from qtpy.QtCore import Signal, QObject
 
 from databroker.utils import ALL
 from databroker.in_memory import BlueskyInMemoryCatalog
 from warnings import warn
 
+import datetime
 import mimetypes
 import warnings
 
@@ -120,32 +124,39 @@ def load_header(uris: List[Union[str, Path]] = None, uuid: str = None):
     ingestor = None
     filename = str(Path(uris[0]))
 
-    # Sanity checks
+    # Directories are opened as a single run of their frame files
     if Path(filename).is_dir():
-        msg.logMessage("Opening dir; nothing to load.")
-        return
+        from xicam.core.data.directory import load_directory  # must be a late import
+
+        return load_directory(filename)
 
-    if not Path(filename).exists():
-        raise FileExistsError(f"Attempted to load non-existent file: {filename}")
+    # TIFF series are only opened when asked for: as a pattern (e.g. 'scan_*.tif'), or several TIFFs selected together
+    from xicam.core.formats.TIFFSeriesPlugin import is_tiff_series, TIFF_SERIES_MIMETYPE  # must be a late import
 
-    try:
-        mimetypes = detect_mimetypes(filename)
-    except UnknownFileType as ex:
-        msg.logError(ex)
-        mimetypes = []
+    if is_tiff_series(uris):
+        mimetypes = [TIFF_SERIES_MIMETYPE]
     else:
-        msg.logMessage(f"Mimetypes detected: {mimetypes}")
+        if not Path(filename).exists():
+            raise FileExistsError(f"Attempted to load non-existent file: {filename}")
 
-        # TODO: here, we try each valid mimetype; some GUI for selection will be needed
+        try:
+            mimetypes = detect_mimetypes(filename)
+        except UnknownFileType as ex:
+            msg.logError(ex)
+            mimetypes = []
+        else:
+            msg.logMessage(f"Mimetypes detected: {mimetypes}")
 
-        for mimetype in mimetypes:
-            try:
-                ingestor = choose_ingestor(filename, mimetype)
-            except NoIngestor as e:
-                pass
-            else:
-                msg.logMessage(f"Ingestor selected: {ingestor}")
-                break
+    # TODO: here, we try each valid mimetype; some GUI for selection will be needed
+
+    for mimetype in mimetypes:
+        try:
+            ingestor = choose_ingestor(filename, mimetype)
+        except NoIngestor as e:
+            pass
+        else:
+            msg.logMessage(f"Ingestor selected: {ingestor}")
+            break
 
     if ingestor:
         document = list(ingestor(uris))
@@ -173,6 +184,90 @@ def load_header(uris: List[Union[str, Path]] = None, uuid: str = None):
     #     return NonDBHeader({}, [], [], {})
 
 
+class _EventColumns(object):
+    """
+    Column-oriented storage of the events in one stream.
+
+    Each field is held as a column of values, alongside the rows (within the stream) that hold it and the per-field
+    timestamps; seq_num and time are columns shared by every row. Arrays are materialized on demand and cached until
+    the next event is appended.
+    """
+
+    def __init__(self):
+        self.positions = []  # index of each row's event document in the header's event list
+        self.seq_num = []
+        self.time = []
+        self.values = {}
+        self.rows = {}
+        self.timestamps = {}
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def fields(self):
+        return set(self.values)
+
+    def append(self, position: int, event: dict):
+        row = len(self.positions)
+        self.positions.append(position)
+        self.seq_num.append(event.get("seq_num", row + 1))
+        self.time.append(event.get("time", np.nan))
+        timestamps = event.get("timestamps") or {}
+        for field, value in event.get("data", {}).items():
+            self.values.setdefault(field, []).append(value)
+            self.rows.setdefault(field, []).append(row)
+            self.timestamps.setdefault(field, []).append(timestamps.get(field, np.nan))
+        self._arrays.clear()
+
+    def array(self, name: str, field: str = None):
+        """Return the column ``name`` (one of 'positions', 'seq_num', 'time', 'values', 'rows', 'timestamps')."""
+        key = (name, field)
+        if key not in self._arrays:
+            column = getattr(self, name)
+            if field is not None:
+                column = column[field]
+            self._arrays[key] = _as_column(column)
+        return self._arrays[key]
+
+    def select(self, fields=None):
+        """Return the rows holding any of ``fields`` (all rows if no fields are given)."""
+        if not fields:
+            return np.arange(len(self))
+        present = [self.array("rows", field) for field in fields if field in self.values]
+        if not present:
+            return np.empty(0, dtype=int)
+        if len(present) == 1:
+            return present[0]
+        return np.unique(np.concatenate(present))
+
+    def column(self, field: str, fill_value=np.nan):
+        """Return a field's values spread over all rows, with ``fill_value`` in rows that lack it."""
+        values = self.array("values", field)
+        rows = self.array("rows", field)
+        if len(rows) == len(self):
+            return values
+        if values.dtype.kind not in "fc":
+            values = values.astype(object if values.dtype.kind not in "iu" else float)
+        column = np.full(len(self), fill_value, dtype=values.dtype)
+        column[rows] = values
+        return column
+
+
+def _as_column(values: list) -> np.ndarray:
+    column = None
+    if values and np.isscalar(values[0]):
+        try:
+            column = np.asarray(values)
+        except ValueError:  # e.g. a scalar followed by an array
+            pass
+    if column is None or column.ndim != 1:
+        # Frames, lazy fields, and mixed values are held as objects, one per row
+        column = np.fromiter(values, dtype=object, count=len(values))
+    return column
+
+
 class NonDBHeader(object):
     """
     A dictionary-like object summarizing metadata for a run.
@@ -193,11 +288,33 @@ class NonDBHeader(object):
             "event": events or [],
             "stop": [stop] if stop else [],
         }
+        self._index_events()
 
     def append(self, docname, doc):
         if docname in ["start", "stop"] and self._documents[docname]:
             raise KeyError(f"A {docname} document already exists within this header.")
         self._documents[docname].append(doc)
+        if docname == "event":
+            self._index_event(len(self._documents["event"]) - 1, doc)
+        elif docname == "descriptor" and self._documents["event"]:
+            # Events may have been sorted into a stream before their descriptor arrived
+            self._index_events()
+
+    def _index_events(self):
+        self._columns = {}
+        self._stream_of_descriptor = {d.get("uid"): d.get("name", "primary") for d in self._documents["descriptor"]}
+        for position, event in enumerate(self._documents["event"]):
+            self._index_event(position, event)
+
+    def _index_event(self, position, event):
+        stream_name = self._stream_of_descriptor.get(event.get("descriptor"))
+        if stream_name is None:
+            self._stream_of_descriptor.update({d.get("uid"): d.get("name", "primary")
+                                               for d in self._documents["descriptor"]})
+            stream_name = self._stream_of_descriptor.get(event.get("descriptor"), "primary")
+        if stream_name not in self._columns:
+            self._columns[stream_name] = _EventColumns()
+        self._columns[stream_name].append(position, event)
 
     def __getitem__(self, k):
         try:
@@ -253,7 +370,7 @@ class NonDBHeader(object):
 
     @property
     def stream_names(self):
-        raise NotImplementedError
+        return list(self._columns)
 
     def fields(self, stream_name=ALL):
         """
@@ -281,7 +398,8 @@ class NonDBHeader(object):
         --------
         :meth:`Header.devices`
         """
-        return {key for event in self["eventdocs"] for key in event["data"].keys()}
+        return {field for name, columns in self._columns.items() if stream_name in (ALL, name)
+                for field in columns.fields}
 
     def devices(self, stream_name=ALL):
         """
@@ -482,7 +600,38 @@ class NonDBHeader(object):
         0  2017-07-16 12:12:35.128515999         273
         1  2017-07-16 12:12:40.128515999         274
         """
-        raise NotImplementedError
+        import pandas as pd
+
+        columns = self._columns.get(stream_name, _EventColumns())
+        if fields is None:
+            fields = sorted(columns.fields)
+        if fill is True:
+            fill = set(fields)
+        fill = set(fill or ())
+
+        data = {}
+        for field in fields:
+            if field not in columns.values:
+                data[field] = np.full(len(columns), np.nan)
+                continue
+            column = columns.column(field)
+            if field in fill:
+                column = np.fromiter((_filled(value) for value in column), dtype=object, count=len(column))
+            data[field] = column
+
+        times = columns.array("time")
+        if convert_times or localize_times:
+            if times.dtype.kind in "iuf":
+                times = pd.to_datetime(times, unit="s")
+                if localize_times:
+                    tz = timezone or datetime.datetime.now().astimezone().tzinfo
+                    times = times.tz_localize("UTC").tz_convert(tz).tz_localize(None)
+            else:
+                times = pd.to_datetime(times)
+
+        table = pd.DataFrame(data, index=pd.Index(columns.array("seq_num"), name="seq_num"))
+        table.insert(0, "time", times)
+        return table
 
     def events(self, stream_name="primary", fields=None, fill=False):
         """
@@ -532,9 +681,13 @@ class NonDBHeader(object):
         # ev_gen = self.db.get_events([self], stream_name=stream_name,
         #                             fields=fields, fill=fill)
 
-        for ev in self._documents["event"]:
-            if not set(fields).isdisjoint(set(ev["data"].keys())) or not fields:
-                yield ev
+        columns = self._columns.get(stream_name)
+        if columns is None:
+            return
+        events = self._documents["event"]
+        positions = columns.array("positions")
+        for position in positions[columns.select(fields)]:
+            yield events[position]
 
     def data(self, field, stream_name="primary", fill=True):
         """
@@ -564,6 +717,12 @@ class NonDBHeader(object):
         return DocMetaArray(self, field)
 
 
+def _filled(value):
+    if hasattr(value, "asarray"):
+        return value.asarray()
+    return value
+
+
 class QNonDBHeader(QObject, NonDBHeader):
     sigChanged = Signal()
 
@@ -573,8 +732,12 @@ class QNonDBHeader(QObject, NonDBHeader):
 
 
 from functools import lru_cache, partial
+import threading
+import uuid
 import numpy as np
 from xicam.core import msg
+from xicam.core.data.cache import FrameCache, ReadAheadPrefetcher, frame_cache
+from xicam.core.data.pool import handler_pool
 
 
 class MetaXArray(object):
@@ -622,7 +785,14 @@ class MetaXArray(object):
 
 
 class DocMetaArray(object):
-    def __init__(self, header: NonDBHeader, field: str = None):
+    def __init__(self, header: NonDBHeader, field: str = None, cache: FrameCache = None, prefetch_depth: int = 8):
+        """
+        An array-like view of one field across the events of a header, loading frames as they are requested.
+
+        Decoded frames are kept in a byte-bounded LRU ``cache`` (the shared ``frame_cache`` by default), and a
+        background prefetcher reads up to ``prefetch_depth`` frames ahead in the direction frames are being accessed.
+        Set ``prefetch_depth=0`` to disable read-ahead.
+        """
         self._dtype = None
         self.header = header
         self._field = field
@@ -631,6 +801,13 @@ class DocMetaArray(object):
         self._shape = None
         self._size = None
         self._ndim = None
+        self._min = None
+        self._max = None
+        self._token = uuid.uuid4().hex
+        self._load_lock = threading.RLock()
+        self.cache = cache if cache is not None else frame_cache
+        self.prefetch_depth = prefetch_depth
+        self._prefetcher = None
 
     @property
     def events(self):
@@ -687,28 +864,55 @@ class DocMetaArray(object):
         self._field = value
 
     def min(self):
-        if not self._min:
-            # cache using slice
-            self.slice(0)
+        if self._min is None:
+            self._min = self.slice(0).min()
         return self._min
 
     def max(self):
-        if not self._max:
-            # cache using slice
-            self.slice(0)
+        if self._max is None:
+            self._max = self.slice(0).max()
         return self._max
 
+    @property
+    def prefetcher(self):
+        if self._prefetcher is None and self.prefetch_depth:
+            self._prefetcher = ReadAheadPrefetcher(
+                self._load, self._frame_key, len(self), self.cache, depth=self.prefetch_depth
+            )
+        return self._prefetcher
+
+    def _frame_key(self, i):
+        value = self.events[i]["data"][self.field]
+        if isinstance(value, lazyfield) and value.cache_key is not None:
+            # Share cache entries with the lazyfield itself, so a frame is only held once
+            return value.cache_key
+        return self._token, i
+
+    def _load(self, i):
+        with self._load_lock:
+            arr = self.events[i]["data"][self.field]
+            if isinstance(arr, lazyfield):
+                # This array's cache is the only one a frame read through it is kept in
+                arr = arr.resolve()
+            elif hasattr(arr, "asarray"):
+                arr = arr.asarray()
+            if not isinstance(arr, np.ndarray):
+                arr = np.array(arr)
+            return arr
+
     def slice(self, i):
         if not self.events:
             return None
 
-        arr = self.events[i]["data"][self.field]
-        if hasattr(arr, "asarray"):
-            arr = arr.asarray()
-        if not isinstance(arr, np.ndarray):
-            arr = np.array(arr)
-        self._min = arr.min()
-        self._max = arr.max()
+        if i < 0:
+            i += len(self)
+        key = self._frame_key(i)
+        arr = self.cache.get(key)
+        if arr is None:
+            arr = self._load(i)
+            self.cache.put(key, arr)
+        if self.prefetcher:
+            self.prefetcher.notify(i)
         return arr
 
     def __getitem__(self, item: Union[List[slice], int]):
@@ -734,25 +938,61 @@ class DocMetaArray(object):
 
 
 class lazyfield(object):
-    def __init__(self, handler_cls, resource_path, resource_kwargs):
+    def __init__(self, handler_cls, resource_path, resource_kwargs, cache: FrameCache = None):
         self.handler_cls = handler_cls
         self.resource_path = resource_path
         self.resource_kwargs = resource_kwargs
-        self._handler = None
+        self.cache = cache if cache is not None else frame_cache
+        self._cache_key = False
         super(lazyfield, self).__init__()
 
     @property
-    def handler(self):
-        if not self._handler:
-            self._handler = self.handler_cls(*self.resource_path)
-        return self._handler
+    def handler_key(self):
+        """The key this field's handler is shared under in the handler pool."""
+        return self.handler_cls, tuple(self.resource_path or ())
+
+    def _make_handler(self):
+        return self.handler_cls(*self.resource_path)
+
+    def checkout(self):
+        """
+        Check this field's (pooled) handler out; use as ``with field.checkout() as handler: ...``.
+
+        The handler is locked to the calling thread, and won't be closed, until the block exits.
+        """
+        return handler_pool.checkout(self.handler_key, self._make_handler)
+
+    @property
+    def cache_key(self):
+        """A key identifying the data this field resolves to, or None if the field can't be identified by value."""
+        if self._cache_key is False:
+            key = (self.handler_cls, tuple(self.resource_path or ()), tuple(sorted(self.resource_kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                key = None
+            self._cache_key = key
+        return self._cache_key
 
     def implements(self, t):
         if t == "MetaArray":
             return True
 
+    def resolve(self):
+        """Read this field's data from its handler, bypassing the cache."""
+        with self.checkout() as handler:
+            return handler(**self.resource_kwargs)
+
     def asarray(self):
-        return self.handler(**self.resource_kwargs)
+        key = self.cache_key
+        if key is None:
+            return self.resolve()
+
+        arr = self.cache.get(key)
+        if arr is None:
+            arr = self.resolve()
+            self.cache.put(key, arr)
+        return arr
 
 
 # TODO: Eliminate lazyfield and use only handler in doc?
@@ -0,0 +1,136 @@
+"""
+Batching of live document streams: consecutive events are packed into event_pages so that consumers (views, models)
+handle one update per page instead of one per event.
+"""
+import threading
+import time
+from typing import Callable, Generator, Iterable, Tuple
+
+import event_model
+import numpy as np
+
+from xicam.core import msg
+
+
+class EventPageBatcher(object):
+    """
+    A document callback that accumulates events into event_pages before handing them to ``callback``.
+
+    Pending events for a descriptor are packed into a page once ``max_events`` have accumulated, or ``max_latency``
+    seconds after the first of them arrived, whichever comes first; time-based flushes happen on a timer thread, so a
+    ``callback`` that touches Qt objects should hand off to the GUI thread (e.g. with ``threads.invoke_as_event``). Any
+    other document first flushes all pending events, so ``callback`` sees documents in their original order.
+    """
+
+    def __init__(self, callback: Callable[[str, dict], None], max_events: int = 1000, max_latency: float = 0.05):
+        self.callback = callback
+        self.max_events = max_events
+        self.max_latency = max_latency
+
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def __call__(self, name: str, doc: dict):
+        with self._lock:
+            if name == "event":
+                events = self._pending.setdefault(doc["descriptor"], [])
+                events.append(doc)
+                if len(events) >= self.max_events:
+                    self._flush_descriptor(doc["descriptor"])
+                elif self._timer is None and self.max_latency is not None:
+                    self._timer = threading.Timer(self.max_latency, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+
+            self.flush()
+            self._emit(name, doc)
+
+    def flush(self):
+        """Hand any pending events to the callback as event_pages."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            for descriptor in list(self._pending):
+                self._flush_descriptor(descriptor)
+
+    def _flush_descriptor(self, descriptor: str):
+        events = self._pending.pop(descriptor, None)
+        if events:
+            self._emit("event_page", event_model.pack_event_page(*events))
+
+    def _emit(self, name, doc):
+        try:
+            self.callback(name, doc)
+        except Exception as ex:
+            msg.logMessage(f"A document consumer failed to handle a {name} document.", level=msg.WARNING)
+            msg.logError(ex)
+
+
+def batch_documents(doc_stream: Iterable[Tuple[str, dict]], max_events: int = 1000) -> Generator[Tuple[str, dict], None, None]:
+    """Repack the events of a (finite, or already buffered) document stream into event_pages of up to ``max_events``."""
+    batched = []
+    batcher = EventPageBatcher(lambda name, doc: batched.append((name, doc)), max_events=max_events, max_latency=None)
+    for name, doc in doc_stream:
+        batcher(name, doc)
+        yield from batched
+        batched.clear()
+    batcher.flush()
+    yield from batched
+
+
+def simulated_documents(num_events: int = 10000, rate: float = 1000.0, shape: tuple = ()):
+    """
+    A stand-in for a live acquisition: a run with ``num_events`` events of a scalar (or ``shape``-d) detector
+    reading, emitted at ``rate`` events per second (or as fast as possible if ``rate`` is None).
+    """
+    run_bundle = event_model.compose_run(metadata={"sample_name": "simulated"})
+    yield "start", run_bundle.start_doc
+    descriptor_bundle = run_bundle.compose_descriptor(
+        data_keys={"motor": {"source": "simulated", "dtype": "number", "shape": []},
+                   "detector": {"source": "simulated", "dtype": "array" if shape else "number", "shape": list(shape)}},
+        name="primary")
+    yield "descriptor", descriptor_bundle.descriptor_doc
+
+    start = time.perf_counter()
+    for i in range(num_events):
+        if rate:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        now = time.time()
+        reading = np.random.random(shape) if shape else float(np.random.random())
+        yield "event", descriptor_bundle.compose_event(data={"motor": float(i), "detector": reading},
+                                                       timestamps={"motor": now, "detector": now})
+    yield "stop", run_bundle.compose_stop()
+
+
+def benchmark(num_events: int = 10000, rate: float = None, max_events: int = 1000, max_latency: float = 0.05):
+    """Return the sustained events/s of a document stream handled per event, and through an EventPageBatcher."""
+    results = {}
+    for label, batched in (("per event", False), ("batched", True)):
+        counts = {"events": 0, "updates": 0}
+
+        def consumer(name, doc):
+            # Stands in for a view update; the cost is per call, as with crossing into the GUI thread
+            counts["updates"] += 1
+            if name == "event_page":
+                counts["events"] += len(doc["seq_num"])
+            elif name == "event":
+                counts["events"] += 1
+            time.sleep(1e-4)
+
+        callback = EventPageBatcher(consumer, max_events=max_events, max_latency=max_latency) if batched else consumer
+        start = time.perf_counter()
+        for name, doc in simulated_documents(num_events, rate):
+            callback(name, doc)
+        elapsed = time.perf_counter() - start
+        results[label] = {"events/s": counts["events"] / elapsed, "updates": counts["updates"]}
+    return results
+
+
+if __name__ == "__main__":
+    for label, result in benchmark().items():
+        print(f"{label:>10}: {result['events/s']:10.0f} events/s in {result['updates']} updates")
@@ -1,9 +1,16 @@
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
 from typing import Generator, Tuple
 
 from databroker.core import BlueskyRun
 import numpy as np
 from databroker.in_memory import BlueskyInMemoryCatalog
 
+from xicam.core import msg, paths
+from xicam.core.data.batching import batch_documents
+
 
 class InvalidStreamError(KeyError):
     pass
@@ -57,34 +64,150 @@ def xarray_from_run(run: BlueskyRun, stream: str = None, field: str = None):
     return data
 
 
+def is_image_shape(shape) -> bool:
+    # Fields with 2-4 dimensions per event (i.e. a single image up to a stack of volumes) are image-like
+    return 5 > len(shape) > 1
+
+
+class RunSummary(object):
+    """
+    A lightweight index of a run's streams and fields, built from its descriptors and stop document only.
+
+    Each field records its ``shape`` (per event), ``dtype``, and whether it is image-like; ``event_counts`` maps each
+    stream to its number of events, if the run has finished.
+    """
+
+    def __init__(self, uid: str, streams: dict, event_counts: dict = None, complete: bool = False):
+        self.uid = uid
+        self.streams = streams
+        self.event_counts = event_counts or {}
+        self.complete = complete
+
+    @classmethod
+    def from_run(cls, run: BlueskyRun):
+        streams = {}
+        for stream in streams_from_run(run):
+            fields = streams.setdefault(stream, {})
+            for descriptor in descriptors_from_stream(run, stream):
+                for field, data_key in descriptor["data_keys"].items():
+                    shape = list(data_key.get("shape") or [])
+                    fields[field] = {"shape": shape,
+                                     "dtype": data_key.get("dtype_str") or data_key.get("dtype"),
+                                     "image": is_image_shape(shape)}
+        stop = run.metadata.get("stop") or {}
+        return cls(run.metadata["start"]["uid"], streams, dict(stop.get("num_events") or {}), complete=bool(stop))
+
+    def to_dict(self):
+        return {"uid": self.uid, "streams": self.streams, "event_counts": self.event_counts, "complete": self.complete}
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(**d)
+
+    def fields(self, stream: str):
+        if stream not in self.streams:
+            raise InvalidStreamError(f"The stream named {stream} is not present in run {self.uid}")
+        return list(self.streams[stream])
+
+    def is_image_field(self, stream: str, field: str):
+        try:
+            return self.streams[stream][field]["image"]
+        except KeyError:
+            raise InvalidFieldError(f"The field {stream}.{field} is not present in run {self.uid}")
+
+    def image_fields(self, stream: str):
+        return [field for field, info in self.streams.get(stream, {}).items() if info["image"]]
+
+    def guess_stream_field(self):
+        streams = list(self.streams)
+        if "primary" in streams:
+            streams.remove("primary")
+            streams.insert(0, "primary")
+
+        for stream in streams:
+            image_fields = self.image_fields(stream)
+            if image_fields:
+                return stream, image_fields[0]
+
+
+class RunSummaryCache(object):
+    """
+    A bounded, in-memory cache of RunSummaries by run uid, optionally backed by JSON files in ``cache_dir``.
+
+    Only finished runs are cached, since a run in progress may still gain streams.
+    """
+
+    def __init__(self, max_runs: int = 4096, cache_dir: str = None):
+        self.max_runs = max_runs
+        self.cache_dir = cache_dir
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, uid: str):
+        return Path(self.cache_dir) / f"{uid}.json"
+
+    def get(self, run: BlueskyRun) -> RunSummary:
+        uid = run.metadata["start"]["uid"]
+        with self._lock:
+            summary = self._summaries.get(uid)
+            if summary is not None:
+                self._summaries.move_to_end(uid)
+                return summary
+
+        summary = self._load(uid) or RunSummary.from_run(run)
+        if summary.complete:
+            with self._lock:
+                self._summaries[uid] = summary
+                while len(self._summaries) > self.max_runs:
+                    self._summaries.popitem(last=False)
+            self._save(summary)
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._summaries.clear()
+
+    def _load(self, uid: str):
+        if not self.cache_dir or not self._path(uid).exists():
+            return None
+        try:
+            return RunSummary.from_dict(json.loads(self._path(uid).read_text()))
+        except (ValueError, TypeError, OSError) as ex:
+            msg.logMessage(f"Discarding unreadable run summary for {uid}.", level=msg.WARNING)
+            msg.logError(ex)
+
+    def _save(self, summary: RunSummary):
+        if not self.cache_dir or self._path(summary.uid).exists():
+            return
+        try:
+            Path(self.cache_dir).mkdir(parents=True, exist_ok=True)
+            self._path(summary.uid).write_text(json.dumps(summary.to_dict()))
+        except (TypeError, OSError) as ex:
+            msg.logMessage(f"Unable to save run summary for {summary.uid}.", level=msg.WARNING)
+            msg.logError(ex)
+
+
+# Summaries are only kept in memory unless a cache_dir is set, e.g. to ``default_summary_dir``
+run_summaries = RunSummaryCache()
+default_summary_dir = str(Path(paths.user_cache_dir) / "run_summaries")
+
+
+def run_summary(run: BlueskyRun) -> RunSummary:
+    return run_summaries.get(run)
+
+
 def is_image_field(run: BlueskyRun, stream: str, field: str):
-    data = getattr(run, stream).to_dask()[field]
-    field_dims = data.ndim
-    if 6 > field_dims > 2:
-        # if field contains at least 1 entry that is at least one-dimensional (shape=2)
-        # or 2-dimensional (shape=3) or up to 3-dimensional (shape=4)
-        # then add field e.g. 'fccd_image'
-        return True
+    return run_summary(run).is_image_field(stream, field)
 
 
 def guess_stream_field(catalog: BlueskyRun):
     # TODO: use some metadata (techniques?) for guidance about how to get a preview
-
-    streams = streams_from_run(catalog)
-    if "primary" in streams:
-        streams.remove("primary")
-        streams.insert(0, "primary")
-
-    for stream in streams:
-        descriptor = descriptors_from_stream(catalog, stream)[0]
-        fields = fields_from_descriptor(descriptor)
-        for field in fields:
-            field_ndims = ndims_from_descriptor(descriptor, field)
-            if field_ndims > 1:
-                return stream, field
+    return run_summary(catalog).guess_stream_field()
 
 
-def preview(catalog: BlueskyRun, stream: str, field: str):
+def preview(catalog: BlueskyRun, stream: str = None, field: str = None):
+    if stream is None or field is None:
+        stream, field = guess_stream_field(catalog)
     data = getattr(catalog, stream).to_dask()[field].squeeze()
     for i in range(len(data.shape) - 2):
         data = data[0]
@@ -106,8 +229,8 @@ def display_name(catalog: BlueskyRun):
 
 
 def run_from_doc_stream(doc_stream: Generator[Tuple[str, dict], None, None])->BlueskyRun:
-    # load data into catalog
-    document = list(doc_stream)
+    # load data into catalog, with runs of events packed into pages
+    document = list(batch_documents(doc_stream))
     uid = document[0][1]["uid"]
     catalog = BlueskyInMemoryCatalog()
     # TODO -- change upsert signature to put start and stop as kwargs
@@ -0,0 +1,497 @@
+"""
+Caching and read-ahead prefetching of decoded frames for lazily loaded image stacks.
+"""
+import math
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Hashable, Tuple
+
+import numpy as np
+
+from xicam.core import msg
+
+try:
+    import numcodecs
+except ImportError:
+    numcodecs = None
+
+
+class FrameCache(object):
+    """
+    A thread-safe LRU cache of decoded frames, bounded by the total number of bytes held.
+
+    Frames larger than the whole budget are never cached.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, key: Hashable):
+        with self._lock:
+            return key in self._frames
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            try:
+                frame = self._frames[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key: Hashable, frame):
+        nbytes = getattr(frame, "nbytes", 0)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._frames:
+                self._nbytes -= getattr(self._frames.pop(key), "nbytes", 0)
+            self._frames[key] = frame
+            self._nbytes += nbytes
+            self._evict()
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            if key in self._frames:
+                self._nbytes -= getattr(self._frames.pop(key), "nbytes", 0)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._nbytes = 0
+
+    def _evict(self):
+        while self._nbytes > self.max_bytes and self._frames:
+            _, frame = self._frames.popitem(last=False)
+            self._nbytes -= getattr(frame, "nbytes", 0)
+
+
+class _ZlibCodec(object):
+    """Fallback codec for when numcodecs isn't installed."""
+
+    def __init__(self, level: int = 1):
+        self.level = level
+
+    def encode(self, buf):
+        return zlib.compress(np.ascontiguousarray(buf).view(np.uint8), self.level)
+
+    def decode(self, buf):
+        return zlib.decompress(buf)
+
+
+def get_codec(name: str = "lz4"):
+    """Return a codec ('lz4', 'zstd' or 'zlib') with ``encode``/``decode`` methods, preferring numcodecs'."""
+    if numcodecs is not None:
+        if name == "lz4":
+            return numcodecs.LZ4(acceleration=1)
+        if name == "zstd":
+            return numcodecs.Zstd(level=1)
+        if name == "zlib":
+            return numcodecs.Zlib(level=1)
+    if name not in ("lz4", "zstd", "zlib"):
+        raise ValueError(f"Unknown codec: {name}")
+    return _ZlibCodec()
+
+
+class _CompressedFrame(object):
+    __slots__ = ("data", "dtype", "shape", "compressed")
+
+    def __init__(self, data, dtype, shape, compressed):
+        self.data = data
+        self.dtype = dtype
+        self.shape = shape
+        self.compressed = compressed
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+
+class CompressedFrameCache(FrameCache):
+    """
+    A FrameCache that holds frames compressed, bounded by the total compressed size.
+
+    Frames are compressed on ``put`` and decompressed into a new array on every ``get``; frames that don't compress
+    by at least ``min_ratio`` are kept as-is. Eviction is segmented LRU: new frames enter a probationary segment, and
+    frames hit again move to a protected segment holding up to ``protected_fraction`` of the budget, so a working set
+    that's revisited survives a single pass over many other frames.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 2 ** 20, codec="lz4", min_ratio: float = 1.2,
+                 protected_fraction: float = 0.8):
+        super(CompressedFrameCache, self).__init__(max_bytes)
+        self.codec = get_codec(codec) if isinstance(codec, str) else codec
+        self.min_ratio = min_ratio
+        self.protected_fraction = protected_fraction
+        self._protected = OrderedDict()
+        self._protected_nbytes = 0
+        self.raw_nbytes = 0
+
+    def __contains__(self, key: Hashable):
+        with self._lock:
+            return key in self._frames or key in self._protected
+
+    def __len__(self):
+        return len(self._frames) + len(self._protected)
+
+    @property
+    def nbytes(self):
+        return self._nbytes + self._protected_nbytes
+
+    @property
+    def compression_ratio(self):
+        return self.raw_nbytes / self.nbytes if self.nbytes else 1.0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key in self._protected:
+                self._protected.move_to_end(key)
+                frame = self._protected[key]
+            elif key in self._frames:
+                # A second hit promotes the frame into the protected segment
+                frame = self._frames.pop(key)
+                self._nbytes -= frame.nbytes
+                self._protected[key] = frame
+                self._protected_nbytes += frame.nbytes
+                self._evict()
+            else:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return self._decompress(frame)
+
+    def put(self, key: Hashable, frame):
+        frame = np.asarray(frame)
+        compressed = self._compress(frame)
+        if compressed.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self.discard(key)
+            self._frames[key] = compressed
+            self._nbytes += compressed.nbytes
+            self.raw_nbytes += frame.nbytes
+            self._evict()
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            for segment in (self._frames, self._protected):
+                if key in segment:
+                    frame = segment.pop(key)
+                    self._account(segment, frame, -1)
+
+    def clear(self):
+        with self._lock:
+            super(CompressedFrameCache, self).clear()
+            self._protected.clear()
+            self._protected_nbytes = 0
+            self.raw_nbytes = 0
+
+    def _account(self, segment, frame, sign):
+        if segment is self._protected:
+            self._protected_nbytes += sign * frame.nbytes
+        else:
+            self._nbytes += sign * frame.nbytes
+        self.raw_nbytes += sign * int(np.prod(frame.shape)) * frame.dtype.itemsize
+
+    def _evict(self):
+        # Overflow from the protected segment is demoted to the most-recent end of the probationary segment
+        while self._protected_nbytes > self.max_bytes * self.protected_fraction and self._protected:
+            key, frame = self._protected.popitem(last=False)
+            self._protected_nbytes -= frame.nbytes
+            self._frames[key] = frame
+            self._nbytes += frame.nbytes
+        while self.nbytes > self.max_bytes and (self._frames or self._protected):
+            segment = self._frames if self._frames else self._protected
+            _, frame = segment.popitem(last=False)
+            self._account(segment, frame, -1)
+
+    def _compress(self, frame: np.ndarray):
+        frame = np.ascontiguousarray(frame)
+        data = bytes(self.codec.encode(frame))
+        if len(data) * self.min_ratio > frame.nbytes:
+            return _CompressedFrame(frame.tobytes(), frame.dtype, frame.shape, False)
+        return _CompressedFrame(data, frame.dtype, frame.shape, True)
+
+    def _decompress(self, frame: _CompressedFrame) -> np.ndarray:
+        data = self.codec.decode(frame.data) if frame.compressed else frame.data
+        return np.frombuffer(bytearray(data), dtype=frame.dtype).reshape(frame.shape)
+
+
+# The process-wide cache shared by DocMetaArrays and lazyfields unless another cache is given
+frame_cache = FrameCache()
+
+
+class ReadAheadPrefetcher(object):
+    """
+    Loads the frames a viewer is likely to request next into a FrameCache on a background thread.
+
+    Each call to ``notify`` records an access; the stride between recent accesses (e.g. +1 for forward playback, -1 for
+    scrubbing backwards, +5 for a strided walk) predicts the next ``depth`` frames, which replace any still-pending
+    predictions. The worker thread exits after sitting idle for ``idle_timeout`` seconds and is restarted on demand.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[int], np.ndarray],
+        key: Callable[[int], Hashable],
+        length: int,
+        cache: FrameCache,
+        depth: int = 8,
+        history: int = 4,
+        idle_timeout: float = 5.0,
+    ):
+        self.loader = loader
+        self.key = key
+        self.length = length
+        self.cache = cache
+        self.depth = depth
+        self.idle_timeout = idle_timeout
+
+        self._history = deque(maxlen=history)
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    @property
+    def stride(self):
+        history = list(self._history)
+        if len(history) < 2:
+            return 0
+        steps = np.diff(history)
+        # Prefer a consistent stride; otherwise follow the direction of the most recent step
+        if len(steps) > 1 and steps[-1] == steps[-2]:
+            return int(steps[-1])
+        return int(np.sign(steps[-1]))
+
+    def predict(self, index: int):
+        stride = self.stride
+        if not stride or self.depth <= 0:
+            return []
+        candidates = range(index + stride, index + stride * (self.depth + 1), stride)
+        return [i for i in candidates if 0 <= i < self.length and self.key(i) not in self.cache]
+
+    def notify(self, index: int):
+        with self._condition:
+            self._history.append(index)
+            self._pending.clear()
+            self._pending.extend(self.predict(index))
+            if self._pending:
+                self._start()
+                self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._pending.clear()
+            self._condition.notify()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="ReadAheadPrefetcher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._pending:
+                    self._condition.wait(self.idle_timeout)
+                    if not self._pending:
+                        self._thread = None
+                        return
+                index = self._pending.popleft()
+
+            key = self.key(index)
+            if key in self.cache:
+                continue
+            try:
+                self.cache.put(key, self.loader(index))
+            except Exception as ex:
+                msg.logMessage(f"Prefetch of frame {index} failed.", level=msg.WARNING)
+                msg.logError(ex)
+
+
+class PlaybackPrefetcher(ReadAheadPrefetcher):
+    """
+    Reads the frames around a playback (or scrubbing) position into a FrameCache on a pool of worker threads.
+
+    Up to ``depth`` frames ahead in the direction of playback, and ``behind`` frames the other way, are read
+    concurrently. The depth adapts to keep playback fed: it covers the frames shown while one frame is being read (the
+    observed read latency over the interval between accesses, with a 2x margin), between ``min_depth`` and
+    ``max_depth`` and within half of the cache's byte budget. When the position moves, queued reads that fall outside
+    the new window are cancelled; a jump further than the window restarts the stride prediction.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[int], np.ndarray],
+        key: Callable[[int], Hashable],
+        length: int,
+        cache: FrameCache,
+        workers: int = 4,
+        min_depth: int = 2,
+        max_depth: int = 64,
+        behind: int = 2,
+        history: int = 4,
+    ):
+        super(PlaybackPrefetcher, self).__init__(loader, key, length, cache, depth=min_depth, history=history)
+        self.workers = workers
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.behind = behind
+
+        self.latency = None  # moving average of seconds per frame read
+        self.interval = None  # moving average of seconds between accesses
+        self._last_access = None
+        self._frame_nbytes = 0
+        self._futures = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="PlaybackPrefetcher")
+
+    @staticmethod
+    def _average(average, value, weight=0.25):
+        return value if average is None else average + weight * (value - average)
+
+    def _adapt(self):
+        if self.latency is None or not self.interval:
+            return
+        depth = math.ceil(2 * self.latency / self.interval)
+        if self._frame_nbytes:
+            depth = min(depth, self.cache.max_bytes // 2 // self._frame_nbytes)
+        self.depth = int(min(max(depth, self.min_depth), self.max_depth))
+
+    def predict(self, index: int):
+        stride = self.stride or 1
+        ahead = range(index + stride, index + stride * (self.depth + 1), stride)
+        behind = range(index - stride, index - stride * (self.behind + 1), -stride)
+        return [i for i in [*ahead, *behind] if 0 <= i < self.length and self.key(i) not in self.cache]
+
+    def notify(self, index: int):
+        now = time.perf_counter()
+        with self._lock:
+            if self._last_access is not None:
+                # Long pauses aren't playback
+                self.interval = self._average(self.interval, min(now - self._last_access, 1.0))
+            self._last_access = now
+            if self._history and abs(index - self._history[-1]) > self.depth * max(abs(self.stride), 1):
+                self._history.clear()
+            self._history.append(index)
+            self._adapt()
+
+            wanted = self.predict(index)
+            for i in set(self._futures) - set(wanted):
+                # A cancelled future's done callback (_done) removes it
+                future = self._futures.get(i)
+                if future is not None:
+                    future.cancel()
+            for i in wanted:
+                if i not in self._futures:
+                    future = self._futures[i] = self._executor.submit(self._prefetch, i)
+                    future.add_done_callback(partial(self._done, i))
+
+    def get(self, index: int) -> np.ndarray:
+        """Return frame *index*, waiting on its prefetch if one is under way, and prefetch the frames around it."""
+        frame = self.cache.get(self.key(index))
+        if frame is None:
+            with self._lock:
+                future = self._futures.get(index)
+            # A prefetch still in the queue is cancelled and read right away instead
+            if future is not None and not future.cancel():
+                frame = future.result()
+            if frame is None:
+                frame = self._read(index)
+        self.notify(index)
+        return frame
+
+    def stop(self):
+        with self._lock:
+            # Cancelling runs _done, which removes the future
+            for future in list(self._futures.values()):
+                future.cancel()
+            self._futures.clear()
+
+    def shutdown(self):
+        self.stop()
+        self._executor.shutdown(wait=False)
+
+    def _read(self, index: int):
+        start = time.perf_counter()
+        frame = self.loader(index)
+        with self._lock:
+            self.latency = self._average(self.latency, time.perf_counter() - start)
+            self._frame_nbytes = getattr(frame, "nbytes", 0)
+        self.cache.put(self.key(index), frame)
+        return frame
+
+    def _prefetch(self, index: int):
+        frame = self.cache.get(self.key(index))
+        if frame is not None:
+            return frame
+        try:
+            return self._read(index)
+        except Exception as ex:
+            msg.logMessage(f"Prefetch of frame {index} failed.", level=msg.WARNING)
+            msg.logError(ex)
+
+    def _done(self, index, future):
+        with self._lock:
+            if self._futures.get(index) is future:
+                del self._futures[index]
+
+
+class ProfileBlockCache(object):
+    """
+    Profiles along the first (depth) axis of a 3D array, read a spatial block of pixels at a time and cached.
+
+    Reading a profile reads the whole ``block_shape`` block of pixels around it, across the depth axis, into ``cache``;
+    any later profile inside that block is answered from memory. Blocks are shrunk to the array's chunking in the two
+    spatial axes (e.g. for dask arrays) when that's smaller, so that reading a block touches each chunk only once.
+    """
+
+    def __init__(self, array, cache: FrameCache = None, block_shape: Tuple[int, int] = (64, 64)):
+        self.array = array
+        self.cache = cache if cache is not None else FrameCache(max_bytes=256 * 2 ** 20)
+        chunks = getattr(getattr(array, "data", array), "chunks", None)
+        if chunks and isinstance(chunks[0], tuple):
+            block_shape = tuple(min(size, max(axis_chunks)) for size, axis_chunks in zip(block_shape, chunks[1:3]))
+        self.block_shape = block_shape
+        self._token = uuid.uuid4().hex
+
+    def _block(self, i: int, j: int):
+        return i // self.block_shape[0], j // self.block_shape[1]
+
+    def profile(self, i: int, j: int):
+        """Return the profile at pixel (i, j) if its block is cached; otherwise None."""
+        bi, bj = self._block(i, j)
+        block = self.cache.get((self._token, bi, bj))
+        if block is None:
+            return None
+        return block[:, i - bi * self.block_shape[0], j - bj * self.block_shape[1]]
+
+    def get(self, i: int, j: int):
+        """Return the profile at pixel (i, j), reading (and caching) its block if needed."""
+        profile = self.profile(i, j)
+        if profile is not None:
+            return profile
+        bi, bj = self._block(i, j)
+        i0, j0 = bi * self.block_shape[0], bj * self.block_shape[1]
+        block = np.asarray(self.array[:, i0:i0 + self.block_shape[0], j0:j0 + self.block_shape[1]])
+        self.cache.put((self._token, bi, bj), block)
+        return block[:, i - i0, j - j0]
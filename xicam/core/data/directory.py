@@ -0,0 +1,163 @@
+"""
+Opening a directory of frame files as a single run that grows as new files are written into it.
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Iterable, List, Union
+
+import dask.array as da
+from bluesky_live.run_builder import RunBuilder
+from databroker.in_memory import BlueskyInMemoryCatalog
+
+from xicam.core import msg
+
+
+def _tiff_frames(paths: List[str]):
+    from xicam.core.formats.TIFFSeriesPlugin import TIFFSeries, series_to_dask
+
+    return series_to_dask(TIFFSeries(paths))
+
+
+def _npy_frames(paths: List[str]):
+    from xicam.core.formats.NPYPlugin import load_npy
+
+    return da.stack([da.from_array(load_npy(path)) for path in paths])
+
+
+# Readers that stack a list of single-frame files into a lazy (frames, ...) array, by file extension
+FRAME_READERS = {'.tif': _tiff_frames, '.tiff': _tiff_frames, '.npy': _npy_frames}
+
+
+def natural_key(path: str):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', path)]
+
+
+class DirectoryRun(object):
+    """
+    A run whose primary stream holds one frame per file in a directory, extended incrementally by ``rescan``.
+
+    A rescan is skipped entirely while the directory's mtime is unchanged; otherwise only files not already in the
+    seen-set are read, and they're appended as one new event_page. Files modified within the last ``settle_time``
+    seconds may still be being written; they're held back until a later rescan.
+    """
+
+    def __init__(self, path: Union[str, Path], extensions: Iterable[str] = None, settle_time: float = 0.5):
+        self.path = str(path)
+        self.extensions = {extension.lower() for extension in extensions} if extensions else None
+        self.settle_time = settle_time
+
+        self._seen = set()
+        self._pending = set()
+        self._mtime = None
+        self._frames = 0
+        self._frame_shape = None
+        self._lock = threading.RLock()
+
+        self._builder = RunBuilder(metadata={'paths': [self.path], 'sample_name': os.path.basename(self.path)})
+        self._start = next(iter(self._builder._cache))[1]
+        self._catalog = BlueskyInMemoryCatalog()
+
+    def __len__(self):
+        return self._frames
+
+    @property
+    def uid(self):
+        return self._start['uid']
+
+    @property
+    def run(self):
+        """A BlueskyRun of the frames found so far."""
+        documents = list(self._builder._cache)
+        self._catalog.upsert(self._start, None, lambda: iter(documents), (), {})
+        return self._catalog[self.uid]
+
+    def _new_files(self):
+        new, pending = [], set()
+        now = time.time()
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.path in self._seen or not entry.is_file():
+                    continue
+                extension = os.path.splitext(entry.name)[1].lower()
+                if extension not in FRAME_READERS or (self.extensions and extension not in self.extensions):
+                    continue
+                if now - entry.stat().st_mtime < self.settle_time:
+                    pending.add(entry.path)
+                    continue
+                new.append(entry.path)
+        self._pending = pending
+        return new
+
+    def rescan(self) -> int:
+        """Append the frames written since the last scan; return the number of new frames."""
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime and not self._pending:
+                return 0
+            self._mtime = mtime
+
+            new_files = self._new_files()
+            if not new_files:
+                return 0
+
+            if self.extensions is None:
+                # Lock on to the most common kind of frame file in the directory
+                self.extensions = {Counter(os.path.splitext(path)[1].lower() for path in new_files).most_common(1)[0][0]}
+                new_files = [path for path in new_files if os.path.splitext(path)[1].lower() in self.extensions]
+            new_files.sort(key=natural_key)
+
+            by_reader = {}
+            for path in new_files:
+                by_reader.setdefault(FRAME_READERS[os.path.splitext(path)[1].lower()], []).append(path)
+            frames = da.concatenate([reader(paths) for reader, paths in by_reader.items()])
+
+            if self._frame_shape is None:
+                self._frame_shape = frames.shape[1:]
+                self._builder.add_stream('primary', data_keys={'image': {'source': self.path,
+                                                                         'dtype': 'array',
+                                                                         'shape': self._frame_shape}})
+            elif frames.shape[1:] != self._frame_shape:
+                msg.logMessage(f"Frames in {self.path} changed shape from {self._frame_shape} to {frames.shape[1:]}; "
+                               f"they won't be added to the run.", level=msg.WARNING)
+                self._seen.update(new_files)
+                return 0
+
+            times = [os.path.getmtime(path) for path in new_files]
+            self._builder.add_data('primary',
+                                   data={'image': frames},
+                                   time=times,
+                                   timestamps={'image': times},
+                                   seq_num=list(range(self._frames + 1, self._frames + len(new_files) + 1)))
+            self._seen.update(new_files)
+            self._frames += len(new_files)
+            return len(new_files)
+
+    def close(self):
+        with self._lock:
+            self._builder.close()
+
+
+# The most recently opened directories, so that reopening one only picks up what's new
+max_directory_runs = 8
+_directory_runs = OrderedDict()
+
+
+def load_directory(path: Union[str, Path]):
+    """Open a directory of frame files as a run, or rescan it if it's already open; return a BlueskyRun."""
+    path = os.path.abspath(str(path))
+    directory_run = _directory_runs.get(path)
+    if directory_run is None:
+        directory_run = _directory_runs[path] = DirectoryRun(path)
+    _directory_runs.move_to_end(path)
+    while len(_directory_runs) > max_directory_runs:
+        _, evicted = _directory_runs.popitem(last=False)
+        evicted.close()
+    new_frames = directory_run.rescan()
+    msg.logMessage(f"Found {new_frames} new frames in {path}.")
+    if not len(directory_run):
+        return None
+    return directory_run.run
@@ -0,0 +1,110 @@
+"""
+Process-wide pools of data handlers and open file handles.
+
+Resolving many datums against the same resource should construct its handler (and open its file) once, not once per
+datum. Pooled entries are closed in least-recently-used order once a pool holds more than ``max_open`` entries; entries
+that are checked out are never closed, and each entry is only used by one thread at a time.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Hashable
+
+from xicam.core import msg
+
+
+def _close(resource):
+    close = getattr(resource, "close", None)
+    if callable(close):
+        close()
+
+
+class _PoolEntry(object):
+    def __init__(self, resource, closer):
+        self.resource = resource
+        self.closer = closer
+        self.lock = threading.RLock()
+        self.users = 0
+
+
+class ResourcePool(object):
+    """A bounded, thread-safe LRU pool of expensive-to-open resources (handlers, file handles)."""
+
+    def __init__(self, max_open: int = 32):
+        self.max_open = max_open
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __contains__(self, key: Hashable):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @contextmanager
+    def checkout(self, key: Hashable, factory: Callable, closer: Callable = _close):
+        """
+        Yield the resource pooled under *key*, creating it with *factory* if needed.
+
+        The resource is locked to the calling thread, and protected from being closed, for the duration of the block.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _PoolEntry(factory(), closer)
+            self._entries.move_to_end(key)
+            entry.users += 1
+            self._evict()
+
+        try:
+            with entry.lock:
+                yield entry.resource
+        finally:
+            with self._lock:
+                entry.users -= 1
+                self._evict()
+
+    def close(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._close_entry(key, entry)
+
+    def clear(self):
+        with self._lock:
+            entries, self._entries = self._entries, OrderedDict()
+        for key, entry in entries.items():
+            self._close_entry(key, entry)
+
+    def _evict(self):
+        excess = len(self._entries) - self.max_open
+        if excess <= 0:
+            return
+        for key in [key for key, entry in self._entries.items() if not entry.users][:excess]:
+            self._close_entry(key, self._entries.pop(key))
+
+    @staticmethod
+    def _close_entry(key, entry):
+        try:
+            with entry.lock:
+                entry.closer(entry.resource)
+        except Exception as ex:
+            msg.logMessage(f"Unable to close pooled resource {key}.", level=msg.WARNING)
+            msg.logError(ex)
+
+
+handler_pool = ResourcePool(max_open=128)
+file_pool = ResourcePool(max_open=32)
+
+
+@contextmanager
+def open_file(path: str, opener: Callable = open, *args, **kwargs):
+    """
+    Open *path* through the shared file handle pool; use as ``with open_file(path, h5py.File, 'r') as f: ...``.
+
+    Handles stay open between uses until they're pushed out of the pool.
+    """
+    with file_pool.checkout((str(path), opener, args, tuple(sorted(kwargs.items()))),
+                            lambda: opener(str(path), *args, **kwargs)) as handle:
+        yield handle
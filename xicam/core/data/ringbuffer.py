@@ -0,0 +1,100 @@
+"""
+Fixed-size buffering of live frames, so that acquiring frames and displaying them can run at their own rates.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+class FrameRingBuffer(object):
+    """
+    A preallocated, thread-safe buffer of the most recent ``capacity`` frames and their timestamps.
+
+    Frames are copied into preallocated storage, so pushing a frame doesn't allocate; once the buffer is full, each
+    push overwrites the oldest frame. Storage is (re)allocated when the first frame, or a frame of another shape or
+    dtype, is pushed, which also drops the frames held so far. Frames are numbered from 0 in the order pushed.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self._frames = None
+        self._timestamps = np.zeros(capacity)
+        self._count = 0  # frames pushed
+        self._first = 0  # number of the oldest frame in the current storage
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._count - self._first, self.capacity)
+
+    @property
+    def count(self):
+        """The number of frames pushed so far."""
+        return self._count
+
+    @property
+    def nbytes(self):
+        return 0 if self._frames is None else self._frames.nbytes
+
+    def push(self, frame: np.ndarray, timestamp: float = None) -> int:
+        """Copy *frame* into the buffer; return its number."""
+        frame = np.asarray(frame)
+        with self._lock:
+            if self._frames is None or self._frames.shape[1:] != frame.shape or self._frames.dtype != frame.dtype:
+                self._frames = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+                self._first = self._count
+            number = self._count
+            self._frames[number % self.capacity] = frame
+            self._timestamps[number % self.capacity] = time.time() if timestamp is None else timestamp
+            self._count += 1
+            return number
+
+    def get(self, number: int):
+        """Return (a copy of) frame *number* and its timestamp, or (None, None) if it's no longer held."""
+        with self._lock:
+            if not max(self._first, self._count - self.capacity) <= number < self._count:
+                return None, None
+            return self._frames[number % self.capacity].copy(), self._timestamps[number % self.capacity]
+
+    def latest(self):
+        """Return (number, a copy of the frame, timestamp) of the newest frame, or None if there are none."""
+        with self._lock:
+            if self._count == self._first:
+                return None
+            number = self._count - 1
+            return number, self._frames[number % self.capacity].copy(), self._timestamps[number % self.capacity]
+
+    def frames(self) -> np.ndarray:
+        """Return a copy of the frames held, oldest first."""
+        with self._lock:
+            if self._frames is None:
+                return np.empty((0,))
+            numbers = np.arange(self._count - len(self), self._count)
+            return self._frames[numbers % self.capacity]
+
+    def clear(self):
+        with self._lock:
+            self._first = self._count
+
+
+class RateMeter(object):
+    """A moving average of the rate of events (e.g. frames) per second."""
+
+    def __init__(self, weight: float = 0.1):
+        self.weight = weight
+        self.count = 0
+        self._interval = None
+        self._last = None
+
+    def tick(self, count: int = 1):
+        now = time.perf_counter()
+        if self._last is not None:
+            interval = (now - self._last) / count
+            self._interval = interval if self._interval is None else self._interval + self.weight * (
+                interval - self._interval)
+        self._last = now
+        self.count += count
+
+    @property
+    def rate(self):
+        return 1 / self._interval if self._interval else 0.0
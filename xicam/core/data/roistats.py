@@ -0,0 +1,142 @@
+"""
+Batched region-of-interest statistics: the per-frame sum, count and mean of every ROI over a stack, in one pass.
+"""
+from typing import Sequence
+
+import numpy as np
+
+STATISTICS = ("sum", "count", "mean")
+
+
+def label_overlaps(masks: Sequence[np.ndarray]):
+    """
+    Rasterize (possibly overlapping) boolean *masks* into one label image of their distinct overlaps.
+
+    Returns (labels, membership): labels is 0 outside every mask and 1..K in each distinct combination of masks;
+    membership[k - 1, i] says whether overlap k is part of mask i.
+    """
+    masks = np.asarray(masks, dtype=bool)
+    count = masks.shape[0]
+    if not count:
+        return np.zeros(masks.shape[1:], dtype=np.intp), np.zeros((0, 0), dtype=bool)
+    # One code (a row of bytes) per pixel, with a bit per mask
+    codes = np.packbits(masks, axis=0).reshape(-1, masks[0].size).T
+    inside = np.flatnonzero(codes.any(axis=1))
+    unique, inverse = np.unique(codes[inside], axis=0, return_inverse=True)
+
+    labels = np.zeros(masks.shape[1:], dtype=np.intp)
+    labels.reshape(-1)[inside] = inverse.ravel() + 1
+    membership = np.unpackbits(unique, axis=1, count=count).astype(bool)
+    return labels, membership
+
+
+class ROIStatistics(object):
+    """
+    Per-frame statistics of many regions of a stack of frames, all computed together.
+
+    The regions are rasterized once into a single label image (see ``label_overlaps``), so each block of frames is
+    reduced with one ``np.bincount`` over just the labeled pixels, however many regions there are. Each region's
+    statistics are then summed from those of the overlaps it's part of. Non-finite pixels are left out of a frame's sums
+    and counts.
+    """
+
+    def __init__(self, masks: Sequence[np.ndarray]):
+        self.labels, self.membership = label_overlaps(masks)
+        self.shape = self.labels.shape
+        self._overlaps = self.membership.shape[0]
+        self._windows = {}
+        self._indices = {}
+
+    def __len__(self):
+        return self.membership.shape[1]
+
+    def _window(self, rows: slice, cols: slice):
+        """The labeled pixels within a window, and their overlaps' indices."""
+        key = (rows.start, rows.stop, cols.start, cols.stop)
+        window = self._windows.get(key)
+        if window is None:
+            labels = self.labels[rows, cols].ravel()
+            pixels = np.flatnonzero(labels)
+            window = self._windows[key] = pixels, labels[pixels] - 1
+        return window
+
+    def reduce(self, frames: np.ndarray, rows: slice = slice(None), cols: slice = slice(None)):
+        """
+        Return the (sums, counts) of each overlap in each frame of *frames* (the block of the stack at *rows*, *cols*),
+        each shaped (frames, overlaps).
+        """
+        rows = slice(*rows.indices(self.shape[0]))
+        cols = slice(*cols.indices(self.shape[1]))
+        pixels, overlaps = self._window(rows, cols)
+        frames = np.asarray(frames)
+        frames = frames.reshape((-1, frames.shape[-2] * frames.shape[-1]))
+        length = frames.shape[0]
+
+        values = frames[:, pixels]  # a copy
+        index = self._index(rows, cols, length)
+        bins = length * self._overlaps
+        finite = np.isfinite(values) if np.issubdtype(values.dtype, np.inexact) else None
+        if finite is None or finite.all():
+            counts = np.tile(np.bincount(overlaps, minlength=self._overlaps), length)
+        else:
+            values[~finite] = 0
+            counts = np.bincount(index, weights=finite.ravel(), minlength=bins)
+        sums = np.bincount(index, weights=values.ravel(), minlength=bins)
+        return sums.reshape(length, self._overlaps), counts.reshape(length, self._overlaps)
+
+    def _index(self, rows: slice, cols: slice, length: int):
+        """The bins of the labeled pixels of a window, for a block of *length* frames: one bin per frame and overlap."""
+        # Blocks may be reduced on several threads; at worst, one is computed twice
+        key = (rows.start, rows.stop, cols.start, cols.stop, length)
+        index = self._indices.get(key)
+        if index is None:
+            overlaps = self._window(rows, cols)[1]
+            index = self._indices[key] = (overlaps[None, :] + self._overlaps * np.arange(length)[:, None]).ravel()
+        return index
+
+    def compute(self, stack, frames_per_block: int = 16):
+        """
+        Return a dict of each statistic in ``STATISTICS``, shaped (frames, regions), over *stack*.
+
+        Dask arrays (and xarrays of them) are reduced chunk by chunk in one pass; anything else that can be sliced
+        along its first axis is read *frames_per_block* frames at a time.
+        """
+        stack = getattr(stack, "data", stack)  # xarray
+        if len(stack.shape) == 2:
+            stack = stack[None, ...]
+        if not len(self):
+            return {statistic: np.zeros((stack.shape[0], 0)) for statistic in STATISTICS}
+        if hasattr(stack, "map_blocks"):
+            sums, counts = self._compute_dask(stack)
+        else:
+            results = [self.reduce(stack[start:start + frames_per_block])
+                       for start in range(0, stack.shape[0], frames_per_block)]
+            sums = np.concatenate([result[0] for result in results])
+            counts = np.concatenate([result[1] for result in results])
+
+        sums = sums @ self.membership
+        counts = counts @ self.membership
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        return {"sum": sums, "count": counts, "mean": means}
+
+    def _compute_dask(self, stack):
+        overlaps = self._overlaps
+
+        def block_statistics(block, block_info=None):
+            _, (row_start, row_stop), (col_start, col_stop) = block_info[0]["array-location"]
+            sums, counts = self.reduce(block, slice(row_start, row_stop), slice(col_start, col_stop))
+            return np.concatenate([sums, counts], axis=1)[:, None, :]
+
+        row_blocks, col_blocks = len(stack.chunks[1]), len(stack.chunks[2])
+        partial = stack.map_blocks(block_statistics, dtype=float,
+                                   chunks=(stack.chunks[0], (1,) * row_blocks, (2 * overlaps,) * col_blocks))
+        # Add up the statistics of the spatial blocks of each frame
+        totals = np.asarray(partial.compute()).reshape(stack.shape[0], row_blocks, col_blocks, 2, overlaps)
+        totals = totals.sum(axis=(1, 2))
+        return totals[:, 0], totals[:, 1]
+
+
+def roi_statistics(stack, masks: Sequence[np.ndarray]):
+    """Return the per-frame sum, count and mean of each of *masks* over *stack*; see ``ROIStatistics``."""
+    return ROIStatistics(masks).compute(stack)
@@ -0,0 +1,140 @@
+"""
+A simulated ophyd area detector, for exercising live views (e.g. DeviceView) and measuring their sustained throughput
+without hardware.
+"""
+import threading
+import time
+
+import numpy as np
+from ophyd import Component as Cpt, Device, DeviceStatus, Signal
+
+from xicam.core.data.ringbuffer import FrameRingBuffer, RateMeter
+
+
+class SimulatedImage(Signal):
+    """The detector's current frame; a new one is generated whenever the detector's frame number advances."""
+
+    def __init__(self, *args, **kwargs):
+        super(SimulatedImage, self).__init__(*args, **kwargs)
+        self._frame_number = None
+
+    def get(self, **kwargs):
+        detector = self.root
+        number = detector.frame_number()
+        if number != self._frame_number:
+            self._readback = detector.generate_frame(number)
+            self._frame_number = number
+        return self._readback
+
+
+class SimulatedArrayCounter(Signal):
+    def get(self, **kwargs):
+        return self.root.frame_number()
+
+
+class SimulatedCam(Device):
+    acquire = Cpt(Signal, value=1)
+    acquire_period = Cpt(Signal, value=0.01)
+    num_images = Cpt(Signal, value=1)
+
+
+class SimulatedImagePlugin(Device):
+    shaped_image = Cpt(SimulatedImage)
+    array_counter = Cpt(SimulatedArrayCounter)
+
+
+class SimulatedAreaDetector(Device):
+    """
+    An area detector producing a new ``shape`` frame every ``acquire_period`` seconds while ``cam.acquire`` is set,
+    plus one per ``trigger()``.
+
+    Frames are a moving peak over Poisson noise, drawn from a small precomputed bank so that generating them doesn't
+    limit the rates being measured. Like an areaDetector, it's read through ``image1.shaped_image`` and
+    ``image1.array_counter``.
+    """
+
+    cam = Cpt(SimulatedCam, "cam1:")
+    image1 = Cpt(SimulatedImagePlugin, "image1:")
+
+    def __init__(self, prefix="SIM:", *, name="simulated_detector", shape=(512, 512), acquire_period=0.01,
+                 dtype=np.uint16, bank_size=16, **kwargs):
+        super(SimulatedAreaDetector, self).__init__(prefix, name=name, **kwargs)
+        self.shape = tuple(shape)
+        self.cam.acquire_period.put(acquire_period)
+        self._start = time.monotonic()
+        self._triggers = 0
+
+        rng = np.random.default_rng(0)
+        y, x = np.indices(self.shape)
+        bank = []
+        for i in range(bank_size):
+            angle = 2 * np.pi * i / bank_size
+            cy, cx = (0.5 + 0.25 * np.sin(angle)) * self.shape[0], (0.5 + 0.25 * np.cos(angle)) * self.shape[1]
+            peak = 1000 * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * (min(self.shape) / 20) ** 2))
+            bank.append((rng.poisson(10, self.shape) + peak).astype(dtype))
+        self._bank = bank
+
+    def frame_number(self) -> int:
+        period = self.cam.acquire_period.get()
+        elapsed = int((time.monotonic() - self._start) / period) if self.cam.acquire.get() and period else 0
+        return elapsed + self._triggers
+
+    def generate_frame(self, number: int) -> np.ndarray:
+        return self._bank[number % len(self._bank)]
+
+    def trigger(self):
+        self._triggers += 1
+        status = DeviceStatus(self)
+        status.set_finished()
+        return status
+
+
+def benchmark(duration: float = 3.0, shape=(2048, 2048), acquire_period: float = 0.002, display_fps: float = 30,
+              display_cost: float = 0.02, buffer_size: int = 64):
+    """
+    Acquire from a SimulatedAreaDetector into a FrameRingBuffer while a display loop takes the latest frame at
+    ``display_fps`` (spending ``display_cost`` seconds per frame shown); return the sustained rates and drop count.
+    """
+    detector = SimulatedAreaDetector(shape=shape, acquire_period=acquire_period)
+    buffer = FrameRingBuffer(buffer_size)
+    acquired, displayed = RateMeter(), RateMeter()
+    stop = threading.Event()
+
+    def acquire():
+        last = None
+        while not stop.is_set():
+            counter = detector.image1.array_counter.get()
+            if counter != last:
+                buffer.push(detector.image1.shaped_image.get())
+                acquired.tick()
+                last = counter
+            else:
+                time.sleep(acquire_period / 4)
+
+    dropped = 0
+    thread = threading.Thread(target=acquire, daemon=True)
+    thread.start()
+    shown = None
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        latest = buffer.latest()
+        if latest is not None and latest[0] != shown:
+            if shown is not None:
+                dropped += latest[0] - shown - 1
+            shown = latest[0]
+            time.sleep(display_cost)
+            displayed.tick()
+        time.sleep(max(0.0, 1 / display_fps - display_cost))
+    stop.set()
+    thread.join()
+
+    elapsed = time.perf_counter() - start
+    return {"acquired fps": acquired.count / elapsed,
+            "displayed fps": displayed.count / elapsed,
+            "dropped": dropped,
+            "buffered": len(buffer)}
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name:>14}: {value:.1f}")
@@ -0,0 +1,121 @@
+import mimetypes
+import os
+from collections import defaultdict
+
+import dask.array as da
+import h5py
+import numpy as np
+from bluesky_live.run_builder import RunBuilder
+
+from xicam.core.data.pool import open_file
+
+mimetypes.add_type('application/x-hdf5', '.h5')
+mimetypes.add_type('application/x-hdf5', '.hdf5')
+mimetypes.add_type('application/x-hdf5', '.nxs')
+
+HDF5_SIGNATURE = b'\x89HDF\r\n\x1a\n'
+
+# Event pages span whole native chunks, and at least this many frames
+MIN_FRAMES_PER_PAGE = 64
+
+# Per-file chunk cache; big enough that walking the frames of a multi-frame chunk decompresses it only once
+CHUNK_CACHE_BYTES = 64 * 2 ** 20
+
+
+def sniff_hdf5(filename, first_bytes):
+    if first_bytes.startswith(HDF5_SIGNATURE):
+        return 'application/x-hdf5'
+
+
+def open_hdf5(path):
+    """Open an HDF5 file (read-only) through the shared file handle pool."""
+    return open_file(path, h5py.File, 'r', rdcc_nbytes=CHUNK_CACHE_BYTES)
+
+
+class PooledDataset(object):
+    """
+    An array-like proxy for an HDF5 dataset that reads through the shared file handle pool.
+
+    Reads of one file are serialized, so the proxy is safe to hand to dask's threaded schedulers, and the file is
+    transparently reopened if its handle has been closed by the pool.
+    """
+
+    def __init__(self, path: str, name: str, shape: tuple, dtype: np.dtype, chunks: tuple = None):
+        self.path = path
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.ndim = len(shape)
+        self.chunks = chunks
+
+    def __getitem__(self, item):
+        with open_hdf5(self.path) as file:
+            return file[self.name][item]
+
+
+def image_datasets(file: h5py.File):
+    """Return the numeric datasets in a file with at least two dimensions, by path."""
+    datasets = {}
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and obj.ndim >= 2 and obj.dtype.kind in 'biuf':
+            datasets[name] = obj
+
+    file.visititems(visit)
+    return datasets
+
+
+def dataset_to_dask(path: str, dataset: h5py.Dataset):
+    """Wrap a dataset as a dask array of frames (one per leading index), chunked along its native chunk layout."""
+    shape = dataset.shape
+    # Contiguous datasets are read a frame at a time
+    chunks = dataset.chunks or (1,) * (dataset.ndim - 2) + shape[-2:]
+    proxy = PooledDataset(path, dataset.name, shape, dataset.dtype, chunks)
+    array = da.from_array(proxy,
+                          chunks=chunks,
+                          name=f'hdf5-{path}-{dataset.name}-{os.path.getmtime(path)}',
+                          asarray=True,
+                          fancy=False)
+    if array.ndim == 2:
+        array = array[None]
+    return array.reshape((-1,) + shape[-2:]) if array.ndim > 3 else array
+
+
+def field_name(dataset_name: str):
+    return dataset_name.strip('/').replace('/', '_')
+
+
+def ingest_hdf5(paths):
+    path = str(paths[0])
+    with open_hdf5(path) as file:
+        datasets = image_datasets(file)
+        sources = {field_name(name): f'{path}:{dataset.name}' for name, dataset in datasets.items()}
+        arrays = {field_name(name): dataset_to_dask(path, dataset) for name, dataset in datasets.items()}
+
+    # Datasets with the same number of frames share a stream; the largest dataset's stream is 'primary'
+    streams = defaultdict(list)
+    for field, array in sorted(arrays.items(), key=lambda item: -item[1].nbytes):
+        streams[len(array)].append(field)
+
+    timestamp = os.path.getmtime(path)
+    with RunBuilder(metadata={'paths': [path], 'sample_name': os.path.splitext(os.path.basename(path))[0]}) as builder:
+        for i, (frames, fields) in enumerate(streams.items()):
+            stream_name = 'primary' if i == 0 else fields[0]
+            builder.add_stream(stream_name,
+                               data_keys={field: {'source': sources[field],
+                                                  'dtype': 'array',
+                                                  'shape': arrays[field].shape[1:]}
+                                          for field in fields})
+
+            # Each event page references a range of whole native chunks of the stream's largest dataset
+            chunk_frames = arrays[fields[0]].chunks[0][0]
+            page = -(-MIN_FRAMES_PER_PAGE // chunk_frames) * chunk_frames
+            for start in range(0, frames, page):
+                stop = min(start + page, frames)
+                builder.add_data(stream_name,
+                                 data={field: arrays[field][start:stop] for field in fields},
+                                 time=[timestamp] * (stop - start),
+                                 timestamps={field: [timestamp] * (stop - start) for field in fields},
+                                 seq_num=list(range(start + 1, stop + 1)))
+
+    yield from builder._cache
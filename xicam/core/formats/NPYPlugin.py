@@ -1,5 +1,6 @@
 import mimetypes
 
+import dask.array as da
 from bluesky_live.run_builder import RunBuilder
 from xicam.plugins.datahandlerplugin import DataHandlerPlugin, start_doc
 import numpy as np
@@ -7,8 +8,19 @@ import numpy as np
 mimetypes.add_type('application/x-npy', '.npy')
 
 
+def load_npy(path):
+    """Memory-map a .npy file; arrays of Python objects can't be mapped, and are read into memory instead."""
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        return np.load(path, allow_pickle=True)
+
+
 def ingest_npy(paths):
-    d = np.load(paths[0], allow_pickle=True)
+    d = load_npy(paths[0])
+    if d.dtype != object:
+        # Chunk along the frame axis so that only the frames being looked at are read from disk
+        d = da.from_array(d, chunks=(1,) * (d.ndim - 2) + d.shape[-2:])
     data_keys = {'image': {'source': paths[0],
                            'dtype': 'array',
                            'shape': d.shape}}
@@ -31,7 +43,7 @@ class NPYPlugin(DataHandlerPlugin):
     DEFAULT_EXTENTIONS = [".npy"]
 
     def __call__(self, *args, **kwargs):
-        return np.load(self.path, allow_pickle=True)
+        return load_npy(self.path)
 
     def __init__(self, path):
         super(NPYPlugin, self).__init__()
@@ -39,4 +51,4 @@ class NPYPlugin(DataHandlerPlugin):
 
     @classmethod
     def getStartDoc(cls, paths, start_uid):
-        return start_doc(start_uid=start_uid, metadata={"paths": paths})
\ No newline at end of file
+        return start_doc(start_uid=start_uid, metadata={"paths": paths})
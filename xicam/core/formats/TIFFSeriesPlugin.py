@@ -0,0 +1,131 @@
+import glob
+import os
+
+import dask.array as da
+import numpy as np
+import tifffile
+from bluesky_live.run_builder import RunBuilder
+
+from xicam.core import msg
+from xicam.core.data.directory import natural_key
+
+TIFF_SERIES_MIMETYPE = 'application/x-tiff-series'
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+def frame_layout(path: str):
+    """Return the (page count, frame shape, dtype) of a TIFF, from its header."""
+    with tifffile.TiffFile(path) as tif:
+        page = tif.pages[0]
+        return len(tif.pages), tuple(page.shape), np.dtype(page.dtype).newbyteorder(tif.byteorder)
+
+
+def is_tiff_series(uris) -> bool:
+    """
+    Whether *uris* explicitly ask for a TIFF series: a pattern (e.g. 'scan_*.tif'), or several TIFFs selected together
+    that each hold one frame of the same shape and dtype (anything else is left to the image/tiff ingestors).
+
+    A single TIFF is never taken to be a series, however many numbered siblings it has; open their directory (see
+    ``xicam.core.data.directory``) or a pattern for that.
+    """
+    paths = [str(uri) for uri in uris or ()]
+    if not paths or not all(path.lower().endswith(TIFF_EXTENSIONS) for path in paths):
+        return False
+    if len(paths) == 1:
+        return glob.has_magic(paths[0])
+    try:
+        layouts = {frame_layout(path) for path in paths}
+    except Exception as ex:
+        msg.logMessage("Could not read the TIFFs' headers; they won't be opened as a series.", level=msg.WARNING)
+        msg.logError(ex)
+        return False
+    return len(layouts) == 1 and next(iter(layouts))[0] == 1
+
+
+def series_paths(pattern: str):
+    """Return the paths matching a glob *pattern*, ordered by their frame numbers; only the directory is read."""
+    return sorted(glob.glob(pattern), key=natural_key)
+
+
+class TIFFSeries(object):
+    """
+    An array-like stack of single-frame TIFF files, read only as frames are indexed.
+
+    The first file's frame shape and dtype are the series'; each file's header is checked against them as it's read,
+    and a file holding more (or another shape of) frames raises a ValueError. A frame stored uncompressed and
+    contiguously is read by memory-mapping it; otherwise it's decoded with tifffile.
+    """
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        pages, frame_shape, self.dtype = frame_layout(self.paths[0])
+        if pages != 1:
+            raise ValueError(f'{self.paths[0]} holds {pages} pages; a TIFF series has one frame per file.')
+        self.shape = (len(self.paths),) + frame_shape
+        self.ndim = len(self.shape)
+
+    def read_frame(self, index: int) -> np.ndarray:
+        path = self.paths[index]
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            dtype = np.dtype(page.dtype).newbyteorder(tif.byteorder)
+            if len(tif.pages) != 1 or tuple(page.shape) != self.shape[1:] or dtype != self.dtype:
+                raise ValueError(f'{path} holds {len(tif.pages)} {page.shape} {dtype} frame(s); the rest of its TIFF '
+                                 f'series holds one {self.shape[1:]} {self.dtype} frame per file.')
+            if not page.is_memmappable:
+                return page.asarray()
+            offset = page.dataoffsets[0]
+        return np.array(np.memmap(path, dtype=self.dtype, mode='r', offset=offset, shape=self.shape[1:]))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        if not isinstance(item, tuple):
+            item = (item,)
+        frames, rest = item[0], item[1:]
+        if isinstance(frames, (int, np.integer)):
+            return self.read_frame(int(frames))[rest]
+        indices = range(len(self))[frames]
+        stack = np.empty((len(indices),) + self.shape[1:], dtype=self.dtype)
+        for i, index in enumerate(indices):
+            stack[i] = self.read_frame(index)
+        return stack[(slice(None),) + rest]
+
+
+def series_to_dask(series: TIFFSeries):
+    return da.from_array(series,
+                         chunks=(1,) + series.shape[1:],
+                         name=f'tiff-series-{series.paths[0]}-{len(series)}',
+                         asarray=True,
+                         fancy=False)
+
+
+def ingest_tiff_series(paths):
+    paths = [str(path) for path in paths]
+    if len(paths) == 1 and glob.has_magic(paths[0]):
+        pattern = paths[0]
+        paths = series_paths(pattern)
+        if not paths:
+            raise FileNotFoundError(f'No files match {pattern}')
+    else:
+        paths = sorted(paths, key=natural_key)
+
+    series = TIFFSeries(paths)
+    image = series_to_dask(series)
+    frames = len(series)
+    times = [os.path.getmtime(path) for path in paths]
+
+    with RunBuilder(metadata={'paths': paths,
+                              'sample_name': f'Series: {os.path.splitext(os.path.basename(paths[0]))[0]}…'}) as builder:
+        builder.add_stream('primary',
+                           data_keys={'image': {'source': os.path.dirname(paths[0]),
+                                                'dtype': 'array',
+                                                'shape': series.shape[1:]}})
+        builder.add_data('primary',
+                         data={'image': image},
+                         time=times,
+                         timestamps={'image': times},
+                         seq_num=list(range(1, frames + 1)))
+
+    yield from builder._cache
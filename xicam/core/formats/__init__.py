@@ -1 +1 @@
-from . import NPYPlugin
+from . import NPYPlugin, HDF5Plugin, TIFFSeriesPlugin
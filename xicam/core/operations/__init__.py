@@ -1,3 +1,6 @@
+from typing import Tuple
+
+from xicam.core.data.roistats import ROIStatistics
 from xicam.core.intents import ImageIntent
 from xicam.plugins.operationplugin import operation, output_names, display_name, describe_input, describe_output, \
     categories, intent, visible
@@ -78,6 +81,18 @@ def inverse_fourier_transform(spectral_data: np.ndarray) -> np.ndarray:
     return scipy.fft.ifft2(spectral_data)
 
 
+@operation
+@output_names("sum", "count", "mean")
+@display_name("ROI Statistics")
+@categories(("General", "Statistics"))
+@visible('images', False)
+@visible('roi', False)
+def roi_statistics(images: np.ndarray, roi: list) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # All ROIs' statistics over all frames, in one pass over the images; each output is shaped (frames, ROIs)
+    statistics = ROIStatistics(roi).compute(images)
+    return statistics["sum"], statistics["count"], statistics["mean"]
+
+
 @operation
 @output_names("output")
 @display_name("TupleGroupParameter Test")
@@ -0,0 +1,395 @@
+import time
+
+import numpy as np
+import pytest
+
+from xicam.core.data import NonDBHeader, DocMetaArray, lazyfield
+from xicam.core.data.cache import FrameCache, frame_cache
+from xicam.core.data.pool import ResourcePool
+
+
+class CountingHandler(object):
+    calls = []
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, index=0):
+        self.calls.append(index)
+        return np.full((4, 4), index, dtype=np.uint16)
+
+
+@pytest.fixture(autouse=True)
+def empty_frame_cache():
+    # Fields of the same handler and resource share entries in the global cache, so one test's frames could serve another
+    frame_cache.clear()
+    yield
+    frame_cache.clear()
+
+
+def lazy_header(frames):
+    CountingHandler.calls = []
+    events = [{"data": {"image": lazyfield(CountingHandler, ("stack.raw",), {"index": i})}} for i in range(frames)]
+    return NonDBHeader({"uid": "start"}, [], events, {"uid": "stop"})
+
+
+def test_frame_cache_is_byte_bounded_lru():
+    frame = np.zeros((10, 10), dtype=np.uint8)  # 100 bytes
+    cache = FrameCache(max_bytes=250)
+    cache.put("a", frame)
+    cache.put("b", frame)
+    cache.get("a")  # 'a' becomes most recently used
+    cache.put("c", frame)
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.nbytes == 200
+
+    cache.put("huge", np.zeros(1000, dtype=np.uint8))
+    assert "huge" not in cache
+
+
+def test_docmetaarray_reuses_decoded_frames():
+    array = DocMetaArray(lazy_header(10), "image", cache=FrameCache(), prefetch_depth=0)
+
+    for _ in range(3):
+        for i in range(10):
+            assert array[i][0, 0] == i
+
+    assert sorted(CountingHandler.calls) == list(range(10))
+    # The frames are only held in the array's own cache
+    assert len(array.cache) == 10 and not len(frame_cache)
+
+
+def test_docmetaarray_reads_ahead():
+    cache = FrameCache()
+    array = DocMetaArray(lazy_header(20), "image", cache=cache, prefetch_depth=4)
+
+    array[0]
+    array[1]
+    array[2]
+
+    deadline = time.time() + 5
+    while not all(array._frame_key(i) in cache for i in range(3, 7)) and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert all(array._frame_key(i) in cache for i in range(3, 7))
+    assert array._frame_key(10) not in cache
+
+
+def test_lazyfields_share_pooled_handlers():
+    constructed = []
+
+    class TrackingHandler(CountingHandler):
+        def __init__(self, path):
+            super(TrackingHandler, self).__init__(path)
+            constructed.append(path)
+
+    fields = [lazyfield(TrackingHandler, ("shared.raw",), {"index": i}, cache=FrameCache()) for i in range(100)]
+    for field in fields:
+        field.asarray()
+
+    assert constructed == ["shared.raw"]
+
+    # A checked-out handler stays open while it's in use, however full the pool gets
+    from xicam.core.data.pool import handler_pool
+
+    with fields[0].checkout() as handler:
+        for i in range(handler_pool.max_open + 1):
+            lazyfield(CountingHandler, (f"other-{i}.raw",), {}, cache=FrameCache()).asarray()
+        assert fields[0].handler_key in handler_pool
+        assert handler(index=3)[0, 0] == 3
+
+
+def test_resource_pool_closes_least_recently_used():
+    closed = []
+    pool = ResourcePool(max_open=2)
+    with pool.checkout("a", lambda: "a", closed.append):
+        for key in "bcd":
+            with pool.checkout(key, lambda: key, closed.append):
+                pass
+
+    # 'a' was checked out the whole time, so it outlives 'b' and 'c'
+    assert closed == ["b", "c"]
+    assert "a" in pool and "d" in pool
+
+
+def columnar_header():
+    descriptors = [{"uid": "d-primary", "name": "primary"}, {"uid": "d-baseline", "name": "baseline"}]
+    header = NonDBHeader({"uid": "start"}, descriptors, [], {"uid": "stop"})
+    for i in range(5):
+        header.append("event", {"descriptor": "d-primary", "seq_num": i + 1, "time": 1.5e9 + i,
+                                "data": {"intensity": i * 10, "image": np.ones((2, 2)) * i},
+                                "timestamps": {"intensity": 1.5e9 + i, "image": 1.5e9 + i}})
+    header.append("event", {"descriptor": "d-primary", "seq_num": 6, "time": 1.5e9 + 5, "data": {"motor": 3.0}})
+    header.append("event", {"descriptor": "d-baseline", "seq_num": 1, "time": 1.5e9, "data": {"temperature": 273}})
+    return header
+
+
+def test_nondbheader_columnar_events():
+    header = columnar_header()
+
+    assert header.stream_names == ["primary", "baseline"]
+    assert header.fields() == {"intensity", "image", "motor", "temperature"}
+    assert header.fields("baseline") == {"temperature"}
+    assert [event["seq_num"] for event in header.events(fields=["intensity"])] == [1, 2, 3, 4, 5]
+    assert [event["seq_num"] for event in header.events(fields=["motor", "intensity"])] == [1, 2, 3, 4, 5, 6]
+    assert len(list(header.events(stream_name="baseline"))) == 1
+
+
+def test_nondbheader_table():
+    table = columnar_header().table(fields=["intensity", "motor"], localize_times=False)
+
+    assert list(table.columns) == ["time", "intensity", "motor"]
+    assert list(table.index) == [1, 2, 3, 4, 5, 6]
+    np.testing.assert_array_equal(table["intensity"].values[:5], [0, 10, 20, 30, 40])
+    assert np.isnan(table["intensity"].values[5]) and table["motor"].values[5] == 3.0
+    assert str(table["time"].iloc[0]) == "2017-07-14 02:40:00"
+
+
+def test_event_columns_mixed_values():
+    from xicam.core.data import _EventColumns
+
+    columns = _EventColumns()
+    columns.append(0, {"seq_num": 1, "data": {"value": 1.0, "count": 1}})
+    columns.append(1, {"seq_num": 2, "data": {"value": np.arange(3)}})
+
+    # A scalar followed by an array is held as objects, one per row
+    column = columns.column("value")
+    assert column.dtype == object and len(column) == 2
+    np.testing.assert_array_equal(column[1], np.arange(3))
+    # Integers missing from some rows are filled as floats
+    assert columns.column("count").dtype == float
+
+
+def test_directory_run_rescans_incrementally(tmp_path):
+    import tifffile
+    from xicam.core.data.directory import DirectoryRun
+
+    def write_frames(indices):
+        for i in indices:
+            tifffile.imwrite(str(tmp_path / f"frame_{i}.tif"), np.full((4, 5), i, np.uint16))
+
+    write_frames(range(5))
+    directory_run = DirectoryRun(tmp_path, settle_time=0)
+    assert directory_run.rescan() == 5
+    assert directory_run.rescan() == 0  # directory unchanged
+
+    write_frames(range(5, 8))
+    (tmp_path / "notes.txt").write_text("not a frame")
+    assert directory_run.rescan() == 3
+
+    image = directory_run.run.primary.to_dask()["image"].data
+    assert image.shape == (8, 4, 5)
+    assert [int(image[i, 0, 0].compute()) for i in range(8)] == list(range(8))
+
+
+def test_load_directory_keeps_recent_runs(tmp_path, monkeypatch):
+    from xicam.core.data import directory
+
+    monkeypatch.setattr(directory, "max_directory_runs", 2)
+    monkeypatch.setattr(directory, "_directory_runs", directory.OrderedDict())
+    paths = [tmp_path / name for name in "abc"]
+    for path in paths:
+        path.mkdir()
+        directory.load_directory(path)
+    directory.load_directory(paths[1])
+    assert list(directory._directory_runs) == [str(paths[2]), str(paths[1])]
+
+
+def test_run_summary_from_descriptors(tmp_path):
+    from bluesky_live.run_builder import RunBuilder
+    from xicam.core.data.bluesky_utils import RunSummaryCache, run_from_doc_stream
+
+    with RunBuilder() as builder:
+        builder.add_stream("primary",
+                           data={"detector_image": [np.zeros((4, 5))] * 3, "temperature": [1, 2, 3]},
+                           data_keys={"detector_image": {"source": "test", "dtype": "array", "shape": [4, 5]},
+                                      "temperature": {"source": "test", "dtype": "number", "shape": []}})
+    run = run_from_doc_stream(iter(builder._cache))
+
+    cache = RunSummaryCache(cache_dir=str(tmp_path))
+    summary = cache.get(run)
+    assert summary.guess_stream_field() == ("primary", "detector_image")
+    assert summary.streams["primary"]["detector_image"]["shape"] == [4, 5]
+    assert not summary.is_image_field("primary", "temperature")
+    assert summary.event_counts == {"primary": 3}
+    assert cache.get(run) is summary
+
+    # A fresh cache picks the summary up from disk
+    assert RunSummaryCache(cache_dir=str(tmp_path)).get(run).to_dict() == summary.to_dict()
+
+
+def test_event_page_batcher_packs_events_in_order():
+    from xicam.core.data.batching import EventPageBatcher, simulated_documents
+
+    received = []
+    batcher = EventPageBatcher(lambda name, doc: received.append((name, doc)), max_events=100, max_latency=None)
+    for name, doc in simulated_documents(250, rate=None):
+        batcher(name, doc)
+
+    assert [name for name, doc in received] == ["start", "descriptor", "event_page", "event_page", "event_page", "stop"]
+    assert [len(doc["seq_num"]) for name, doc in received if name == "event_page"] == [100, 100, 50]
+
+
+def test_event_page_batcher_flushes_after_latency():
+    from xicam.core.data.batching import EventPageBatcher, simulated_documents
+
+    received = []
+    batcher = EventPageBatcher(lambda name, doc: received.append(name), max_events=100, max_latency=0.01)
+    documents = simulated_documents(5, rate=None)
+    for name, doc in list(documents)[:-1]:  # no stop document yet
+        batcher(name, doc)
+
+    deadline = time.time() + 5
+    while "event_page" not in received and time.time() < deadline:
+        time.sleep(0.01)
+    assert received == ["start", "descriptor", "event_page"]
+
+
+def test_compressed_frame_cache():
+    from xicam.core.data.cache import CompressedFrameCache
+
+    sparse = np.zeros((256, 256), dtype=np.uint16)
+    sparse[::17, ::13] = 7
+    cache = CompressedFrameCache(max_bytes=4 * 2 ** 20)
+    cache.put("sparse", sparse)
+
+    np.testing.assert_array_equal(cache.get("sparse"), sparse)
+    assert cache.compression_ratio > 5
+
+    noise = np.random.random((64, 64))
+    cache.put("noise", noise)  # incompressible; stored raw
+    np.testing.assert_array_equal(cache.get("noise"), noise)
+
+
+def test_compressed_frame_cache_protects_frequently_used_frames():
+    from xicam.core.data.cache import CompressedFrameCache
+
+    frame = lambda i: np.random.default_rng(i).random((16, 16))  # 2 KiB, incompressible
+    cache = CompressedFrameCache(max_bytes=8 * 2048, codec="zlib")
+    cache.put("hot", frame(0))
+    cache.get("hot")  # a second use protects it
+
+    for i in range(1, 20):  # a single pass over many other frames
+        cache.put(i, frame(i))
+
+    assert "hot" in cache
+    assert 1 not in cache and 19 in cache
+    assert cache.nbytes <= 8 * 2048
+
+
+def test_playback_prefetcher_keeps_up_with_playback():
+    from xicam.core.data.cache import PlaybackPrefetcher
+
+    reads = []
+
+    def slow_loader(i):
+        reads.append(i)
+        time.sleep(0.02)
+        return np.full((16, 16), i)
+
+    cache = FrameCache()
+    prefetcher = PlaybackPrefetcher(slow_loader, lambda i: ("playback", i), 200, cache, workers=4)
+
+    # Play at ~200 fps, 4x faster than one worker could read
+    hits = 0
+    for i in range(60):
+        hits += ("playback", i) in cache
+        assert prefetcher.get(i)[0, 0] == i
+        time.sleep(0.005)
+    assert prefetcher.depth > prefetcher.min_depth
+    assert hits > 30
+
+    # A jump drops the prefetches queued around the old position; only reads already under way finish
+    read_before_jump = len(reads)
+    prefetcher.get(150)
+    time.sleep(0.5)
+    stale = [i for i in reads[read_before_jump:] if abs(i - 150) > prefetcher.max_depth]
+    assert len(stale) <= prefetcher.workers
+    assert ("playback", 151) in cache
+    prefetcher.shutdown()
+
+
+def test_playback_prefetcher_cancels_queued_reads():
+    from xicam.core.data.cache import PlaybackPrefetcher
+
+    def slow_loader(i):
+        time.sleep(0.05)
+        return np.full((4, 4), i)
+
+    prefetcher = PlaybackPrefetcher(slow_loader, lambda i: ("queued", i), 1000, FrameCache(), workers=1)
+    prefetcher.notify(0)
+    # Jumping away cancels the reads still queued around the old position
+    prefetcher.notify(500)
+    assert all(abs(i - 500) <= prefetcher.max_depth for i in prefetcher._futures if not prefetcher._futures[i].running())
+    prefetcher.shutdown()
+    assert not prefetcher._futures
+
+
+def test_frame_ring_buffer_overwrites_oldest_frames():
+    from xicam.core.data.ringbuffer import FrameRingBuffer
+
+    buffer = FrameRingBuffer(4)
+    assert buffer.latest() is None
+    for i in range(6):
+        assert buffer.push(np.full((8, 8), i, dtype=np.uint16), timestamp=i) == i
+
+    assert len(buffer) == 4 and buffer.count == 6
+    assert buffer.nbytes == 4 * 8 * 8 * 2
+    number, frame, timestamp = buffer.latest()
+    assert number == 5 and frame[0, 0] == 5 and timestamp == 5
+    assert buffer.get(1) == (None, None)
+    assert buffer.get(2)[0][0, 0] == 2
+    np.testing.assert_array_equal(buffer.frames()[:, 0, 0], [2, 3, 4, 5])
+
+    # A frame of a new shape starts over
+    buffer.push(np.zeros((4, 4)))
+    assert len(buffer) == 1 and buffer.get(5) == (None, None)
+
+
+def test_simulated_detector_benchmark():
+    from xicam.core.data.simdetector import SimulatedAreaDetector, benchmark
+
+    detector = SimulatedAreaDetector(shape=(32, 32), acquire_period=0.01)
+    detector.cam.acquire.put(0)
+    counter = detector.image1.array_counter.get()
+    detector.trigger()
+    assert detector.image1.array_counter.get() == counter + 1
+    assert detector.image1.shaped_image.get().shape == (32, 32)
+
+    # Acquisition outpaces the display, which drops the frames it can't keep up with
+    stats = benchmark(duration=0.5, shape=(64, 64), acquire_period=0.002, display_fps=20, display_cost=0.01)
+    assert stats["acquired fps"] > 2 * stats["displayed fps"] > 0
+    assert stats["dropped"] > 0
+
+
+def test_roi_statistics_in_one_pass():
+    import dask.array as da
+    from xicam.core.data.roistats import ROIStatistics, label_overlaps
+
+    rng = np.random.default_rng(0)
+    stack = rng.random((20, 40, 50))
+    stack[3, 5, 5] = np.nan
+    masks = [np.zeros((40, 50), dtype=bool) for _ in range(3)]
+    masks[0][0:20, 0:20] = True
+    masks[1][10:30, 10:30] = True  # overlaps the first
+    masks[2][35:, 45:] = True
+
+    labels, membership = label_overlaps(masks)
+    assert labels.max() == len(membership) == 4  # first only, both, second only, third
+    assert membership.sum(axis=0).tolist() == [2, 2, 1]
+
+    expected_sums = np.array([[np.nansum(frame[mask]) for mask in masks] for frame in stack])
+    expected_counts = np.array([[np.isfinite(frame[mask]).sum() for mask in masks] for frame in stack])
+    statistics = ROIStatistics(masks)
+    for data in (stack, da.from_array(stack, chunks=(7, 15, 20))):
+        result = statistics.compute(data)
+        np.testing.assert_allclose(result["sum"], expected_sums)
+        np.testing.assert_array_equal(result["count"], expected_counts)
+        np.testing.assert_allclose(result["mean"], expected_sums / expected_counts)
+
+    # No regions: no statistics, but one row per frame
+    for data in (stack, da.from_array(stack, chunks=(7, 15, 20))):
+        result = ROIStatistics([]).compute(data)
+        assert all(result[statistic].shape == (20, 0) for statistic in ("sum", "count", "mean"))
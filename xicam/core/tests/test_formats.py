@@ -0,0 +1,100 @@
+import dask.array as da
+import numpy as np
+import pytest
+
+from xicam.core.data.bluesky_utils import run_from_doc_stream
+
+
+def test_npy_ingestor_is_lazy(tmp_path):
+    from xicam.core.formats.NPYPlugin import ingest_npy
+
+    path = str(tmp_path / "stack.npy")
+    stack = np.arange(10 * 8 * 8, dtype=np.uint16).reshape(10, 8, 8)
+    np.save(path, stack)
+
+    image = run_from_doc_stream(ingest_npy([path])).primary.to_dask()["image"].data
+
+    assert isinstance(image, da.Array)
+    assert image.chunks[1] == (1,) * 10
+    np.testing.assert_array_equal(image[0, 3].compute(), stack[3])
+
+
+def test_npy_ingestor_loads_object_arrays(tmp_path):
+    from xicam.core.formats.NPYPlugin import load_npy
+
+    path = str(tmp_path / "objects.npy")
+    np.save(path, np.array([{"a": 1}, None], dtype=object), allow_pickle=True)
+
+    assert load_npy(path)[0] == {"a": 1}
+
+
+def test_hdf5_ingestor_follows_chunk_layout(tmp_path):
+    import h5py
+    from xicam.core.formats.HDF5Plugin import ingest_hdf5, sniff_hdf5
+
+    path = str(tmp_path / "scan.h5")
+    stack = np.arange(100 * 16 * 16, dtype=np.uint16).reshape(100, 16, 16)
+    with h5py.File(path, "w") as file:
+        file.create_dataset("entry/data/data", data=stack, chunks=(10, 16, 16), compression="gzip")
+        file.create_dataset("entry/dark", data=np.ones((16, 16)))
+        file.create_dataset("entry/count", data=np.arange(100))
+
+    with open(path, "rb") as file:
+        assert sniff_hdf5(path, file.read(64)) == "application/x-hdf5"
+
+    documents = list(ingest_hdf5([path]))
+    pages = [doc for name, doc in documents if name == "event_page"]
+    assert [page["seq_num"][0] for page in pages] == [1, 71, 1]  # pages of 70 frames (whole chunks), then the dark
+
+    run = run_from_doc_stream(iter(documents))
+    assert set(run) == {"primary", "entry_dark"}
+    image = run.primary.to_dask()["entry_data_data"].data
+    assert isinstance(image, da.Array)
+    np.testing.assert_array_equal(image[37].compute(), stack[37])
+
+
+def test_tiff_series_ingestor(tmp_path):
+    import tifffile
+    from xicam.core.formats.TIFFSeriesPlugin import ingest_tiff_series, is_tiff_series, series_paths
+
+    for i in range(12):
+        # One compressed frame can't be memory-mapped, and is decoded instead
+        tifffile.imwrite(str(tmp_path / f"scan_{i}.tif"), np.full((8, 9), i, np.uint16),
+                         compression="zlib" if i == 5 else None)
+    tifffile.imwrite(str(tmp_path / "dark_1.tif"), np.zeros((8, 9), np.uint16))
+
+    pattern = str(tmp_path / "scan_*.tif")
+    paths = series_paths(pattern)
+    assert [path.rsplit("_", 1)[-1] for path in paths] == [f"{i}.tif" for i in range(12)]
+
+    # Only a pattern, or several files, is a series; a single numbered file isn't
+    assert is_tiff_series([pattern]) and is_tiff_series(paths[:2])
+    assert not is_tiff_series([paths[4]])
+
+    image = run_from_doc_stream(ingest_tiff_series([pattern])).primary.to_dask()["image"].data
+    assert image.shape == (12, 8, 9)
+    assert [int(image[i, 0, 0].compute()) for i in range(12)] == list(range(12))
+
+
+def test_tiff_series_rejects_mismatched_files(tmp_path):
+    import tifffile
+    from xicam.core.formats.TIFFSeriesPlugin import TIFFSeries, is_tiff_series
+
+    stacks = [str(tmp_path / f"stack_{i}.tif") for i in range(2)]
+    for i, path in enumerate(stacks):
+        for page in range(3):
+            tifffile.imwrite(path, np.full((8, 8), 10 * i + page, np.uint16), append=True, metadata=None)
+    frames = [str(tmp_path / "square.tif"), str(tmp_path / "tall.tif")]
+    tifffile.imwrite(frames[0], np.zeros((8, 8), np.uint16))
+    tifffile.imwrite(frames[1], np.ones((16, 4), np.uint16))  # the same file size
+
+    # Selections that aren't one frame per file, all alike, aren't taken for a series...
+    assert not is_tiff_series(stacks)
+    assert not is_tiff_series(frames)
+    # ...and if they're read as one anyway (e.g. from a pattern), they raise rather than lose or garble frames
+    with pytest.raises(ValueError):
+        TIFFSeries(stacks)
+    series = TIFFSeries(frames)
+    assert series[0].shape == (8, 8)
+    with pytest.raises(ValueError):
+        series[1]
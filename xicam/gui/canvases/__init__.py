@@ -45,6 +45,7 @@ from xicam.plugins import manager as plugin_manager
 #     # @abstractmethod
 #     def unrender(self, intent):
 #         pass
+from xicam.gui.widgets.multicurve import CurveHandle, MultiCurveItem
 from xicam.gui.widgets.plotwidgetmixins import CurveLabels
 from xicam.plugins.intentcanvasplugin import IntentCanvas
 
@@ -127,11 +128,22 @@ class PlotIntentCanvasBlend(CurveLabels):
 
 
 class PlotIntentCanvas(XicamIntentCanvas):
+    """
+    Overlays plot intents.
+
+    Once the canvas would have more than ``batch_threshold`` curves, the (plain line) curves of further plot intents are
+    drawn together by one MultiCurveItem, with one legend entry per intent, rather than as a PlotDataItem each.
+    """
+    batch_threshold = 16
+
     def __init__(self, *args, **kwargs):
         super(PlotIntentCanvas, self).__init__(*args, **kwargs)
 
         self.setLayout(QVBoxLayout())
         self.canvas_widget = None
+        self._curves = None  # MultiCurveItem
+        self._legend_entries = {}  # intent -> CurveHandle
+        self._colors = {}  # item -> color last applied
 
     def colorize(self):
         count = len(self.intent_to_items)
@@ -147,12 +159,17 @@ class PlotIntentCanvas(XicamIntentCanvas):
             color = get_color(i, count)
 
             for j, item in enumerate(items):
-                if isinstance(item, pg.PlotDataItem):
+                if isinstance(item, (pg.PlotDataItem, CurveHandle)):
                     if count == 1:
                         color = get_color(j, len(items))
+                    # Only restyle the items whose color changed
+                    if self._colors.get(item) == color.rgba():
+                        continue
+                    self._colors[item] = color.rgba()
                     item.setPen(color)
-                    item.setSymbolBrush(color)
-                    item.setSymbolPen('w')
+                    if isinstance(item, pg.PlotDataItem):
+                        item.setSymbolBrush(color)
+                        item.setSymbolPen('w')
 
     def render(self, intent):
         if not self.canvas_widget:
@@ -178,17 +195,30 @@ class PlotIntentCanvas(XicamIntentCanvas):
 
             symbol = intent.kwargs.get("symbol", None)
 
-            for i in range(len(ys)):
-                name = intent.name
-                if multicurves:
-                    name += f' {i + 1}'
-
-                if isinstance(intent, ScatterIntent):
-                    item = ScatterPlotItem(x=x, y=ys[i], name=name, symbol=symbol)
-                    self.canvas_widget.plotItem.addItem(item)
-                elif isinstance(intent, (PlotIntent, ErrorBarIntent)):
-                    item = self.canvas_widget.plot(x=x, y=ys[i], name=name, symbol=symbol)
-                items.append(item)
+            batched = (not isinstance(intent, (ErrorBarIntent, ScatterIntent)) and symbol is None
+                       and sum(map(len, self.intent_to_items.values())) + len(ys) > self.batch_threshold)
+            if batched:
+                if self._curves is None:
+                    self._curves = MultiCurveItem()
+                    self.canvas_widget.plotItem.addItem(self._curves)
+                keys = self._curves.addCurves(x, ys)
+                items.extend(CurveHandle(self._curves, [key], intent.name + (f' {i + 1}' if multicurves else ''))
+                             for i, key in enumerate(keys))
+                self._legend_entries[intent] = CurveHandle(self._curves, keys, intent.name)
+                if self.canvas_widget.plotItem.legend is not None:
+                    self.canvas_widget.plotItem.legend.addItem(self._legend_entries[intent], intent.name)
+            else:
+                for i in range(len(ys)):
+                    name = intent.name
+                    if multicurves:
+                        name += f' {i + 1}'
+
+                    if isinstance(intent, ScatterIntent):
+                        item = ScatterPlotItem(x=x, y=ys[i], name=name, symbol=symbol)
+                        self.canvas_widget.plotItem.addItem(item)
+                    elif isinstance(intent, (PlotIntent, ErrorBarIntent)):
+                        item = self.canvas_widget.plot(x=x, y=ys[i], name=name, symbol=symbol)
+                    items.append(item)
 
             # Use most recent intent's log mode for the canvas's log mode
             x_log_mode = intent.kwargs.get("xLogMode", self.canvas_widget.plotItem.getAxis("bottom").logMode)
@@ -227,7 +257,14 @@ class PlotIntentCanvas(XicamIntentCanvas):
         if intent in self.intent_to_items:
             items = self.intent_to_items[intent]
             for item in items:
-                self.canvas_widget.plotItem.removeItem(item)
+                if isinstance(item, CurveHandle):
+                    item.remove()
+                else:
+                    self.canvas_widget.plotItem.removeItem(item)
+                self._colors.pop(item, None)
+            legend_entry = self._legend_entries.pop(intent, None)
+            if legend_entry is not None and self.canvas_widget.plotItem.legend is not None:
+                self.canvas_widget.plotItem.legend.removeItem(legend_entry)
             del self.intent_to_items[intent]
             self.colorize()
 
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from pytestqt import qtbot
+
+pyFAI = pytest.importorskip("pyFAI")
+
+
+def close(w, qtbot):
+    # Delete the view (and its ViewBoxes) now, rather than in a later test's event loop
+    w.close()
+    w.deleteLater()
+    qtbot.wait(10)
+
+
+def test_cake_display_reuses_integrator(qtbot):
+    from pyFAI import detectors
+    from pyFAI.geometry import Geometry
+    from xicam.gui.widgets.cake import integrators
+    from xicam.gui.widgets.imageviewmixins import EwaldCorrected, DisplayMode
+
+    geometry = Geometry(wavelength=0.123984e-09)
+    geometry.detector = detectors.Pilatus300k()
+    geometry.setFit2D(centerX=237.5, centerY=30.5, directDist=283.27, pixelX=172, pixelY=172)
+
+    w = EwaldCorrected()
+    qtbot.addWidget(w)
+    w.setImage(np.random.random((3,) + geometry.detector.shape), geometry=geometry)
+    w.setDisplayMode(DisplayMode.cake)
+    w.setCurrentIndex(1)
+    assert w.imageItem.image.shape == (w.cake_azimuthal_bins, w.cake_radial_bins)
+
+    # Every frame is caked by the same integrator, with the tables built for the first
+    integrator = integrators.get(geometry)
+    engines = dict(integrator.engines)
+    w.setCurrentIndex(2)
+    assert integrators.get(geometry) is integrator
+    assert all(integrator.engines[key] is engine for key, engine in engines.items())
+    close(w, qtbot)
+
+
+def test_cake_axes_without_integrating(qtbot, monkeypatch):
+    from pyFAI import detectors
+    from pyFAI.geometry import Geometry
+    from qtpy.QtCore import QPointF
+    from xicam.gui.widgets.cake import cake, cake_axes, integrators
+    from xicam.gui.widgets.imageviewmixins import EwaldCorrected, DisplayMode
+
+    geometry = Geometry(wavelength=0.123984e-09)
+    geometry.detector = detectors.Pilatus300k()
+    geometry.setFit2D(centerX=237.5, centerY=30.5, directDist=283.27, pixelX=172, pixelY=172)
+    image = np.random.random(geometry.detector.shape)
+
+    _, radial, chi = cake(image, geometry, 200, 90)
+    expected_radial, expected_chi = cake_axes(geometry, image.shape, 200, 90)
+    np.testing.assert_allclose(radial, expected_radial, rtol=1e-5)
+    np.testing.assert_allclose(chi, expected_chi, atol=1e-3)
+
+    w = EwaldCorrected()
+    qtbot.addWidget(w)
+    w.setImage(image, geometry=geometry)
+    w.displaymode = DisplayMode.cake
+    integrator = integrators.get(geometry)
+    monkeypatch.setattr(integrator, "integrate2d", lambda *args, **kwargs: pytest.fail("transform() integrated"))
+    corner = w.transform(image).map(QPointF(0, 0))
+    radial, chi = cake_axes(geometry, image.shape, w.cake_radial_bins, w.cake_azimuthal_bins)
+    assert corner.x() == pytest.approx(radial[-1, 0]) and corner.y() == pytest.approx(chi[-1, 0])
+    close(w, qtbot)
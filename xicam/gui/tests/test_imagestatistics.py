@@ -0,0 +1,40 @@
+import numpy as np
+from pytestqt import qtbot
+
+
+def test_image_statistics(qtbot):
+    from xicam.gui.widgets.imagestatistics import ImageStatistics, data_key, strided_sample
+
+    # Samples are bounded, and stride whole frames first
+    data = np.random.random((100, 512, 512))
+    sample = strided_sample(data, max_size=1e5, max_frames=10)
+    assert sample.shape[0] == 10 and sample.size <= 1.2e5
+
+    # Same id, new contents: a different key
+    frame = np.zeros((64, 64))
+    key = data_key(frame)
+    frame[::8] = 1
+    assert data_key(frame) != key
+
+    statistics = ImageStatistics(max_entries=2)
+    levels = statistics.levels(data)
+    assert statistics.levels(data) is levels
+
+    # Results are delivered to the most recent request of each consumer only
+    results = []
+
+    class Consumer(object):
+        def ready(self, hist):
+            results.append(hist)
+
+    consumer = Consumer()
+    images = [np.arange(i, 10000 + i, dtype=np.uint16).reshape(100, 100) for i in range(3)]
+    for image in images:
+        assert statistics.histogram(image, callback=consumer.ready) is None
+    qtbot.waitUntil(lambda: len(results) > 0, timeout=5000)
+    qtbot.wait(100)
+    assert len(results) == 1 and results[0][0][0] == 2
+    assert statistics.histogram(images[-1], callback=consumer.ready) is results[0]
+
+    # The cache is bounded
+    assert len(statistics) <= 2
@@ -1,5 +1,6 @@
 import os
 import pytest
+from pyqtgraph import functions as fn
 from pytestqt import qtbot
 camsaxs = pytest.importorskip("camsaxs")
 
@@ -51,3 +52,104 @@ def test_betterlayout(qtbot):
 
     w.show()
     #qtbot.stopForInteraction()
+
+
+def test_logScaleLookupTable(qtbot):
+    from xicam.gui.widgets.imageviewmixins import LogScaleImageItem
+    import numpy as np
+
+    data = (np.random.random((64, 64)) * 5000).astype(np.uint16)
+    levels = [10, 4000]
+
+    lutItem = LogScaleImageItem(data, levels=levels)
+    lutItem.render()
+    floatItem = LogScaleImageItem(data.astype(np.float64), levels=levels)
+    floatItem.render()
+
+    # Integer frames are mapped through a lookup table rather than transformed per pixel
+    assert lutItem._logImage is None and lutItem._logLut is not None
+    lutPixels = fn.imageToArray(lutItem.qimage).astype(int)
+    floatPixels = fn.imageToArray(floatItem.qimage).astype(int)
+    assert np.abs(lutPixels - floatPixels).max() <= 1
+
+    # Changing the levels reuses the cached index frame; only the table is rebuilt
+    index = lutItem._logIndex
+    lutItem.setLevels([100, 2000])
+    lutItem.render()
+    assert lutItem._logIndex is index and lutItem._logLut[0][2] == (100, 2000)
+
+
+def test_xarrayview_prefetches_lazy_stacks(qtbot):
+    from xicam.gui.widgets.imageviewmixins import XArrayView
+    from xarray import DataArray
+    import dask.array as da
+    import numpy as np
+
+    data = da.from_array(np.random.random((50, 32, 32)), chunks=(1, 32, 32))
+    w = XArrayView()
+    qtbot.addWidget(w)
+    w.setImage(DataArray(data, dims=['t', 'y', 'x']))
+    w.setCurrentIndex(10)
+
+    prefetcher = w._prefetcher
+    assert prefetcher is not None
+    qtbot.waitUntil(lambda: all(prefetcher.key(i) in prefetcher.cache for i in (11, 12)), timeout=5000)
+    np.testing.assert_array_equal(w.imageItem.image, np.asarray(data[10]))
+    prefetcher.shutdown()
+
+
+def test_depthplot_serves_profiles_from_blocks(qtbot):
+    from xicam.gui.widgets.imageviewmixins import DepthPlot
+    from xarray import DataArray
+    import dask.array as da
+    import numpy as np
+
+    data = np.random.random((20, 100, 100))
+    w = DepthPlot()
+    qtbot.addWidget(w)
+    w.setImage(DataArray(da.from_array(data, chunks=(1, 50, 50)), dims=['E', 'y', 'x'],
+                         coords=[np.arange(20), np.arange(100), np.arange(100)]))
+
+    # The first profile in a block is loaded in the background
+    w.crosshair.setPos((10, 20))
+    w.plotDepth()
+    qtbot.waitUntil(lambda: w._plotitem.yData is not None and np.allclose(w._plotitem.yData, data[:, 20, 10]),
+                    timeout=5000)
+
+    # Within the same block, it's answered right away
+    w.crosshair.setPos((30, 40))
+    w.plotDepth()
+    np.testing.assert_allclose(w._plotitem.yData, data[:, 40, 30])
+
+
+def test_deviceview_decouples_acquisition_from_display(qtbot):
+    from xicam.gui.widgets.imageviewmixins import DeviceView
+    from xicam.core.data.simdetector import SimulatedAreaDetector
+
+    device = SimulatedAreaDetector(shape=(64, 64), acquire_period=0.005)
+    w = DeviceView(device=device, max_fps=100, display_fps=10, allow_active=False)
+    qtbot.addWidget(w)
+    w.show()
+
+    qtbot.waitUntil(lambda: w.statistics['displayed'] >= 3, timeout=10000)
+    stats = w.statistics
+    assert stats['acquired'] > stats['displayed']
+    assert stats['dropped'] > 0
+    assert w.imageItem.image.shape == (64, 64)
+    assert len(w.buffer) > 0
+
+
+def test_histogram_ready_isnt_an_image_change(qtbot):
+    from xicam.gui.widgets.imageviewmixins import ImageViewHistogramOverflowFix
+    import numpy as np
+
+    w = ImageViewHistogramOverflowFix()
+    qtbot.addWidget(w)
+    changes = []
+    w.imageItem.sigImageChanged.connect(lambda: changes.append(True))
+
+    # The histogram is computed in the background, then drawn without announcing another image
+    with qtbot.waitSignal(w.imageItem.sigHistogramReady):
+        w.setImage(np.random.random((300, 300)))
+    assert len(changes) == 1
+    assert w.ui.histogram.item.plot.yData is not None
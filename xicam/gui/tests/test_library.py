@@ -9,6 +9,7 @@ from pytestqt import qtbot
 import event_model
 from databroker.in_memory import BlueskyInMemoryCatalog
 from xicam.gui.widgets.library import LibraryWidget, LibraryView
+from qtpy.QtCore import QSize
 from qtpy.QtWidgets import QWidget, QHBoxLayout, QSlider
 from functools import partial
 
@@ -93,6 +94,45 @@ def test_library_widget(qtbot):
     # qtbot.stopForInteraction()
 
 
+# Test that a large library only makes (and loads) the tiles in view
+def test_library_widget_virtualized(qtbot):
+    from threading import Lock
+    loaded = []
+    lock = Lock()
+
+    def loader(i):
+        with lock:
+            loaded.append(i)
+        return np.full((1000, 1000), i, dtype=float), f"Run {i}"
+
+    l = LibraryWidget(tile_size=QSize(200, 200))
+    qtbot.addWidget(l)
+    for i in range(5000):
+        l.set_entry(i, partial(loader, i), f"Run {i}")
+    l.refresh()
+    l.resize(800, 600)
+    l.show()
+
+    visible = l.grid.visibleRange()
+    assert 0 < len(visible) < 50
+    qtbot.waitUntil(lambda: all(l.grid.tileAt(i).image_item.image is not None for i in visible))
+    tiles = len(l.grid.tiles)
+    assert tiles == len(visible)
+    assert set(loaded) <= set(visible)
+    assert l.grid.tileAt(visible[0]).image_item.image.shape == (250, 250)
+
+    # Scrolling reuses the tiles, which show placeholders until their thumbnails load
+    l.grid.verticalScrollBar().setValue(l.grid.verticalScrollBar().maximum())
+    visible = l.grid.visibleRange()
+    assert visible[-1] == 4999
+    assert len(l.grid.tiles) == tiles
+    assert not l.grid.tileAt(4999).placeholder.isHidden()
+    qtbot.waitUntil(lambda: all(l.grid.tileAt(i).image_item.image is not None for i in visible))
+    assert l.grid.tileAt(4999).image_item.image[0, 0] == 4999
+    assert l.grid.tileAt(4999).label.text() == "Run 4999"
+    assert len(loaded) < 100
+
+
 # Test the LibraryView bound to a catalog of runs
 @pytest.mark.parametrize("random_data_catalog", ((10, FRAMES),), indirect=True)
 def test_library_view(qtbot, random_data_catalog):
@@ -114,3 +154,7 @@ def test_library_view(qtbot, random_data_catalog):
 
     qtbot.addWidget(w)
     # qtbot.stopForInteraction()
+
+    # Previews are downsampled before they're read
+    image, label = LibraryView.load_preview(random_data_catalog[-1], {"E": 0}, size=32)
+    assert image.shape == (25, 25)
@@ -22,3 +22,27 @@ def test_metadataview(qtbot, catalog):
 
     w = MetadataView(catalogmodel, selectionmodel)
     w.show()
+
+
+def test_metadatawidget_consumes_live_pages_in_gui_thread(qtbot, monkeypatch):
+    import threading
+    from xicam.core.data.batching import simulated_documents
+    from xicam.gui.widgets.metadataview import MetadataWidget
+
+    consumed = []
+    consume = MetadataWidget._consume
+
+    def record(self, name, doc):
+        consumed.append((name, threading.current_thread() is threading.main_thread()))
+        consume(self, name, doc)
+
+    monkeypatch.setattr(MetadataWidget, "_consume", record)
+    w = MetadataWidget()
+    qtbot.addWidget(w)
+    # Without a stop document, the events are flushed by the batcher's timer, off the GUI thread
+    for name, doc in simulated_documents(5, rate=None):
+        if name != "stop":
+            w.doc_consumer(name, doc)
+    qtbot.waitUntil(lambda: "event_page" in [name for name, _ in consumed])
+    assert [name for name, _ in consumed] == ["start", "descriptor", "event_page"]
+    assert all(in_main_thread for _, in_main_thread in consumed)
@@ -0,0 +1,54 @@
+import numpy as np
+from pytestqt import qtbot
+from xicam.core.intents import PlotIntent
+from xicam.gui.widgets.multicurve import CurveHandle, MultiCurveItem, peak_decimate
+
+
+def test_peak_decimate_keeps_peaks():
+    x = np.arange(1000, dtype=float)
+    ys = np.zeros((2, 1000))
+    ys[0, 333] = 5
+    ys[1, 777] = -3
+    ys[1, 10] = np.nan
+
+    decimated_x, decimated = peak_decimate(x, ys, 10)
+    assert decimated.shape == (2, 200)
+    assert decimated_x[0] == 0 and decimated_x[-1] == 990
+    assert decimated[0].max() == 5 and decimated_x[np.argmax(decimated[0])] == 330
+    assert decimated[1].min() == -3
+    assert np.isfinite(decimated).all()
+
+
+def test_plot_canvas_batches_curves(qtbot):
+    from xicam.gui.canvases import PlotIntentCanvas
+
+    canvas = PlotIntentCanvas()
+    qtbot.addWidget(canvas)
+    x = np.linspace(0, 1, 2000)
+    small = PlotIntent("small", x=x, y=np.sin(x), labels={"bottom": "x", "left": "y"})
+    many = PlotIntent("many", x=x, y=np.random.random((1000, 2000)), labels={"bottom": "x", "left": "y"})
+
+    canvas.render(small)
+    items = canvas.render(many)
+    canvas.show()
+    canvas.canvas_widget.plotItem.vb.autoRange()
+    canvas.canvas_widget.viewport().repaint()
+
+    # The 1000 curves are drawn by one item, with one legend entry
+    assert len(items) == 1000 and all(isinstance(item, CurveHandle) for item in items)
+    curves = [item for item in canvas.canvas_widget.plotItem.items if isinstance(item, MultiCurveItem)]
+    assert len(curves) == 1 and len(curves[0]) == 1000
+    assert len(canvas.canvas_widget.plotItem.legend.items) == 2
+    # Each intent has a color...
+    colors = {curves[0].pen(key).color().rgba() for item in items for key in item.keys}
+    assert len(colors) == 1
+
+    # ...unless there's only one
+    canvas.unrender(small)
+    colors = {curves[0].pen(key).color().rgba() for item in items for key in item.keys}
+    assert len(colors) > 1
+    canvas.canvas_widget.viewport().repaint()
+
+    canvas.unrender(many)
+    assert len(curves[0]) == 0
+    assert not canvas.canvas_widget.plotItem.legend.items
@@ -124,6 +124,36 @@ def test_NDViewer(simple_small_data, qtbot):
     w.show()
     # qtbot.stopForInteraction()
 
+
+def test_NDViewer_slices_lazily(simple_small_data, qtbot):
+    from xicam.gui.widgets.ndimageview import NDImageView, SliceablePanel
+
+    w = NDImageView()
+    w.prefetch = False
+    qtbot.addWidget(w)
+    w.setData(simple_small_data)
+    w.show()
+    panels = w.findChildren(SliceablePanel)
+
+    # Each panel's slice is computed in the background, and shown once it's loaded
+    qtbot.waitUntil(lambda: all(panel.shown_key == panel.wanted_key for panel in panels))
+    assert len(w._slice_cache) == len(panels)
+    shown = np.asarray(panels[0].full_view.view_widget.image_item.image)
+    expected = simple_small_data.isel(panels[0].sliceIndices()).transpose(*panels[0].view_dims)
+    np.testing.assert_array_equal(shown, np.asarray(expected).T)
+
+    # Slicing along a viewed dim doesn't reload that panel; an unchanged slice isn't reloaded at all
+    key = panels[0].wanted_key
+    w.updateSlicing({'E (eV)': 70})
+    w.updateSlicing({'E (eV)': 70})
+    assert panels[0].wanted_key != key
+    qtbot.waitUntil(lambda: not w._loading and all(panel.shown_key == panel.wanted_key for panel in panels))
+    assert len(w._slice_cache) == len(panels) + 1
+
+    # Returning to a slice is served from the cache
+    w.updateSlicing({'E (eV)': 50})
+    assert panels[0].shown_key == key and not w._pending
+
 # @pytest.fixture
 # def xarray_catalog():
 #     import time
@@ -0,0 +1,69 @@
+import numpy as np
+from qtpy.QtCore import QRectF
+from pytestqt import qtbot
+
+
+def test_pyramid_renders_visible_tiles(qtbot):
+    from pyqtgraph import ImageView
+    from xicam.gui.widgets.imageviewmixins import PyramidImageView
+    from xicam.gui.widgets.pyramid import ImagePyramid
+
+    pyramid = ImagePyramid(np.arange(16, dtype=np.uint16).reshape(4, 4), min_size=1).build()
+    assert [level.shape for level in pyramid.levels] == [(4, 4), (2, 2), (1, 1)]
+    assert pyramid.levels[1][0, 0] == 2  # mean of 0, 1, 4, 5, rounded
+
+    class View(PyramidImageView, ImageView):
+        pass
+
+    w = View()
+    w.resize(400, 400)
+    w.show()
+    qtbot.waitExposed(w)
+    w.setImage(np.random.random((4096, 4096)).astype(np.float32))
+    item = w.getImageItem()
+    qtbot.waitUntil(lambda: len(item.pyramid.levels) > 1, timeout=10000)
+
+    # Zoomed out, a level coarser than full resolution is rendered
+    w.getView().autoRange(padding=0)
+    item.render()
+    assert item.qimage.width() < 4096
+
+    # Zoomed in, only the tiles around the visible region are rendered
+    w.getView().setRange(xRange=(1000, 1100), yRange=(1000, 1100), padding=0)
+    item.render()
+    assert item.qimage.width() <= 2 * item.tileSize and item.qimage.height() <= 2 * item.tileSize
+    assert item._renderRect.contains(QRectF(1000, 1000, 100, 100))
+
+    # Panning moves the tiles
+    w.getView().setRange(xRange=(3000, 3100), yRange=(1000, 1100), padding=0)
+    item.render()
+    assert item._renderRect.contains(QRectF(3000, 1000, 100, 100))
+
+
+def test_log_scale_pyramid_renders_each_tile(qtbot):
+    from pyqtgraph import functions as fn
+    from xicam.gui.widgets.imageviewmixins import LogScaleIntensity, PyramidImageView
+
+    class View(PyramidImageView, LogScaleIntensity):
+        pass
+
+    w = View()
+    qtbot.addWidget(w)
+    w.resize(400, 400)
+    w.show()
+    qtbot.waitExposed(w)
+    image = np.zeros((4096, 4096), dtype=np.uint16)
+    image[2048:] = 1000
+    w.setImage(image, levels=(0, 1000))
+    item = w.getImageItem()
+    qtbot.waitUntil(lambda: len(item.pyramid.levels) > 1, timeout=10000)
+
+    # Each tile is log-transformed from its own region, not from the first one rendered
+    colors = []
+    for x in (1000, 3000):
+        w.getView().setRange(xRange=(x, x + 100), yRange=(1000, 1100), padding=0)
+        qtbot.wait(50)
+        item.render()
+        assert item._renderRect.contains(QRectF(x, 1000, 100, 100))
+        colors.append(fn.ndarray_from_qimage(item.qimage)[0, 0].tolist())
+    assert colors[0] != colors[1]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from pytestqt import qtbot
+
+pyFAI = pytest.importorskip("pyFAI")
+
+
+def test_remesh_map_matches_pixel_splitting():
+    from pyFAI import detectors
+    from pyFAI.ext import splitBBox
+    from pyFAI.geometry import Geometry
+    from xicam.gui.widgets.remesh import RemeshMapCache, _q_from_geometry
+
+    geometry = Geometry(wavelength=0.123984e-09)
+    geometry.detector = detectors.Pilatus300k()
+    geometry.setFit2D(centerX=237.5, centerY=30.5, directDist=283.27, pixelX=172, pixelY=172)
+    y, x = np.mgrid[: geometry.detector.shape[0], : geometry.detector.shape[1]]
+    image = np.sin(x / 20.0) * np.cos(y / 30.0) * 50 + 60
+
+    cache = RemeshMapCache()
+    remesh_map = cache.get(image.shape, geometry, False, 0)
+    remeshed = remesh_map.apply(image)
+
+    # The same pixel splitting as camsaxs' remesh, done by pyFAI
+    q = _q_from_geometry(image.shape, geometry, False, 0)
+    q_h, q_v = q[:, :, 0], q[:, :, 1]
+    bins = remesh_map.output_shape[::-1]
+    range_h, range_v = (q_h.min(), q_h.max()), (q_v.min(), q_v.max())
+    expected = splitBBox.histoBBox2d(weights=image,
+                                     pos0=q_h / 10,
+                                     delta_pos0=np.ones_like(image) * (range_h[1] - range_h[0]) / bins[0] / 10,
+                                     pos1=q_v / 10,
+                                     delta_pos1=np.ones_like(image) * (range_v[1] - range_v[0]) / bins[1] / 10,
+                                     bins=bins,
+                                     pos0_range=np.asarray(range_h) / 10,
+                                     pos1_range=np.asarray(range_v) / 10,
+                                     allow_pos0_neg=True)[0]
+    assert remeshed.shape == expected.shape
+    assert np.abs(remeshed - expected).mean() < 1e-2
+
+    # The map is reused while the geometry is unchanged, and rebuilt when it's changed in place
+    assert cache.get(image.shape, geometry, False, 0) is remesh_map
+    geometry.setFit2D(centerX=200, centerY=30.5, directDist=283.27, pixelX=172, pixelY=172)
+    assert cache.get(image.shape, geometry, False, 0) is not remesh_map
+
+
+def test_q_map_lookup(qtbot):
+    from pyFAI import detectors
+    from pyFAI.geometry import Geometry
+    from xicam.gui.widgets.qmap import QMapCache, pixel_q
+
+    geometry = Geometry(wavelength=0.123984e-09)
+    geometry.detector = detectors.Pilatus300k()
+    geometry.setFit2D(centerX=237.5, centerY=30.5, directDist=283.27, pixelX=172, pixelY=172)
+    shape = geometry.detector.shape
+
+    cache = QMapCache()
+    # Until the map is built, pixels are computed directly
+    q, chi, two_theta = cache.lookup(shape, geometry, 100, 200)
+    qtbot.waitUntil(lambda: cache.get(shape, geometry) is not None, timeout=10000)
+
+    q_map = cache.get(shape, geometry)
+    for row, col in [(100, 200), (0, 0), (shape[0] - 1, shape[1] - 1)]:
+        expected = pixel_q(geometry, row, col)
+        looked_up = cache.lookup(shape, geometry, row, col)
+        np.testing.assert_allclose(looked_up[0], expected[0], rtol=1e-6)
+        assert looked_up[1:] == pytest.approx(expected[1:])
+    np.testing.assert_allclose(q, q_map.q[100, 200], rtol=1e-6)
@@ -21,3 +21,81 @@ def test_arcroi(qtbot):
     assert np.sum(roi.getArrayRegion(np.ones((10, 10)))) == 16
 
     qtbot.waitForWindowShown(imageview)
+
+
+def test_segmented_arcroi_labels(qtbot):
+    import numpy as np
+    from xicam.gui.widgets.ROI import SegmentedArcROI
+
+    roi = SegmentedArcROI(pos=(50, 60), radius=30)
+    roi.segments_radial = 2
+    roi.segments_angular = 4
+    labels = roi.getLabelArray(np.zeros((120, 150)))
+
+    # Every segment gets its own label, and nothing outside the outer radius is labeled
+    assert set(np.unique(labels)) == set(range(2 * 4 + 1))
+    rows, cols = np.nonzero(labels)
+    assert np.hypot(rows - 60, cols - 50).max() <= roi.outerradius
+
+    # Segments reuse the ROI's polar window, until it moves
+    window = roi.polarWindow((120, 150), roi.outerradius)
+    assert roi.polarWindow((120, 150), roi.outerradius) is window
+
+    # Moving the ROI moves its labels
+    roi.setPos((70, 60))
+    np.testing.assert_array_equal(roi.getLabelArray(np.zeros((120, 150)))[:, 20:], labels[:, :-20])
+    assert roi.polarWindow((120, 150), roi.outerradius) is not window
+
+
+def test_polygon_mask_scanline_fill():
+    import numpy as np
+    from xicam.gui.widgets.ROI import _polygon_mask
+
+    # A right triangle with legs of 40 px; only its bounding box is filled
+    (rows, cols), mask = _polygon_mask([(10, 10), (50, 10), (10, 50)], (100, 100))
+    assert (rows, cols) == (slice(10, 50), slice(10, 50))
+    assert abs(mask.sum() - 40 * 40 / 2) <= 40
+    assert mask[0, 0] and not mask[-1, -1]
+
+    # Polygons outside the image are empty
+    assert _polygon_mask([(-20, -20), (-10, -20), (-10, -10)], (100, 100))[1].size == 0
+
+
+def test_roi_operation_reuses_labels(qtbot, monkeypatch):
+    import numpy as np
+    from xicam.gui.widgets.ROI import ArcROI, BetterRectROI
+
+    arc = ArcROI(pos=(30, 30), radius=20)
+    rect = BetterRectROI(pos=(60, 60), size=(20, 10))
+    calls = []
+    get_label_array = BetterRectROI.getLabelArray
+    monkeypatch.setattr(BetterRectROI, 'getLabelArray', lambda *args: calls.append(1) or get_label_array(*args))
+
+    operation = arc.operation
+    frames = np.random.random((50, 100, 100))
+    results = [operation._func(frames[i:i + 1], rois=[arc, rect]) for i in range(len(frames))]
+    assert len(calls) == 1
+    assert all(result[1] is results[0][1] for result in results)
+
+    masks, labels = results[0]
+    assert set(np.unique(labels)) == {0, 1, 2}
+    np.testing.assert_array_equal(labels == 2, masks[1])
+
+    # Moving an ROI recomputes its labels
+    rect.setPos((50, 60))
+    operation._func(frames[:1], rois=[arc, rect])
+    assert len(calls) == 2
+
+
+def test_roi_statistics_per_segment(qtbot):
+    import numpy as np
+    from xicam.gui.widgets.ROI import BetterRectROI, SegmentedRectROI, roi_statistics
+
+    rois = [BetterRectROI(pos=(10, 10), size=(20, 20)), SegmentedRectROI(pos=(40, 40), size=(20, 10))]
+    stack = np.random.random((5, 80, 80))
+    result = roi_statistics(stack, rois)
+
+    # One region for the rectangle, and one per segment of the segmented rectangle
+    assert result["mean"].shape == (5, 1 + 2 * 2)
+    np.testing.assert_allclose(result["sum"][:, 0], stack[:, 10:30, 10:30].sum(axis=(1, 2)))
+    assert (result["count"][:, 1:] == 50).all()
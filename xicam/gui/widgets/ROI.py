@@ -8,6 +8,7 @@ from qtpy.QtGui import QColor, QPainter, QPainterPath, QBrush, QPainterPathStrok
 from qtpy.QtWidgets import QAction, QVBoxLayout, QWidget, QMenu
 import numpy as np
 from itertools import count
+from xicam.core.data.roistats import ROIStatistics
 from xicam.plugins import OperationPlugin
 
 from pyqtgraph.parametertree import Parameter, parameterTypes, ParameterTree
@@ -16,6 +17,88 @@ import pyqtgraph as pg
 from xicam.plugins.operationplugin import operation, output_names
 
 
+def _polar_window(shape, center, radius):
+    """
+    The polar coordinates about *center* (row, col) of the pixels within the bounding box of a circle of *radius*.
+
+    Returns ((row slice, col slice), distance, angle), where angle is that of (col, row) offsets, in degrees; the
+    arrays are read-only, so that they can be shared (see ArcROI.polarWindow).
+    """
+    center_row, center_col = center
+    rows = slice(min(max(int(np.floor(center_row - radius)), 0), shape[0]),
+                 max(min(int(np.ceil(center_row + radius)) + 1, shape[0]), 0))
+    cols = slice(min(max(int(np.floor(center_col - radius)), 0), shape[1]),
+                 max(min(int(np.ceil(center_col + radius)) + 1, shape[1]), 0))
+    d_row = np.arange(rows.start, rows.stop)[:, None] - center_row
+    d_col = np.arange(cols.start, cols.stop)[None, :] - center_col
+    distance = np.hypot(d_row, d_col)
+    angle = np.degrees(np.arctan2(d_row, d_col))
+    distance.flags.writeable = False
+    angle.flags.writeable = False
+    return (rows, cols), distance, angle
+
+
+def _rect_indices(size, start, stop, segments=1):
+    """
+    The segment (0 to segments - 1) each of *size* pixels' centers falls in, when [start, stop] is split into *segments*;
+    -1 for pixels outside.
+    """
+    centers = np.arange(size) + 0.5
+    inside = (centers > start) & (centers < stop)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        index = np.floor((centers - start) / (stop - start) * segments)
+    return np.where(inside, np.clip(index, 0, segments - 1), -1).astype(int)
+
+
+def _polygon_mask(vertices, shape):
+    """
+    Scanline-fill a polygon, given by its (axis 0, axis 1) *vertices*, into a boolean mask of the pixels of *shape*
+    whose centers it contains (even-odd rule).
+
+    Only the polygon's bounding box is filled; returns ((row slice, col slice), mask of that box).
+    """
+    vertices = np.asarray(vertices, dtype=float).reshape(-1, 2)
+    rows = slice(min(max(int(np.floor(vertices[:, 0].min())), 0), shape[0]),
+                 max(min(int(np.ceil(vertices[:, 0].max())), shape[0]), 0))
+    cols = slice(min(max(int(np.floor(vertices[:, 1].min())), 0), shape[1]),
+                 max(min(int(np.ceil(vertices[:, 1].max())), shape[1]), 0))
+    n_rows, n_cols = rows.stop - rows.start, cols.stop - cols.start
+    if n_rows <= 0 or n_cols <= 0:
+        return (rows, cols), np.zeros((max(n_rows, 0), max(n_cols, 0)), dtype=bool)
+
+    # Where each edge crosses each scanline (through the pixel centers of a row)
+    r0, c0 = vertices[:, 0], vertices[:, 1]
+    r1, c1 = np.roll(r0, -1), np.roll(c0, -1)
+    scanlines = np.arange(rows.start, rows.stop)[:, None] + 0.5
+    crosses = (r0 <= scanlines) != (r1 <= scanlines)
+    row_index, edge = np.nonzero(crosses)
+    crossing = c0[edge] + (scanlines[row_index, 0] - r0[edge]) * (c1[edge] - c0[edge]) / (r1[edge] - r0[edge])
+
+    # Toggle inside/outside at the first pixel center past each crossing, then accumulate along the rows
+    first_col = np.clip(np.floor(crossing - 0.5).astype(int) + 1 - cols.start, 0, n_cols)
+    toggles = np.zeros((n_rows, n_cols + 1), dtype=np.int32)
+    np.add.at(toggles, (row_index, first_col), 1)
+    return (rows, cols), (np.cumsum(toggles[:, :-1], axis=1) % 2).astype(bool)
+
+
+def roi_masks(rois, shape, image_item=None):
+    """One boolean mask per ROI, or per segment of segmented ROIs, over images of *shape*."""
+    frame = np.broadcast_to(np.zeros(()), tuple(shape))  # only its shape is used
+    masks = []
+    for roi in rois:
+        labels = roi.labelArray(frame, image_item)
+        masks.extend(labels == label for label in np.unique(labels[labels > 0]))
+    return masks
+
+
+def roi_statistics(stack, rois, image_item=None):
+    """
+    Return the per-frame sum, count and mean of each of *rois* (see ``roi_masks``) over *stack*, each shaped (frames,
+    regions); all regions are computed in one pass over the stack (see ``ROIStatistics``).
+    """
+    return ROIStatistics(roi_masks(rois, stack.shape[-2:], image_item)).compute(stack)
+
+
 class ROIOperation(OperationPlugin):
     """Single point of entry for one or more ROIs, generates a label array."""
     name = 'ROI'
@@ -27,42 +110,32 @@ class ROIOperation(OperationPlugin):
         self._param = None  # type: Parameter
         self.name = "ROI" #f"ROI #{self.ROI.index}"
 
+        self._cache_key = None
+        self._cached = None
+
     def _func(self, images, image_item=None, rois=None):
+        # The masks and labels only depend on the ROIs and the frame shape, so they're reused until either changes
+        frame = images[0]
+        key = tuple(roi.labelKey(frame.shape, image_item) for roi in rois)
+        if key != self._cache_key:
+            self._cached = self._labels(frame, image_item, rois)
+            self._cache_key = key
+        return self._cached
+
+    @staticmethod
+    def _labels(frame, image_item, rois):
         # Create zeros label array to insert new labels into (if multiple ROIs)
-        label_array = np.zeros(images[0].shape)
+        label_array = np.zeros(frame.shape)
         roi_masks = []
         for roi in rois:
-            # TODO: Should label array be astype(np.int) (instead of float)?
-            label = roi.getLabelArray(images, image_item)
+            label = roi.labelArray(frame, image_item)
             # Store the boolean mask of each label array
-            roi_mask = label.astype(np.bool)
+            roi_mask = label > 0
             roi_masks.append(roi_mask)
-            # Grab the current label array maximum value (so we can increment multiple labels accordingly)
-            label_array_max = label_array.max()
-            label = np.where(label > 0, label + label_array_max, label)
-            # For single roi, our max will be 0 (since label_array is just np.zeros so far, hasn't been modified)
-            if label_array_max == 0:
-                label_array = label
-                print(f"{label_array_max + 1}: {(label_array == 1).sum()}")
-                print()
-            else:
-                # FIXME right now, if labels overlap, label integers are being added together (into a new label value)
-                # Adjust any currently non-masked areas with the new label
-                label_array = np.where(label_array == 0, label, label_array)
-                print(f"{1}: {(label_array == 1).sum()}")
-                print(f"{2}: {(label_array == 2).sum()}")
-                print()
-                #
-                label_array = np.where(label_array > 0,
-                                       np.where(label > 0, label, label_array),
-                                       label_array)
-                # label_array = np.where(label_array > 0,
-                #                        label or label_array,
-                #                        label_array)
-                print(f"1: {(label_array == 1).sum()}")
-                print(f"2: {(label_array == 2).sum()}")
-                print()
+            # Offset labels past those of previous ROIs; where ROIs overlap, the later ROI's labels win
+            label_array[roi_mask] = label[roi_mask] + label_array.max()
 
+        label_array.flags.writeable = False
         return roi_masks, label_array
 
     # TODO: might need this for adjusting roi's manually
@@ -255,11 +328,40 @@ class FreeTranslateFixROI(ROI):
 
 
 class WorkflowableROI(ROI):
+    # Attributes (besides position, size, angle and handles) that getLabelArray depends on
+    label_parameters = ()
+
     # FIXME: do we still want this for our (e.g.) CorrelationStage process_actions???
     def __init__(self, *args, **kwargs):
         super(WorkflowableROI, self).__init__(*args, **kwargs)
         self.operation = ROIOperation(self)
         self._param = None
+        self._label_cache = None
+
+    def labelKey(self, shape, img=None):
+        """A key of everything the labels of this ROI over an image of *shape* (shown in *img*) depend on."""
+        transform = img.sceneTransform() if img is not None else None
+        return (tuple(shape[-2:]),
+                transform and (transform.m11(), transform.m12(), transform.m21(), transform.m22(),
+                               transform.dx(), transform.dy()),
+                (self.pos().x(), self.pos().y()),
+                (self.size().x(), self.size().y()),
+                self.angle(),
+                tuple((handle['item'].pos().x(), handle['item'].pos().y()) for handle in self.handles),
+                tuple(getattr(self, name) for name in self.label_parameters))
+
+    def labelArray(self, arr, img=None):
+        """
+        Return getLabelArray(arr, img), reusing the last labels until the ROI or the image shape changes.
+
+        The labels are shared (and read-only).
+        """
+        key = self.labelKey(arr.shape, img)
+        if self._label_cache is None or self._label_cache[0] != key:
+            labels = np.asarray(self.getLabelArray(arr, img))
+            labels.flags.writeable = False
+            self._label_cache = key, labels
+        return self._label_cache[1]
 
     def parameter(self) -> Parameter:
         raise NotImplementedError
@@ -363,6 +465,23 @@ class BetterPolyLineROI(BetterROI, PolyLineROI):
     def __repr__(self):
         return f"ROI #{self.index}"
 
+    def getLabelArray(self, arr, img: pg.ImageItem = None):
+        """Return a label array (ones and zeros) of the pixels within the polygon; only its bounding box is filled."""
+        shape = arr.shape[-2:]
+        positions = [handle['item'].pos() for handle in self.handles]
+        points = [self.mapToItem(img, pos) if img is not None else self.mapToParent(pos) for pos in positions]
+        axis_order = img.axisOrder if img is not None else pg.getConfigOption('imageAxisOrder')
+        if axis_order == 'col-major':
+            vertices = [(point.x(), point.y()) for point in points]
+        else:
+            vertices = [(point.y(), point.x()) for point in points]
+
+        labels = np.zeros(shape, dtype=np.uint8)
+        if len(vertices) > 2:
+            (rows, cols), mask = _polygon_mask(vertices, shape)
+            labels[rows, cols] = mask
+        return labels
+
 
 class QCircRectF(QRectF):
     def __init__(self, center=(0.0, 0.0), radius=1.0, rect=None):
@@ -498,6 +617,7 @@ class ArcROI(BetterROI):
 
         self.path = None
         self._param = None  # type: Parameter
+        self._polar_cache = None
         self._restyle()
 
         self._name = self.name_base
@@ -613,32 +733,35 @@ class ArcROI(BetterROI):
         Return the result of ROI.getArrayRegion() masked by the arc shape
         of the ROI. Regions outside the arc are set to 0.
         """
-        w = arr.shape[-2]
-        h = arr.shape[-1]
-
-        centerangle = self.thetacenter + 90
-        startangle = centerangle - self.thetawidth / 2
-
-        # generate an ellipsoidal mask
-        mask = np.fromfunction(
-            lambda y, x: (
-                                 self.innerhandle.pos().length() < (
-                                 (x - self.pos().x()) ** 2.0 + (y - self.pos().y()) ** 2.0) ** 0.5
-                         )
-                         & (((x - self.pos().x()) ** 2.0 + (
-                    y - self.pos().y()) ** 2.0) ** 0.5 < self.outerhandle.pos().length())
-                         & ((np.degrees(np.arctan2(y - self.pos().y(), x - self.pos().x())) - startangle) % 360 > 0)
-                         & ((np.degrees(
-                np.arctan2(y - self.pos().y(), x - self.pos().x())) - startangle) % 360 < self.thetawidth),
-            (w, h),
-        )
-
-        return arr * mask
+        return arr * self._mask(arr.shape[-2:])
 
     def getLabelArray(self, arr, img: pg.ImageItem = None):
         """Return a label array (ones and zeros) for the masked array region defined by the ROI."""
-        masked_arr = self.getArrayRegion(arr, img)
-        return (masked_arr != 0).astype(np.uint8)
+        return self._mask(arr.shape[-2:]).astype(np.uint8)
+
+    def polarWindow(self, shape, radius):
+        """
+        Return _polar_window(shape, center, radius) about this ROI's center, reusing the last window until the ROI or
+        the image shape changes (only the last is kept: while dragging, no earlier window comes back).
+        """
+        key = tuple(shape), (self.pos().y(), self.pos().x()), radius
+        if self._polar_cache is None or self._polar_cache[0] != key:
+            self._polar_cache = key, _polar_window(*key)
+        return self._polar_cache[1]
+
+    def _mask(self, shape):
+        """A boolean mask of the pixels within the arc, computed only over its bounding box."""
+        innerradius = self.innerhandle.pos().length()
+        outerradius = self.outerhandle.pos().length()
+        startangle = self.thetacenter + 90 - self.thetawidth / 2
+
+        (rows, cols), distance, angle = self.polarWindow(shape, outerradius)
+        offset = (angle - startangle) % 360
+
+        mask = np.zeros(shape, dtype=bool)
+        mask[rows, cols] = ((innerradius < distance) & (distance < outerradius)
+                            & (offset > 0) & (offset < self.thetawidth))
+        return mask
 
     def shape(self):
         # (used for hitbox for menu)
@@ -702,7 +825,7 @@ class ArcQROI(ArcROI):
         q_mask = np.logical_and(self.innerradius < q, q < self.outerradius)
         offset_chi = ((np.degrees(chi) - 90 - self.thetacenter + self.thetawidth / 2) % 360)
         chi_mask = offset_chi < self.thetawidth
-        return np.logical_and(q_mask, chi_mask).astype(np.int)
+        return np.logical_and(q_mask, chi_mask).astype(np.uint8)
 
 class ArcPXROI(ArcROI):
     is_px_based = True
@@ -715,6 +838,8 @@ class SegmentedArcROI(ArcROI):
 
     """
 
+    label_parameters = ('segments_radial', 'segments_angular')
+
     def __init__(self, pos, radius, **kwargs):
         # QtGui.QGraphicsRectItem.__init__(self, 0, 0, size[0], size[1])
         self.segments_radial = 3
@@ -757,29 +882,22 @@ class SegmentedArcROI(ArcROI):
     def getLabelArray(self, arr, img: pg.ImageItem = None):
         labels = np.zeros(arr.shape[-2:])
 
-        centerangle = -self.outerhandle.pos().angle(Point(0, 1))
-        startangle = centerangle - self.thetawidth / 2
-        endangle = centerangle + self.thetawidth / 2
-        radii = np.linspace(self.innerradius, self.outerradius, self.segments_radial + 1, endpoint=True)
-        angles = np.linspace(startangle, endangle, self.segments_angular + 1, endpoint=True)
-
-        start_radii = radii[:-1]
-        end_radii = radii[1:]
-        start_angles = angles[:-1]
-        end_angles = angles[1:]
-
-        for i, (start_radius, end_radius) in enumerate(zip(start_radii, end_radii)):
-            for j, (start_angle, end_angle) in enumerate(zip(start_angles, end_angles)):
-                # generate an ellipsoidal mask
-                mask = np.fromfunction(
-                    lambda x, y: (start_radius <= ((x - self.pos().y()) ** 2.0 + (y - self.pos().x()) ** 2.0) ** 0.5)
-                                 & (((x - self.pos().y()) ** 2.0 + (y - self.pos().x()) ** 2.0) ** 0.5 <= end_radius)
-                                 & ((np.degrees(
-                        np.arctan2(y - self.pos().x(), x - self.pos().y())) - start_angle) % 360 >= 0)
-                                 & ((np.degrees(np.arctan2(y - self.pos().x(),
-                                                           x - self.pos().y())) - start_angle) % 360 <= end_angle - start_angle),
-                    arr.shape[-2:], )
-                labels[mask] = i * self.segments_radial + j + 1
+        innerradius, outerradius, thetawidth = self.innerradius, self.outerradius, self.thetawidth
+        if outerradius <= innerradius or thetawidth <= 0:
+            return labels
+        startangle = -self.outerhandle.pos().angle(Point(0, 1)) - thetawidth / 2
+
+        (rows, cols), distance, angle = self.polarWindow(arr.shape[-2:], outerradius)
+        # Segment angles run from the row axis towards the column axis
+        offset = (90 - angle - startangle) % 360
+
+        # Bin every pixel in the window by radius and angle at once
+        radial = np.floor((distance - innerradius) / (outerradius - innerradius) * self.segments_radial)
+        angular = np.floor(offset / thetawidth * self.segments_angular)
+        inside = (innerradius <= distance) & (distance <= outerradius) & (offset <= thetawidth)
+        radial = np.clip(radial, 0, self.segments_radial - 1)
+        angular = np.clip(angular, 0, self.segments_angular - 1)
+        labels[rows, cols] = np.where(inside, radial * self.segments_angular + angular + 1, 0)
 
         return labels
 
@@ -910,12 +1028,9 @@ class BetterRectROI(BetterROI, RectROI):
         max_x = self.size().x() + min_x
         max_y = self.size().y() + min_y
 
-        mask = np.zeros(arr.shape[-2:])
-
-        label_mask = np.fromfunction(
-            lambda y, x: (x + 0.5 > min_x) & (x + 0.5 < max_x) & (y + 0.5 > min_y) & (y + 0.5 < max_y), (dim_0, dim_1)
-        )
-        mask[label_mask] = 1
+        # The rectangle is separable: select its rows and columns
+        mask = np.outer(_rect_indices(dim_0, min_y, max_y) >= 0, _rect_indices(dim_1, min_x, max_x) >= 0)
+        mask = mask.astype(float)
 
         # Invert y
         # FIXME -- use image transform above with passed image item
@@ -986,6 +1101,8 @@ class LineROI(BetterROI, LineROI):
 
 
 class SegmentedRectROI(BetterRectROI):
+    label_parameters = ('segments_h', 'segments_v')
+
     def __init__(self, *args, **kwargs):
         self.segments_h = 2
         self.segments_v = 2
@@ -1026,22 +1143,12 @@ class SegmentedRectROI(BetterRectROI):
         min_y = self.pos().y()
         max_x = self.size().x() + min_x
         max_y = self.size().y() + min_y
-        segment_bin_x = (max_x - min_x) / self.segments_h
-        segment_bin_y = (max_y - min_y) / self.segments_v
 
+        # Segment columns and rows separately, then combine them into labels
+        i = _rect_indices(h, min_x, max_x, self.segments_h)
+        j = _rect_indices(w, min_y, max_y, self.segments_v)
         mask = np.zeros_like(arr)
-
-        for i in range(self.segments_h):
-            for j in range(self.segments_v):
-                # generate an square max
-                label_mask = np.fromfunction(
-                    lambda y, x: (x + 0.5 > min_x + i * segment_bin_x)
-                                 & (x + 0.5 < min_x + (i + 1) * segment_bin_x)
-                                 & (y + 0.5 > min_y + j * segment_bin_y)
-                                 & (y + 0.5 < min_y + (j + 1) * segment_bin_y),
-                    (w, h),
-                )
-                mask[label_mask] = 1 + i + j * self.segments_h
+        mask[...] = np.where((j[:, None] >= 0) & (i[None, :] >= 0), 1 + i[None, :] + j[:, None] * self.segments_h, 0)
 
         return mask
 
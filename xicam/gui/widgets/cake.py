@@ -0,0 +1,100 @@
+"""
+Cached caking: integrators are built once per geometry, so that pyFAI's CSR tables (built on an integrator's first
+2D integration) are reused for every frame of a stack.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from pyFAI.geometry import Geometry
+
+try:
+    from pyFAI.integrator.azimuthal import AzimuthalIntegrator
+except ImportError:  # pyFAI < 2023.12
+    from pyFAI.azimuthalIntegrator import AzimuthalIntegrator
+
+from xicam.gui.widgets.remesh import geometry_key
+
+# Pixel splitting, sparse (CSR) tables and the compiled engine
+CAKE_METHOD = ("bbox", "csr", "cython")
+
+
+def integrator_from_geometry(geometry: Geometry) -> AzimuthalIntegrator:
+    """A new AzimuthalIntegrator with *geometry*'s parameters and detector."""
+    integrator = AzimuthalIntegrator()
+    if hasattr(geometry, "get_config"):
+        integrator.set_config(geometry.get_config())
+    else:
+        integrator.setPyFAI(**geometry.getPyFAI())
+    integrator.detector = geometry.detector
+    return integrator
+
+
+class IntegratorCache(object):
+    """An LRU cache of AzimuthalIntegrators, keyed by geometry (by value)."""
+
+    def __init__(self, max_integrators: int = 4):
+        self.max_integrators = max_integrators
+        self._integrators = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._integrators)
+
+    def get(self, geometry: Geometry) -> AzimuthalIntegrator:
+        key = geometry_key(geometry)
+        with self._lock:
+            integrator = self._integrators.get(key)
+            if integrator is None:
+                integrator = self._integrators[key] = integrator_from_geometry(geometry)
+            self._integrators.move_to_end(key)
+            while len(self._integrators) > self.max_integrators:
+                self._integrators.popitem(last=False)
+            return integrator
+
+    def clear(self):
+        with self._lock:
+            self._integrators.clear()
+
+
+integrators = IntegratorCache()
+
+
+def cake_ranges(geometry: Geometry, shape, unit: str = "q_A^-1"):
+    """
+    The (radial, azimuthal) ranges an image of *shape* is caked over: those of its pixels' centers (chi in degrees).
+
+    Caking over explicit ranges, rather than pyFAI's defaults, means the bins are known without integrating.
+    """
+    integrator = integrators.get(geometry)
+    radial = integrator.center_array(tuple(shape), unit, scale=True)
+    chi = integrator.center_array(tuple(shape), "chi_deg", scale=True)
+    return (float(radial.min()), float(radial.max())), (float(chi.min()), float(chi.max()))
+
+
+def _bin_centers(value_range, bins: int):
+    low, high = value_range
+    return low + (np.arange(bins) + 0.5) * (high - low) / bins
+
+
+def cake_axes(geometry: Geometry, shape, radial_bins: int = 1000, azimuthal_bins: int = 360, unit: str = "q_A^-1"):
+    """Return (radial, chi), the bin centers of each pixel of the cake of an image of *shape*, without caking it."""
+    radial_range, azimuth_range = cake_ranges(geometry, shape, unit)
+    return np.meshgrid(_bin_centers(radial_range, radial_bins), _bin_centers(azimuth_range, azimuthal_bins))
+
+
+def cake(image: np.ndarray, geometry: Geometry, radial_bins: int = 1000, azimuthal_bins: int = 360,
+         unit: str = "q_A^-1"):
+    """
+    Cake *image* into (azimuthal, radial) bins with the cached integrator for *geometry*.
+
+    Returns (image, radial, chi), where radial and chi (in degrees) are the bin centers of each pixel of image (as
+    given by ``cake_axes``).
+    """
+    image = np.asarray(image)
+    integrator = integrators.get(geometry)
+    radial_range, azimuth_range = cake_ranges(geometry, image.shape[-2:], unit)
+    result = integrator.integrate2d(image, radial_bins, azimuthal_bins, radial_range=radial_range,
+                                    azimuth_range=azimuth_range, unit=unit, method=CAKE_METHOD)
+    radial, chi = np.meshgrid(result.radial, result.azimuthal)
+    return result.intensity, radial, chi
@@ -265,6 +265,20 @@ class LocalFileSystemTree(DataResourceTree):
     def __init__(self):
         super(LocalFileSystemTree, self).__init__(LocalFileSystemResourcePlugin())
 
+        openDirectoryAction = QAction("Open Directory as Run", self)
+        openDirectoryAction.triggered.connect(self.openDirectory)
+        self.menu.insertAction(self.menu.actions()[1], openDirectoryAction)
+
+    def openDirectory(self, _=None):
+        """Open the selected directory as one run of its frame files; reopening it only loads files that are new."""
+        indexes = self.selectionModel().selectedRows()
+        paths = {self.model().filePath(index) for index in indexes}
+        directories = [path for path in paths if os.path.isdir(path)] or [self.model().path]
+        for directory in directories:
+            header = load_header(uris=[directory])
+            if header:
+                self.sigOpen.emit(header)
+
     def open(self, _=None):
         indexes = self.selectionModel().selectedRows()
         if len(indexes) == 1:
@@ -277,7 +291,7 @@ class LocalFileSystemTree(DataResourceTree):
         self.sigOpen.emit(self.model().getHeader(indexes))
 
     def currentChanged(self, current, previous):
-        if current.isValid():
+        if current.isValid() and not os.path.isdir(self.model().filePath(current)):
             header = self.model().getHeader([current])
             if header:
                 self.sigPreview.emit(header)
@@ -0,0 +1,219 @@
+"""
+A shared service for image statistics (histograms, min/max and display levels), computed from strided samples and
+cached, so that image views don't recompute them on the GUI thread for data they've already seen.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Sequence
+
+import numpy as np
+
+from xicam.core import msg, threads
+
+
+def data_key(data):
+    """
+    Return a hashable key identifying *data*'s contents.
+
+    Dask arrays (also when wrapped in an xarray) are keyed by their name, which is derived from their contents. Other
+    arrays are keyed by identity, shape, dtype, data pointer and a few strided values, so that an id reused by a new
+    array is not mistaken for the old one.
+    """
+    data = getattr(data, "data", data) if hasattr(data, "dims") else data
+    if hasattr(data, "dask"):
+        return "dask", data.name
+    data = np.asarray(data)
+    fingerprint = data.flat[:: max(1, data.size // 16)][:16].tobytes() if data.size else b""
+    return id(data), data.shape, data.dtype.str, data.__array_interface__["data"][0], fingerprint
+
+
+def strided_sample(data, max_size: float = 1e6, max_frames: int = 16, axes: Sequence[int] = None) -> np.ndarray:
+    """
+    Read a strided sample of at most about ``max_size`` values of *data* (numpy, dask or xarray).
+
+    Leading (frame) axes are strided first, to at most ``max_frames`` frames, so that whole frames (usually whole
+    chunks) are read; the remaining axes are then strided evenly. Only the *axes* given are strided, if any.
+    """
+    shape = data.shape
+    ndim = len(shape)
+    axes = list(range(ndim)) if axes is None else [axis % ndim for axis in axes]
+    steps = [1] * ndim
+
+    frames = [axis for axis in axes if axis < ndim - 2]
+    frame_count = int(np.prod([shape[axis] for axis in frames])) if frames else 1
+    if frame_count > max_frames:
+        step = int(np.ceil((frame_count / max_frames) ** (1 / len(frames))))
+        for axis in frames:
+            steps[axis] = min(step, shape[axis])
+
+    size = np.prod([-(-length // step) for length, step in zip(shape, steps)], dtype=np.float64)
+    remaining = [axis for axis in axes if axis not in frames] or axes
+    if size > max_size and remaining:
+        step = int(np.ceil((size / max_size) ** (1 / len(remaining))))
+        for axis in remaining:
+            steps[axis] = min(steps[axis] * step, shape[axis])
+
+    return np.asarray(data[tuple(slice(None, None, step) for step in steps)])
+
+
+def histogram(sample: np.ndarray, bins="auto", target_bins: int = 500, **kwargs):
+    """
+    Return (bin left edges, counts) of the finite values in *sample*.
+
+    With ``bins='auto'``, integer data gets about ``target_bins`` bins of integer width; other data gets
+    ``target_bins`` bins.
+    """
+    sample = sample[np.isfinite(sample)]
+    if not sample.size:
+        return None, None
+    if bins == "auto":
+        if sample.dtype.kind in "ui":
+            mn, mx = sample.min(), sample.max()
+            # explicit subtract with int64 to avoid overflow
+            step = max(1, np.ceil(np.subtract(mx, mn, dtype=np.int64) / target_bins))
+            bins = np.arange(mn, mx + 1.01 * step, step, dtype=np.int64)
+            if len(bins) == 0:
+                bins = [mn, mx]
+        else:
+            bins = target_bins
+    counts, edges = np.histogram(sample, bins=bins, **kwargs)
+    return edges[:-1], counts
+
+
+def min_max(sample: np.ndarray):
+    return np.nanmin(sample), np.nanmax(sample)
+
+
+def levels(sample: np.ndarray, percentile: float = 99):
+    """
+    Return display levels for *sample*: its second lowest value (skipping, e.g., masked pixels set to the minimum),
+    and the *percentile* of the values below its maximum (skipping, e.g., saturated pixels).
+    """
+    img_max = np.nanmax(sample)
+    img_min = np.nanmin(sample)
+    return (np.min(sample, where=sample > img_min, initial=img_max),
+            np.nanpercentile(np.where(sample < img_max, sample, img_min), percentile))
+
+
+STATISTICS = {"histogram": histogram, "min_max": min_max, "levels": levels}
+
+
+class ImageStatistics(object):
+    """
+    Computes statistics of image data from strided samples, and caches the most recent ``max_entries`` results.
+
+    Without a callback, a statistic is computed (or looked up) immediately. With one, a cached result is returned
+    immediately; otherwise None is returned, the statistic is computed on a worker thread and the callback is invoked
+    with the result in the main thread. Each consumer (the callback's owner) waits on at most one result: requesting
+    another statistic withdraws its previous request, and computations nobody is waiting for anymore are skipped.
+    """
+
+    def __init__(self, max_entries: int = 256, max_sample_size: float = 1e6, max_workers: int = 2):
+        self.max_entries = max_entries
+        self.max_sample_size = max_sample_size
+
+        self._cache = OrderedDict()
+        self._pending = {}  # key -> {consumer: callback}
+        self._requests = weakref.WeakKeyDictionary()  # consumer -> key
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="image-statistics")
+
+    def __len__(self):
+        return len(self._cache)
+
+    def histogram(self, data, callback: Callable = None, **kwargs):
+        """Return (bin left edges, counts) for *data*; see ``histogram`` for the arguments."""
+        return self.get("histogram", data, callback, **kwargs)
+
+    def min_max(self, data, callback: Callable = None, **kwargs):
+        return self.get("min_max", data, callback, **kwargs)
+
+    def levels(self, data, callback: Callable = None, **kwargs):
+        """Return display levels for *data*; see ``levels`` for the arguments."""
+        return self.get("levels", data, callback, **kwargs)
+
+    def get(self, statistic: str, data, callback: Callable = None, max_sample_size: float = None,
+            axes: Sequence[int] = None, **kwargs):
+        if data is None:
+            return None
+        max_sample_size = max_sample_size or self.max_sample_size
+        axes = tuple(axes) if axes is not None else None
+        key = (data_key(data), statistic, max_sample_size, axes, repr(sorted(kwargs.items())))
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+            if callback is not None:
+                consumer = getattr(callback, "__self__", callback)
+                previous = self._requests.get(consumer)
+                if previous is not None and previous != key and previous in self._pending:
+                    self._pending[previous].pop(consumer, None)
+                self._requests[consumer] = key
+
+                waiting = self._pending.get(key)
+                if waiting is None:
+                    waiting = self._pending[key] = weakref.WeakKeyDictionary()
+                    self._executor.submit(self._compute_pending, key, statistic, data, max_sample_size, axes, kwargs)
+                waiting[consumer] = weakref.WeakMethod(callback) if hasattr(callback, "__self__") else callback
+                return None
+
+        result = self._compute(statistic, data, max_sample_size, axes, kwargs)
+        self._store(key, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _compute(self, statistic, data, max_sample_size, axes, kwargs):
+        sample = strided_sample(data, max_size=max_sample_size, axes=axes)
+        return STATISTICS[statistic](sample, **kwargs)
+
+    def _compute_pending(self, key, statistic, data, max_sample_size, axes, kwargs):
+        with self._lock:
+            if not self._pending.get(key):
+                # Everyone has moved on
+                self._pending.pop(key, None)
+                return
+        try:
+            result = self._compute(statistic, data, max_sample_size, axes, kwargs)
+        except Exception as ex:
+            msg.logMessage(f"Could not compute the {statistic} of an image.", level=msg.WARNING)
+            msg.logError(ex)
+            result = None
+        threads.invoke_as_event(self._deliver, key, result)
+
+    def _store(self, key, result):
+        if result is None:
+            return
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _deliver(self, key, result):
+        self._store(key, result)
+        with self._lock:
+            waiting = self._pending.pop(key, {})
+            callbacks = []
+            for consumer, callback in list(waiting.items()):
+                if self._requests.get(consumer) == key:
+                    del self._requests[consumer]
+                    callbacks.append(callback() if isinstance(callback, weakref.WeakMethod) else callback)
+        for callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback(result)
+            except RuntimeError:
+                # The consumer's Qt object has been deleted
+                pass
+
+
+# Shared by all image views
+image_statistics = ImageStatistics()
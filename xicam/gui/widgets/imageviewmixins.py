@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import time
+import uuid
 from functools import WRAPPER_ASSIGNMENTS, lru_cache
 
 import pyqtgraph as pg
@@ -8,21 +9,27 @@ from pyqtgraph import ImageView, InfiniteLine, mkPen, ScatterPlotItem, ImageItem
 from qtpy.QtGui import QTransform, QPolygonF, QIcon, QPixmap
 from qtpy.QtWidgets import QLabel, QErrorMessage, QSizePolicy, QPushButton, QHBoxLayout, QVBoxLayout, QComboBox, \
     QWidget, QToolBar, QActionGroup, QAction, QLayout, QCheckBox, QProgressBar
-from qtpy.QtCore import Qt, Signal, Slot, QSize, QPointF, QRectF
+from qtpy.QtCore import Qt, Signal, Slot, QSize, QPointF, QRectF, QTimer
 import numpy as np
 from databroker.core import BlueskyRun
 from xarray import DataArray
 
 # from pyFAI.geometry import Geometry
-from camsaxs.remesh_bbox import remesh, q_from_geometry
 from xicam.core import msg, threads
 from xicam.core.data import MetaXArray
-from xicam.core.data.bluesky_utils import fields_from_stream, streams_from_run, is_image_field
+from xicam.core.data.cache import FrameCache, PlaybackPrefetcher, ProfileBlockCache
+from xicam.core.data.ringbuffer import FrameRingBuffer, RateMeter
+from xicam.core.data.bluesky_utils import streams_from_run, is_image_field, run_summary
 from xicam.core.threads import invoke_as_event
 from xicam.gui.actions import ROIAction
 from xicam.gui.widgets.elidedlabel import ElidedLabel
+from xicam.gui.widgets.imagestatistics import image_statistics
 from xicam.gui.static import path
 from xicam.gui.widgets.metadataview import MetadataWidget
+from xicam.gui.widgets.pyramid import PyramidImageItem
+from xicam.gui.widgets.remesh import remesh, remesh_maps
+from xicam.gui.widgets.cake import cake, cake_axes
+from xicam.gui.widgets.qmap import q_maps
 from xicam.gui.widgets.ROI import BetterPolyLineROI, BetterCrosshairROI, BetterRectROI, ArcROI, SegmentedArcROI, \
     SegmentedRectROI, ArcQROI, ArcPXROI
 import enum
@@ -164,12 +171,21 @@ class ExportButton(BetterLayout):
 
 @live_plugin('ImageMixinPlugin')
 class XArrayView(ImageView):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, frame_cache: FrameCache = None, prefetch: bool = True, **kwargs):
         # Add axes
         self.axesItem = PlotItem()
         self.axesItem.axes["left"]["item"].setZValue(10)
         self.axesItem.axes["top"]["item"].setZValue(10)
-        self._min_max_cache = dict()
+
+        # Optionally keep displayed frames (e.g. compressed, with a CompressedFrameCache) for fast revisits
+        self.frame_cache = frame_cache
+        self._image_token = None
+
+        # Lazily loaded (dask-backed) stacks are read around the timeline position on background threads
+        self.prefetch = prefetch
+        self._prefetcher = None
+        self._prefetcher_key = None
+        self._prefetch_cache = None
 
         if "view" not in kwargs:
             kwargs["view"] = self.axesItem
@@ -221,6 +237,14 @@ class XArrayView(ImageView):
             # Add a bit more size
             self.ui.roiPlot.setMinimumSize(QSize(0, 70))
 
+        self._image_token = uuid.uuid4().hex
+        if self._prefetcher is not None:
+            # Drop reads queued for the previous image
+            self._prefetcher.shutdown()
+            self._prefetcher = None
+            if self._prefetch_cache is not None:
+                self._prefetch_cache.clear()
+
         # Bind coords from the xarray to the timeline axis
         super(XArrayView, self).setImage(img, **kwargs)
 
@@ -249,39 +273,55 @@ class XArrayView(ImageView):
             # Select time index
             if self.axes['t'] is not None:
                 self.ui.roiPlot.show()
-                image = image[self.currentIndex]
+                image = self._frame(image, self.currentIndex)
 
             self.imageItem.updateImage(np.asarray(image))
 
         else:
             super(XArrayView, self).updateImage(autoHistogramRange)
 
+    def _frame(self, image, index):
+        if self.prefetch and hasattr(getattr(image, 'data', image), 'dask'):
+            return self._prefetched_frame(image, index)
+
+        if self.frame_cache is None:
+            return image[index]
+
+        key = (self._image_token, index, self.imageItem.axisOrder)
+        frame = self.frame_cache.get(key)
+        if frame is None:
+            frame = np.asarray(image[index])
+            self.frame_cache.put(key, frame)
+        return frame
+
+    def _prefetched_frame(self, image, index):
+        token, axisOrder = self._image_token, self.imageItem.axisOrder
+        if self._prefetcher is None or self._prefetcher_key != (token, axisOrder):
+            if self._prefetcher is not None:
+                self._prefetcher.shutdown()
+            cache = self.frame_cache
+            if cache is None:
+                if self._prefetch_cache is None:
+                    self._prefetch_cache = FrameCache(max_bytes=256 * 2 ** 20)
+                cache = self._prefetch_cache
+            self._prefetcher = PlaybackPrefetcher(lambda i: np.asarray(image[i]),
+                                                  lambda i: (token, i, axisOrder),
+                                                  len(image),
+                                                  cache)
+            self._prefetcher_key = (token, axisOrder)
+        return self._prefetcher.get(index)
+
     def quickMinMax(self, data):
         """
         Estimate the min/max values of *data* by subsampling. MODIFIED TO USE:
         - second lowest value as min
         - 99TH PERCENTILE instead of max
-        NOTE: memoization assumes that data does not mutate
+        Results are cached by the shared image statistics service.
         """
-
-        if id(data) in self._min_max_cache:
-            return self._min_max_cache[id(data)]
-
         if data is None:
             return 0, 0
 
-        sl = slice(None, None, max(1, int(np.prod(np.asarray(data.shape, dtype=np.float_)) // 1e6)))  # can't trust data.size due to likely overflow
-        data = np.asarray(data[sl])
-
-        img_max = np.nanmax(data)
-        img_min = np.nanmin(data)
-        levels = np.min(data, where=data > img_min, initial=img_max), np.nanpercentile(
-            np.where(data < img_max, data, img_min), 99)
-
-        self._min_max_cache[id(data)] = [levels]
-        # TODO: prune cache
-
-        return [levels]
+        return [image_statistics.levels(data)]
 
 
 class PixelSpace(XArrayView):
@@ -436,6 +476,8 @@ class CenterMarker(QSpace):
                     self.centerplot.setData(x=[x], y=[y])
                 elif self.displaymode == DisplayMode.remesh:
                     self.centerplot.setData(x=[0], y=[0])
+                else:
+                    self.centerplot.setData(x=[], y=[])
 
     def setGeometry(self, geometry):
         super(CenterMarker, self).setGeometry(geometry)
@@ -541,16 +583,30 @@ class QCoordinates(QSpace, PixelCoordinates):
                     f"d={2 * np.pi / np.sqrt(pos.x() ** 2 + pos.y() ** 2) * 10:0.3f} nm, "
                     f"\u03B8={np.rad2deg(np.arctan2(pos.y(), pos.x())):.2f}&#176;"
                 )
+            elif self.displaymode == DisplayMode.cake:
+                try:
+                    I = self.imageItem.image[int(pxpos.x()), int(pxpos.y())]
+                except IndexError:
+                    I = 0
+                self._coordslabel.setText(
+                    f"x={pxpos.x():0.1f}, "
+                    f"y={pxpos.y():0.1f}, "
+                    f"I={I:0.0f}, "
+                    f"q={pos.x():0.3f} \u212B\u207B\u00B9, "
+                    f"d={2 * np.pi / pos.x() * 10 if pos.x() else np.inf:0.3f} nm, "
+                    f"\u03C7={pos.y():.2f}&#176;"
+                )
             elif self.displaymode == DisplayMode.raw:
                 try:
                     I = self.imageItem.image[int(pxpos.x()), int(pxpos.y())]
                 except IndexError:
                     I = 0
 
-                q = q_from_geometry(self.imageItem.image.shape,
-                                    self._geometry,
-                                    reflection=False,
-                                    alphai=0)[int(pxpos.x()), int(self.imageItem.image.shape[-1] - pxpos.y())]
+                # A lookup in the cached q map (or a one-pixel calculation while it's being built)
+                q, chi, two_theta = q_maps.lookup(self.imageItem.image.shape,
+                                                  self._geometry,
+                                                  int(pxpos.x()),
+                                                  int(self.imageItem.image.shape[-1] - pxpos.y()))
 
                 self._coordslabel.setText(
                     f"x={pxpos.x():0.1f}, "
@@ -560,7 +616,9 @@ class QCoordinates(QSpace, PixelCoordinates):
                     f"q<sub>z</sub>={-q[1]:0.3f} \u212B\u207B\u00B9, "
                     f"q<sub>\u2225</sub>={q[0]:0.3f} \u212B\u207B\u00B9, "
                     f"d={2 * np.pi / np.sqrt(q[0] ** 2 + q[1] ** 2) * 10:0.3f} nm, "
-                    f"\u03B8={np.rad2deg(np.arctan2(-q[1], q[0])):.2f}&#176;"
+                    f"\u03B8={np.rad2deg(np.arctan2(-q[1], q[0])):.2f}&#176;, "
+                    f"2\u03B8={np.rad2deg(two_theta):.2f}&#176;, "
+                    f"\u03C7={np.rad2deg(chi):.2f}&#176;"
                 )
         else:
             super(QCoordinates, self).formatCoordinates(pxpos, pos)
@@ -605,77 +663,11 @@ class PolygonROI(ImageView):
         Returns
         -------
         ndarray:
-            Mask array of the ROI polygon within image space (mask shape matches image shape).
+            Mask array of the ROI polygon within image space (mask shape matches image shape); shared, and read-only.
 
         """
-        result, mapped = self._roiItem.getArrayRegion(
-            np.ones_like(self.imageItem.image), self.imageItem, returnMappedCoords=True
-        )
-
-        # TODO -- move this code to own function and test
-        # Reverse the result array to make indexing calculations easier, then revert back
-        result = result[::-1, ::-1]
-        mapped = mapped[::-1, ::-1]
-
-        # Pad result mask rect into bounding rect of mask and image
-        floorRow = np.floor(mapped[0]).astype(int)
-        floorCol = np.floor(mapped[1]).astype(int)
-
-        # Return empty mask if ROI bounding box does not intersect image bounding box
-        resultRect = QRectF(QPointF(np.min(floorRow), np.min(floorCol)), QPointF(np.max(floorRow), np.max(floorCol)))
-        if not self._intersectsImage(resultRect):
-            # TODO -- is zeros(shape) the right return value for a non-intersecting polygon?
-            return np.zeros(self.imageItem.image.shape)
-
-        # Find the bounds of the ROI polygon
-        minX = np.min(floorRow)
-        maxX = np.max(floorRow)
-        minY = np.min(floorCol)
-        maxY = np.max(floorCol)
-
-        width = self.imageItem.width()
-        height = self.imageItem.height()
-        # Pad the ROI polygon into the image shape
-        # Don't need padding if a polygon boundary is outside of the image shape
-        padXBefore = minX
-        if minX < 0:
-            padXBefore = 0
-        padXAfter = height - maxX
-        if padXAfter < 0:
-            padXAfter = 0
-        padYBefore = minY
-        if minY < 0:
-            padYBefore = 0
-        padYAfter = width - maxY
-        if padYAfter < 0:
-            padYAfter = 0
-
-        boundingBox = np.pad(result, ((padYBefore, padYAfter), (padXBefore, padXAfter)), "constant")
-
-        # For trimming, any negative minimums need to be shifted into the image shape
-        offsetX = 0
-        offsetY = 0
-        if minX < 0:
-            offsetX = abs(minX)
-        if minY < 0:
-            offsetY = abs(minY)
-        trimmed = boundingBox[abs(offsetY) : abs(offsetY) + height, abs(offsetX) : abs(offsetX) + width]
-
-        # Reorient the trimmed mask array
-        trimmed = trimmed[::-1, ::-1]
-
-        # # TODO remove plotting code below
-        # from matplotlib import pyplot as plt
-        # plt.figure('bounding_box, origin="lower"')
-        # plt.imshow(boundingBox, origin='lower')
-        # plt.show()
-        #
-        #
-        # plt.figure(f'trimmed, origin="lower", [{abs(offsetY)}:{abs(offsetY)+height}, {abs(offsetX)}:{abs(offsetX)+width}]')
-        # plt.imshow(trimmed, origin='lower')
-        # plt.show()
-        # # TODO remove the plotting code above
-        return trimmed
+        # Only the polygon's bounding box is filled, and the mask is reused until the ROI or image shape changes
+        return self._roiItem.labelArray(self.imageItem.image, self.imageItem)
 
     def _intersectsImage(self, rectangle: QRectF):
         """
@@ -711,16 +703,121 @@ class ComposableItemImageView(ImageView):
 
     imageItem_bases = tuple()
 
+    def setImage(self, img, *args, **kwargs):
+        # ImageView.__init__ sets the (still empty) image of an imageItem passed to it; there's nothing to show yet
+        if img is None:
+            return
+        super(ComposableItemImageView, self).setImage(img, *args, **kwargs)
+
 
 class LogScaleImageItem(ImageItem):
+    """
+    An ImageItem that can display log(1 + intensity).
+
+    The log-transformed frame is cached until the frame changes, so level and LUT changes only redo the color mapping.
+    Integer frames skip the float transform altogether: the log, the levels and the LUT are folded into one lookup
+    table over the frame's range of values (at most ``maxLogLutSize`` entries), which is rebuilt only when the levels
+    or the LUT change, so that rendering costs a single table lookup per pixel.
+    """
+
+    maxLogLutSize = 2 ** 22
+
     def __init__(self, *args, **kwargs):
+        # Keyed on the frame itself too, as it may be swapped out without setImage (e.g. for the tiles of a pyramid)
+        self._logImage = None  # (frame, downsample, log-transformed frame)
+        self._logIndex = None  # (frame, downsample, (offset, table size, frame as table indices) or None)
+        self._logValues = None  # (offset, size, log(1 + value) for each value in the table)
+        self._logLut = None  # (key, lut, lookup table from frame value to display value)
         super(LogScaleImageItem, self).__init__(*args, **kwargs)
         self.logScale = True
 
+    def setImage(self, image=None, autoLevels=None, **kargs):
+        if image is not None:
+            self._logImage = self._logIndex = None
+        super(LogScaleImageItem, self).setImage(image, autoLevels, **kargs)
+
+    @staticmethod
+    def _logLevels(levels):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            levels = np.log(np.add(levels, 1, dtype=np.float64))
+        levels[..., 0] = np.fmax(levels[..., 0], 0)
+        return levels
+
+    def _downsampleFactors(self):
+        # reduce dimensions of image based on screen resolution
+        o = self.mapToDevice(QPointF(0, 0))
+        x = self.mapToDevice(QPointF(1, 0))
+        y = self.mapToDevice(QPointF(0, 1))
+        w = Point(x - o).length()
+        h = Point(y - o).length()
+        if w == 0 or h == 0:
+            return None
+        return max(1, int(1.0 / w)), max(1, int(1.0 / h))
+
+    def _downsample(self, image, downsample):
+        xds, yds = downsample
+        if xds == yds == 1:
+            return image
+        axes = [1, 0] if self.axisOrder == "row-major" else [0, 1]
+        image = fn.downsample(image, xds, axis=axes[0])
+        return fn.downsample(image, yds, axis=axes[1])
+
+    def _logTransformedImage(self, downsample):
+        if self._logImage is None or self._logImage[0] is not self.image or self._logImage[1] != downsample:
+            image = self.image
+            image = np.add(image, 1, dtype=image.dtype if image.dtype.kind == "f" else np.float64)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                np.log(image, where=image >= 0, out=image)
+            self._logImage = self.image, downsample, self._downsample(image, downsample)
+        return self._logImage[2]
+
+    def _logIndexImage(self, downsample):
+        """Return (offset, size, frame as indices into a table of ``size`` values from ``offset``), or None."""
+        if self._logIndex is None or self._logIndex[0] is not self.image or self._logIndex[1] != downsample:
+            image = self.image
+            index = None
+            if image.dtype.kind in "ui" and image.ndim == 2:
+                if downsample != (1, 1):
+                    image = np.rint(self._downsample(image, downsample)).astype(self.image.dtype)
+                if image.dtype in (np.ubyte, np.uint16):
+                    index = 0, 2 ** (image.itemsize * 8), image
+                else:
+                    offset, size = int(image.min()), int(image.max()) - int(image.min()) + 1
+                    if size <= self.maxLogLutSize:
+                        image = np.subtract(image, offset, dtype=np.int64).astype(np.min_scalar_type(size - 1))
+                        index = offset, size, image
+            self._logIndex = self.image, downsample, index
+        return self._logIndex[2]
+
+    def _logLookupTable(self, offset, size, levels, lut):
+        key = offset, size, tuple(levels)
+        if self._logLut is not None and self._logLut[0] == key and self._logLut[1] is lut:
+            return self._logLut[2]
+
+        if self._logValues is None or self._logValues[:2] != (offset, size):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                self._logValues = offset, size, np.log1p(np.arange(offset, offset + size, dtype=np.float64))
+        values = self._logValues[2]
+
+        minlev, maxlev = self._logLevels(levels)
+        levdiff = maxlev - minlev
+        levdiff = 1 if levdiff == 0 or not np.isfinite(levdiff) else levdiff  # don't allow division by 0
+        tablesize = 256 if lut is None else lut.shape[0]
+        with np.errstate(invalid="ignore"):
+            scaled = np.nan_to_num((values - minlev) * ((tablesize - 1) / levdiff), nan=0.0)
+        table = np.clip(scaled, 0, tablesize - 1).astype(np.min_scalar_type(tablesize - 1))
+        if lut is not None:
+            table = lut[table]
+
+        self._logLut = key, lut, table
+        return table
+
     def render(self):
         # Convert data to QImage for display.
+        if not self.logScale:
+            return super(LogScaleImageItem, self).render()
 
-        profile = debug.Profiler()
+        self._unrenderable = True
         if self.image is None or self.image.size == 0:
             return
         if isinstance(self.lut, Callable):
@@ -728,55 +825,27 @@ class LogScaleImageItem(ImageItem):
         else:
             lut = self.lut
 
-        if self.logScale:
-            image = self.image + 1
-            with np.errstate(invalid="ignore", divide='ignore'):
-                image = image.astype(np.float)
-                np.log(image, where=image >= 0, out=image)  # map to 0-255
-        else:
-            image = self.image
-
+        downsample = (1, 1)
         if self.autoDownsample:
-            # reduce dimensions of image based on screen resolution
-            o = self.mapToDevice(QPointF(0, 0))
-            x = self.mapToDevice(QPointF(1, 0))
-            y = self.mapToDevice(QPointF(0, 1))
-            w = Point(x - o).length()
-            h = Point(y - o).length()
-            if w == 0 or h == 0:
+            downsample = self._downsampleFactors()
+            if downsample is None:
                 self.qimage = None
                 return
-            xds = max(1, int(1.0 / w))
-            yds = max(1, int(1.0 / h))
-            axes = [1, 0] if self.axisOrder == "row-major" else [0, 1]
-            image = fn.downsample(image, xds, axis=axes[0])
-            image = fn.downsample(image, yds, axis=axes[1])
-            self._lastDownsample = (xds, yds)
-        else:
-            pass
+            self._lastDownsample = downsample
 
-        # if the image data is a small int, then we can combine levels + lut
-        # into a single lut for better performance
         levels = self.levels
-        if levels is not None and levels.ndim == 1 and image.dtype in (np.ubyte, np.uint16):
-            if self._effectiveLut is None:
-                eflsize = 2 ** (image.itemsize * 8)
-                ind = np.arange(eflsize)
-                minlev, maxlev = levels
-                levdiff = maxlev - minlev
-                levdiff = 1 if levdiff == 0 else levdiff  # don't allow division by 0
-                if lut is None:
-                    efflut = fn.rescaleData(ind, scale=255.0 / levdiff, offset=minlev, dtype=np.ubyte)
-                else:
-                    lutdtype = np.min_scalar_type(lut.shape[0] - 1)
-                    efflut = fn.rescaleData(
-                        ind, scale=(lut.shape[0] - 1) / levdiff, offset=minlev, dtype=lutdtype, clip=(0, lut.shape[0] - 1)
-                    )
-                    efflut = lut[efflut]
-
-                self._effectiveLut = efflut
-            lut = self._effectiveLut
-            levels = None
+        index = self._logIndexImage(downsample) if levels is not None and np.ndim(levels) == 1 else None
+        if index is not None:
+            # Integer data; map values to display values in one lookup
+            offset, size, image = index
+            image = self._logLookupTable(offset, size, levels, lut)[image]
+            lut, levels = None, None
+        else:
+            image = self._logTransformedImage(downsample)
+            if levels is None:
+                levels = np.array([np.nanmin(image), np.nanmax(image)])
+            else:
+                levels = self._logLevels(levels)
 
         # Assume images are in column-major order for backward compatibility
         # (most images are in row-major order)
@@ -784,13 +853,10 @@ class LogScaleImageItem(ImageItem):
         if self.axisOrder == "col-major":
             image = image.transpose((1, 0, 2)[: image.ndim])
 
-        if self.logScale:
-            with np.errstate(invalid="ignore"):
-                levels = np.log(np.add(levels, 1))
-            levels[0] = np.nanmax([levels[0], 0])
-
         argb, alpha = fn.makeARGB(image, lut=lut, levels=levels)
         self.qimage = fn.makeQImage(argb, alpha, transpose=False)
+        self._renderRequired = False
+        self._unrenderable = False
 
 
 class LogScaleIntensity(BetterLayout, ComposableItemImageView):
@@ -917,7 +983,18 @@ class CrosshairROI(ImageView):
 
 
 class DepthPlot(XArrayView, CrosshairROI):
+    """
+    Plots the profile through the depth (first) axis of the stack at the crosshair.
+
+    Profiles are served from a ProfileBlockCache: blocks of pixels are read across the whole depth in the background,
+    one at a time; while a block is loading, only the most recent crosshair position is kept to be loaded next.
+    """
+
     def __init__(self, *args, **kwargs):
+        self._profiles = None
+        self._pending_pixel = None
+        self._loading = False
+
         super(DepthPlot, self).__init__()
 
         # self.roi = pg.RectROI((0,0), (1,1))
@@ -926,10 +1003,61 @@ class DepthPlot(XArrayView, CrosshairROI):
         self.crosshair.sigMoved.connect(self.plotDepth)
         self._plotitem = self.ui.roiPlot.plot()  # type: pg.PlotDataItem
 
+    def setImage(self, img, *args, **kwargs):
+        self._profiles = ProfileBlockCache(img) if getattr(img, 'ndim', 0) == 3 else None
+        self._pending_pixel = None
+        super(DepthPlot, self).setImage(img, *args, **kwargs)
+
+    def _nearestPixel(self, x, y):
+        pixel = []
+        for dim, value in ((self.image.dims[1], y), (self.image.dims[2], x)):
+            index = self.image.indexes[dim].get_indexer([value], method='nearest')[0]
+            pixel.append(int(np.clip(index, 0, self.image.sizes[dim] - 1)))
+        return tuple(pixel)
+
     def plotDepth(self):
+        if self._profiles is None or self.image is None:
+            return
         x, y = self.crosshair.pos()
-        self._plotitem.setData(x=np.asarray(self.image.coords[self.image.dims[0]]),
-                               y=self.image.sel(**{self.image.dims[2]: x, self.image.dims[1]: y}, method='nearest'))
+        pixel = self._nearestPixel(x, y)
+
+        profile = self._profiles.profile(*pixel)
+        if profile is not None:
+            self._pending_pixel = None
+            self._setProfile(profile)
+            return
+
+        self._pending_pixel = pixel
+        if not self._loading:
+            self._loadProfile()
+
+    def _loadProfile(self):
+        pixel, self._pending_pixel = self._pending_pixel, None
+        self._loading = True
+        profiles = self._profiles
+        threads.QThreadFuture(profiles.get, *pixel,
+                              callback_slot=partial(self._profileLoaded, profiles),
+                              except_slot=lambda *_: invoke_as_event(self._profileLoaded, profiles, None),
+                              showBusy=False).start()
+
+    def _profileLoaded(self, profiles, profile):
+        self._loading = False
+        if profiles is not self._profiles:
+            # The image has changed since
+            profile = None
+        if self._pending_pixel is not None:
+            # The crosshair moved on while loading; catch up with its latest position
+            cached = self._profiles.profile(*self._pending_pixel) if self._profiles else None
+            if cached is None:
+                self._loadProfile()
+                return
+            self._pending_pixel = None
+            profile = cached
+        if profile is not None:
+            self._setProfile(profile)
+
+    def _setProfile(self, profile):
+        self._plotitem.setData(x=np.asarray(self.image.coords[self.image.dims[0]]), y=profile)
 
 
 class StreamSelector(CatalogView, BetterLayout):
@@ -949,7 +1077,8 @@ class StreamSelector(CatalogView, BetterLayout):
         if catalog:
             streams = streams_from_run(catalog)
             if self.stream_filter:
-                streams = list(filter(is_image_field, streams))
+                summary = run_summary(catalog)
+                streams = [stream for stream in streams if summary.image_fields(stream)]
             self.streamComboBox.addItems(streams)
             if 'primary' in streams:
                 self.streamComboBox.setCurrentText('primary')
@@ -978,7 +1107,7 @@ class FieldSelector(CatalogView, BetterLayout):
     def updateFieldNames(self, catalog, stream):
         self.fieldComboBox.clear()
         if catalog and stream:
-            fields = fields_from_stream(catalog, stream)
+            fields = run_summary(catalog).fields(stream)
             if self.field_filter:
                 fields = list(filter(partial(self.field_filter, catalog, stream), fields))
             self.fieldComboBox.addItems(fields)
@@ -1122,6 +1251,8 @@ class CatalogImagePlotView(StreamSelector, FieldSelector, TimelineIndex, MetaDat
 
 
 class ImageItemHistogramOverflowFix(ImageItem):
+    sigHistogramReady = Signal()
+
     def getHistogram(self, bins="auto", step="auto", targetImageSize=200, targetHistogramSize=500, **kwds):
         """Returns x and y arrays containing the histogram values for the current image.
                 For an explanation of the return format, see numpy.histogram().
@@ -1139,33 +1270,31 @@ class ImageItemHistogramOverflowFix(ImageItem):
                 * All other types will have *targetHistogramSize* bins.
 
                 This method is also used when automatically computing levels.
+
+                The histogram is computed in the background by the shared image statistics service; until it's
+                ready, (None, None) is returned, and sigHistogramReady is emitted once it is.
                 """
         if self.image is None:
             return None, None
         if step == "auto":
-            step = (int(np.ceil(self.image.shape[0] / targetImageSize)), int(np.ceil(self.image.shape[1] / targetImageSize)))
-        if np.isscalar(step):
-            step = (step, step)
-        stepData = self.image[:: step[0], :: step[1]]
-
-        if bins == "auto":
-            if stepData.dtype.kind in "ui":
-                mn = stepData.min()
-                mx = stepData.max()
-                # print(f"\n*** mx, mn: {mx}, {mn} ({type(mx)}, {type(mn)})***\n")
-                # PATCH -- explicit subtract with np.int to avoid overflow
-                step = max(1, np.ceil(np.subtract(mx, mn, dtype=np.int) / 500.0))
-                bins = np.arange(mn, mx + 1.01 * step, step, dtype=np.int)
-                if len(bins) == 0:
-                    bins = [mn, mx]
-            else:
-                bins = 500
-
-        kwds["bins"] = bins
-        stepData = stepData[np.isfinite(stepData)]
-        hist = np.histogram(stepData, **kwds)
+            max_sample_size = targetImageSize ** 2
+        else:
+            max_sample_size = np.prod(self.image.shape[:2]) / np.prod(np.broadcast_to(step, 2))
+
+        hist = image_statistics.histogram(self.image,
+                                          callback=self._histogramReady,
+                                          max_sample_size=max_sample_size,
+                                          axes=(0, 1),
+                                          bins=bins,
+                                          target_bins=targetHistogramSize,
+                                          **kwds)
+        if hist is None:
+            return None, None
+        return hist
 
-        return hist[1][:-1], hist[0]
+    def _histogramReady(self, hist):
+        if hist is not None and hist[0] is not None:
+            self.sigHistogramReady.emit()
 
 
 class ImageViewHistogramOverflowFix(ComposableItemImageView):
@@ -1177,6 +1306,23 @@ class ImageViewHistogramOverflowFix(ComposableItemImageView):
         if "imageItem" in kwargs:
             del kwargs["imageItem"]
         super(ImageViewHistogramOverflowFix, self).__init__(imageItem=imageItem, *args, **kwargs)
+        # Have the histogram widget ask again, now that the histogram is cached
+        self.imageItem.sigHistogramReady.connect(self.ui.histogram.item.imageChanged)
+
+
+@live_plugin('ImageMixinPlugin')
+class PyramidImageView(ComposableItemImageView):
+    """
+    Renders frames through a PyramidImageItem, so that only the visible tiles are rendered, at the displayed resolution.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # The pyramid item wraps the render of the other composed ImageItems, so it must come first in their MRO
+        self.imageItem_bases = (PyramidImageItem,) + self.imageItem_bases
+        imageItem = type("DynamicImageItem", tuple(self.imageItem_bases), {})()
+        if "imageItem" in kwargs:
+            del kwargs["imageItem"]
+        super(PyramidImageView, self).__init__(imageItem=imageItem, *args, **kwargs)
 
 
 @live_plugin('ImageMixinPlugin')
@@ -1236,6 +1382,10 @@ class ToolbarLayout(BetterLayout):
 
 
 class EwaldCorrected(QSpace, ToolbarLayout, ProcessingView):
+    # Resolution of the cake (q/chi) display
+    cake_radial_bins = 1000
+    cake_azimuthal_bins = 360
+
     def __init__(self, *args, **kwargs):
         self.geometry_mode = 'transmission'
         self.incidence_angle = 0
@@ -1283,21 +1433,27 @@ class EwaldCorrected(QSpace, ToolbarLayout, ProcessingView):
     def process(self, image):
         if self.displaymode == DisplayMode.remesh:
             image, q_x, q_z = remesh(np.asarray(image), self._geometry, reflection=self.geometry_mode == 'reflection', alphai=self.incidence_angle)
+        elif self.displaymode == DisplayMode.cake:
+            image, q, chi = cake(image, self._geometry, self.cake_radial_bins, self.cake_azimuthal_bins)
         return image
 
     def transform(self, img=None):
-        if not self._geometry or not self.displaymode == DisplayMode.remesh:
+        if not self._geometry or self.displaymode not in (DisplayMode.remesh, DisplayMode.cake):
             return super(EwaldCorrected, self).transform(img)  # Do pixel space transform when not calibrated
 
-        while len(img.shape) > 2:
-            img = img[0]
-
-        img, q_x, q_z = remesh(np.asarray(img), self._geometry,
-                               reflection=(self.geometry_mode or 'transmission') != 'transmission',
-                               alphai=self.incidence_angle)
+        if self.displaymode == DisplayMode.cake:
+            # The cake's axes follow from its ranges and bin counts; the image itself is only caked by process()
+            q_x, q_z = cake_axes(self._geometry, img.shape[-2:], self.cake_radial_bins, self.cake_azimuthal_bins)
+            shape = q_x.shape
+        else:
+            # Only the q grid is needed here; the remesh map is cached for process() to reuse on every frame
+            remesh_map = remesh_maps.get(img.shape[-2:], self._geometry,
+                                         reflection=(self.geometry_mode or 'transmission') != 'transmission',
+                                         alphai=self.incidence_angle)
+            q_x, q_z = remesh_map.q_h, remesh_map.q_v
+            shape = remesh_map.output_shape
 
         # Build Quads
-        shape = img.shape
         a = shape[-2] - 1, 0  # bottom-left
         b = shape[-2] - 1, shape[-1] - 1  # bottom-right
         c = 0, shape[-1] - 1  # top-right
@@ -1343,6 +1499,9 @@ class EwaldCorrected(QSpace, ToolbarLayout, ProcessingView):
         if self.displaymode == DisplayMode.remesh:
             self.axesItem.setLabel("bottom", "q<sub>x</sub> (Å⁻¹)")  # , units='s')
             self.axesItem.setLabel("left", "q<sub>z</sub> (Å⁻¹)")
+        elif self.displaymode == DisplayMode.cake:
+            self.axesItem.setLabel("bottom", "q (Å⁻¹)")
+            self.axesItem.setLabel("left", "χ (°)")
         else:
             super(EwaldCorrected, self).updateAxes()
 
@@ -1468,18 +1627,32 @@ class AxesLabels(ImageView):
 
 @live_plugin('ImageMixinPlugin')
 class DeviceView(BetterLayout):
-    def __init__(self, *args, device=None, preprocess=None, max_fps=4, allow_active=True, **kwargs):
+    """
+    A live view of an area detector.
+
+    Acquisition (polling the device at up to ``max_fps``) and display (at up to ``display_fps``) are decoupled by a
+    ring buffer of the last ``buffer_size`` frames: the acquisition thread pushes each new frame into the buffer, and
+    the display shows the newest one it holds, skipping (and counting as dropped) any it didn't get to.
+    """
+
+    def __init__(self, *args, device=None, preprocess=None, max_fps=4, display_fps=30, buffer_size=64,
+                 allow_active=True, **kwargs):
         super(DeviceView, self).__init__(*args, **kwargs)
         self.device = device
         self.preprocess = preprocess
         self.max_fps = max_fps
+        self.buffer = FrameRingBuffer(buffer_size)
+        self.dropped_frames = 0
+        self._displayed = None  # number of the frame displayed
+        self._last_counter = None  # the device's array counter at the last frame acquired
+        self._acquisition_rate = RateMeter()
+        self._display_rate = RateMeter()
         self.thread = None
         self.passive = QPushButton('Passive')
         self.passive.setCheckable(True)
         self.passive.setChecked(True)
         if allow_active:
             self.ui.right_layout.addWidget(self.passive)
-        self.getting_frame = False
         self._last_timestamp = time.time()
         self._autolevel = True
 
@@ -1502,6 +1675,28 @@ class DeviceView(BetterLayout):
                                             except_slot=lambda ex: self.device.unstage())
         self.thread.start()
 
+        self._display_timer = QTimer(self)
+        self._display_timer.timeout.connect(self._displayLatest)
+        self._display_timer.start(int(1000 / display_fps))
+
+    @property
+    def statistics(self):
+        return {'acquired': self.buffer.count,
+                'displayed': self._display_rate.count,
+                'dropped': self.dropped_frames,
+                'acquisition fps': self._acquisition_rate.rate,
+                'display fps': self._display_rate.rate}
+
+    def stop(self):
+        """Stop acquiring and displaying frames."""
+        self._display_timer.stop()
+        if self.thread is not None and self.thread.running:
+            self.thread.cancel()
+
+    def closeEvent(self, event):
+        self.stop()
+        super(DeviceView, self).closeEvent(event)
+
     def active_trigger(self):
         self.device.trigger()
         self.updateFrame()
@@ -1517,9 +1712,12 @@ class DeviceView(BetterLayout):
             self.passive.setStyleSheet('background-color: red;')
 
     def _update_thread(self):
-        from caproto import CaprotoTimeoutError
+        try:
+            from caproto import CaprotoTimeoutError
+        except ImportError:  # ophyd's pyepics control layer, or a simulated device
+            CaprotoTimeoutError = TimeoutError
         from ophyd.signal import ConnectionTimeoutError
-        while True:
+        while not self.thread.cancelled:
             if self.visibleRegion().isEmpty():
                 time.sleep(1)  # Sleep for 1 sec if the display is not in view
                 continue
@@ -1544,10 +1742,6 @@ class DeviceView(BetterLayout):
                     else:
                         threads.invoke_in_main_thread(self._update_progress, 0, 1, show_text=False)
 
-
-                while self.getting_frame:
-                    time.sleep(.01)
-
             except (RuntimeError, CaprotoTimeoutError, ConnectionTimeoutError, TimeoutError) as ex:
                 threads.invoke_in_main_thread(self.error_text.setText,
                                               'An error occurred communicating with this device.')
@@ -1567,6 +1761,13 @@ class DeviceView(BetterLayout):
             self._last_timestamp = time.time()
 
     def updateFrame(self):
+        # Don't re-read a frame that's already been acquired
+        counter = getattr(self.device.image1, 'array_counter', None)
+        if counter is not None:
+            counter = counter.get()
+            if counter == self._last_counter:
+                return
+
         try:
             image = self.device.image1.shaped_image.get()
         except ReadTimeoutError as ex:
@@ -1580,29 +1781,41 @@ class DeviceView(BetterLayout):
                 except Exception as ex:
                     pass
                     # msg.logError(ex)
-            self.getting_frame = True
-            threads.invoke_in_main_thread(self._setFrame, image)
+            self.buffer.push(image)
+            self._acquisition_rate.tick()
+            self._last_counter = counter
+
+    def _displayLatest(self):
+        if self.buffer.count - 1 == self._displayed:
+            return  # nothing new
+        latest = self.buffer.latest()
+        if latest is None:
+            return
+        number, image, timestamp = latest
+        if self._displayed is not None and number > self._displayed:
+            self.dropped_frames += number - self._displayed - 1
+        self._displayed = number
+        self._setFrame(image)
+        self._display_rate.tick()
+        self.error_text.setText(f'{self._acquisition_rate.rate:.1f} fps acquired, '
+                                f'{self._display_rate.rate:.1f} fps displayed, {self.dropped_frames} dropped; '
+                                f'latency: {time.time() - timestamp:.2f} s')
 
     def _setFrame(self, image):
-        try:
-            if self.image is None and len(image):
-                self.setImage(image, autoHistogramRange=True, autoLevels=True)
-            else:
-                self.imageDisp = None
-                self.error_text.setText('')
-                self.image = image
-                # self.imageview.updateImage(autoHistogramRange=kwargs['autoLevels'])
-                image = self.getProcessedImage()
-                if self._autolevel:
-                    self.ui.histogram.setHistogramRange(self.levelMin, self.levelMax)
-                    self.autoLevels()
-                self.imageItem.updateImage(image)
-
-                self._autolevel = False
-
-            self.error_text.setText(f'Update time: {(time.time() - self._last_timestamp):.2f} s')
-        finally:
-            self.getting_frame = False
+        if self.image is None and len(image):
+            self.setImage(image, autoHistogramRange=True, autoLevels=True)
+        else:
+            self.imageDisp = None
+            self.error_text.setText('')
+            self.image = image
+            # self.imageview.updateImage(autoHistogramRange=kwargs['autoLevels'])
+            image = self.getProcessedImage()
+            if self._autolevel:
+                self.ui.histogram.setHistogramRange(self.levelMin, self.levelMax)
+                self.autoLevels()
+            self.imageItem.updateImage(image)
+
+            self._autolevel = False
 
     def _update_progress(self, current, total, show_text=True):
         self.acquire_progress.show()
@@ -1,10 +1,19 @@
+import itertools
+from collections import OrderedDict
+from functools import partial
+
+import dask.array as da
 import numpy as np
 from xarray.core.dataarray import DataArray
-from qtpy.QtWidgets import QLayout, QStyle, QSizePolicy, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QScrollArea, QFrame, QAbstractItemView, QScrollBar, QPushButton, QGraphicsView
+from qtpy import sip
+from qtpy.QtWidgets import QLayout, QStyle, QSizePolicy, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QFrame, QAbstractItemView, QScrollBar, QPushButton, QGraphicsView, QAbstractScrollArea
 from qtpy.QtCore import Qt, QRect, QSize, QPoint, Signal, QModelIndex, QRectF, QPointF, QSignalBlocker
 from qtpy.QtGui import QWheelEvent
 from pyqtgraph import HistogramLUTWidget, ImageItem, ViewBox, GraphicsLayoutWidget, TextItem
-from xicam.core.data.bluesky_utils import guess_stream_field, preview
+from pyqtgraph import functions as fn
+from xicam.core import msg, threads
+from xicam.core.data.bluesky_utils import guess_stream_field
+from xicam.core.data.cache import FrameCache
 
 
 def normalize_labels(da: DataArray):
@@ -154,27 +163,199 @@ class FlowLayout(QLayout):
             return parent.spacing()
 
 
+def thumbnail(image, size: int = 256) -> np.ndarray:
+    """Downsample (by averaging) the first 2-D frame of *image* to at most *size* pixels on a side."""
+    image = np.squeeze(np.asarray(image))
+    while image.ndim > 2:
+        image = image[0]
+    for axis in range(image.ndim):
+        factor = -(-image.shape[axis] // size)
+        if factor > 1:
+            image = fn.downsample(image, factor, axis=axis)
+    if np.issubdtype(image.dtype, np.floating):
+        image = image.astype(np.float32, copy=False)
+    return image
+
+
+class LibraryTile(QFrame):
+    """A tile of a ThumbnailGrid: a thumbnail and its label, or a placeholder while the thumbnail loads."""
+
+    def __init__(self, size: QSize, parent=None):
+        super(LibraryTile, self).__init__(parent)
+        self.index = None
+
+        self.setFrameStyle(QFrame.StyledPanel | QFrame.Sunken)
+        self.setLineWidth(2)
+        self.setFixedSize(size)
+        self.setLayout(QVBoxLayout())
+
+        self.graphics_view = ScrollableGraphicsLayoutWidget()
+        self.view = ViewBox(lockAspect=True)
+        self.image_item = ActivatableImageItem()
+        self.view.addItem(self.image_item)
+        self.graphics_view.addItem(self.view)
+        self.layout().addWidget(self.graphics_view)
+
+        self.placeholder = QLabel("Loading...")
+        self.placeholder.setAlignment(Qt.AlignCenter)
+        self.layout().addWidget(self.placeholder)
+
+        self.label = QLabel()
+        self.layout().addWidget(self.label)
+
+    def setThumbnail(self, index: int, image, label: str, levels=None, lut=None, placeholder: str = "Loading..."):
+        """Show entry *index*: its thumbnail *image*, or the *placeholder* text if it's None."""
+        if index != self.index:
+            self.view.enableAutoRange()
+        self.index = index
+        self.label.setText(label)
+        self.placeholder.setText(placeholder)
+        self.placeholder.setVisible(image is None)
+        self.graphics_view.setVisible(image is not None)
+        if image is None:
+            self.image_item.clear()
+            return
+        if levels is None:
+            self.image_item.setImage(image)
+        else:
+            self.image_item.setImage(image, levels=levels)
+        if lut is not None:
+            self.image_item.setLookupTable(lut)
+
+
+class ThumbnailGrid(QAbstractScrollArea):
+    """
+    A scrolling grid of ``count`` equally sized tiles which only has widgets for the tiles in view.
+
+    Tiles scrolled out of view are reused for those scrolled into view; ``populate(tile, index)`` fills a tile in with
+    entry *index*, and ``create_tile()`` makes a new tile when there are none to reuse.
+    """
+    sigVisibleRangeChanged = Signal(object)
+
+    def __init__(self, populate, create_tile, tile_size: QSize = QSize(500, 500), spacing: int = 6, parent=None):
+        super(ThumbnailGrid, self).__init__(parent)
+        self.populate = populate
+        self.create_tile = create_tile
+        self.tile_size = tile_size
+        self.spacing = spacing
+        self.count = 0
+        self.tiles = []  # every tile made, shown or not
+        self._shown = {}  # index -> tile
+        self._visible = range(0)
+
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+    def columns(self):
+        return max(1, (self.viewport().width() - self.spacing) // (self.tile_size.width() + self.spacing))
+
+    def rowHeight(self):
+        return self.tile_size.height() + self.spacing
+
+    def visibleRange(self, clip=True) -> range:
+        """The indices of the tiles (at least partly) in view; if not *clip*, as if there were enough entries."""
+        columns, top = self.columns(), self.verticalScrollBar().value()
+        first = top // self.rowHeight()
+        last = (top + self.viewport().height()) // self.rowHeight()
+        stop = (last + 1) * columns
+        return range(first * columns, min(stop, self.count) if clip else stop)
+
+    def tileAt(self, index: int):
+        return self._shown.get(index)
+
+    def setCount(self, count: int):
+        self.count = count
+        self._updateScrollBar()
+        self.updateTiles()
+
+    def refresh(self, indices=None):
+        """Fill the shown tiles (of *indices*, if given) in again, e.g. after their entries changed."""
+        for index, tile in self._shown.items():
+            if indices is None or index in indices:
+                self.populate(tile, index)
+
+    def updateTiles(self):
+        columns, top = self.columns(), self.verticalScrollBar().value()
+        visible = self.visibleRange()
+
+        # Recycle the tiles scrolled out of view
+        spare = []
+        for index in list(self._shown):
+            if index not in visible:
+                tile = self._shown.pop(index)
+                tile.hide()
+                spare.append(tile)
+        spare.extend(tile for tile in self.tiles if tile not in spare and tile not in self._shown.values())
+
+        for index in visible:
+            tile = self._shown.get(index)
+            if tile is None:
+                if spare:
+                    tile = spare.pop()
+                else:
+                    tile = self.create_tile()
+                    tile.setParent(self.viewport())
+                    self.tiles.append(tile)
+                self._shown[index] = tile
+                self.populate(tile, index)
+            row, column = divmod(index, columns)
+            tile.move(self.spacing + column * (self.tile_size.width() + self.spacing),
+                      self.spacing + row * self.rowHeight() - top)
+            tile.show()
+
+        if visible != self._visible:
+            self._visible = visible
+            self.sigVisibleRangeChanged.emit(visible)
+
+    def _updateScrollBar(self):
+        rows = -(-self.count // self.columns())
+        height = rows * self.rowHeight() + self.spacing
+        scrollbar = self.verticalScrollBar()
+        scrollbar.setRange(0, max(0, height - self.viewport().height()))
+        scrollbar.setPageStep(self.viewport().height())
+        scrollbar.setSingleStep(max(1, self.rowHeight() // 4))
+
+    def scrollContentsBy(self, dx, dy):
+        self.updateTiles()
+
+    def resizeEvent(self, event):
+        super(ThumbnailGrid, self).resizeEvent(event)
+        self._updateScrollBar()
+        self.updateTiles()
+
+
 class LibraryWidget(QWidget):
+    """
+    A grid of thumbnails (e.g. one per run) with a shared histogram, and optionally linked axes.
+
+    Each entry has a loader, which returns its (image, label). Only the tiles in view have widgets (see ThumbnailGrid);
+    their thumbnails are loaded and downsampled in the background, a few at a time, and kept in a bounded cache. A
+    placeholder is shown until an entry's thumbnail is ready.
+    """
     sigImageChanged = Signal()
 
-    def __init__(self):
+    def __init__(self, tile_size: QSize = QSize(500, 500), thumbnail_size: int = 256, max_loading: int = 2,
+                 cache_bytes: int = 256 * 2 ** 20):
         super(LibraryWidget, self).__init__()
         self.image_items = []
         self.views = []
         self.current_image_item = None
+        self.thumbnail_size = thumbnail_size
+        self.max_loading = max_loading
+
+        self._entries = []  # [loader, label, generation]
+        self._generations = itertools.count()
+        self._thumbnails = FrameCache(max_bytes=cache_bytes)  # (index, generation) -> thumbnail
+        self._queue = OrderedDict()  # (index, generation) -> loader
+        self._loading = set()
+        self._levels = None
+        self._lut = None
 
         self.setLayout(QHBoxLayout())
         self.right_layout = QVBoxLayout()
 
-        self.scroll_widget = QScrollArea()
-        self.scroll_widget.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
-        self.scroll_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.scroll_widget.setWidgetResizable(True)
-        self.flow_widget = QWidget()
-        self.flow_layout = FlowLayout()
-        self.flow_widget.setLayout(self.flow_layout)
-        self.scroll_widget.setWidget(self.flow_widget)
-        self.layout().addWidget(self.scroll_widget)
+        self.grid = ThumbnailGrid(self._populate, self._create_tile, tile_size)
+        self.layout().addWidget(self.grid)
 
         self.hist_widget = HistogramLUTWidget()
         self.hist_widget.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Minimum)
@@ -193,18 +374,22 @@ class LibraryWidget(QWidget):
         self.current_view = None
         self.axes_linked = False
 
+    def __len__(self):
+        return len(self._entries)
+
     def set_slice(self, *args, **kwargs):
         # TODO: support generic orthogonal slicing
         print('slice:', args, kwargs)
 
     def set_levels(self, *args, **kwargs):
-        levels = self.hist_widget.item.getLevels()
+        self._levels = levels = self.hist_widget.item.getLevels()
         for image_item in self.image_items:
-            image_item.setLevels(levels)
+            if image_item.image is not None:
+                image_item.setLevels(levels)
 
     def set_lookup_table(self, *args, **kwargs):
         if self.current_image_item and self.current_image_item.image is not None:
-            lut = self.hist_widget.item.getLookupTable(self.current_image_item.image)
+            self._lut = lut = self.hist_widget.item.getLookupTable(self.current_image_item.image)
             for image_item in self.image_items:
                 image_item.setLookupTable(lut)
 
@@ -226,38 +411,106 @@ class LibraryWidget(QWidget):
                     with QSignalBlocker(other_view):
                         other_view.setRange(rect=view_rect, padding=0)
 
+    def set_entry(self, index: int, loader, label: str):
+        """
+        Set entry *index* (appending entries as needed) to load its (image, label) with *loader*; tiles in view aren't
+        updated until ``refresh``.
+        """
+        while len(self._entries) <= index:
+            self._entries.append([None, "", next(self._generations)])
+        self._entries[index] = [loader, label, next(self._generations)]
+
+    def refresh(self, indices=None):
+        """Show the entries' current state, e.g. after ``set_entry``."""
+        self.grid.setCount(len(self._entries))
+        self.grid.refresh(indices)
+
     def add_image(self, image, label):
-        w = QFrame()
-        w.setFrameStyle(QFrame.StyledPanel | QFrame.Sunken)
-        w.setLineWidth(2)
-        w.setFixedSize(QSize(500, 500))
-        w.setLayout(QVBoxLayout())
-        gv = ScrollableGraphicsLayoutWidget()
-        vb = ViewBox(lockAspect=True)
-        ii = ActivatableImageItem(image=image)
-        ii.sigActivated.connect(self.set_current_imageitem)
-        self.hist_widget.item.setImageItem(ii)
-        self.current_image_item = ii
-        self.image_items.append(ii)
-        self.views.append(vb)
-        vb.sigRangeChangedManually.connect(self.propagate_axes)
-        vb.addItem(ii)
-        gv.addItem(vb)
-        self.set_current_imageitem(ii)
-
-        w.layout().addWidget(gv)
-        l = QLabel(label)
-        # l.setStyleSheet("color: white;")
-        w.layout().addWidget(l)
-
-        self.flow_layout.addWidget(w)
-        self.last_vb = vb
+        self.update_image(len(self._entries), image, label)
 
     def update_image(self, index, image, label):
-        if index < len(self.image_items):
-            self.image_items[index].setImage(image)
-        else:
-            self.add_image(image, label)
+        # Only the thumbnail is kept
+        image = thumbnail(image, self.thumbnail_size)
+        self.set_entry(index, lambda: (image, label), label)
+        self.refresh([index])
+
+    def _create_tile(self):
+        tile = LibraryTile(self.grid.tile_size)
+        tile.image_item.sigActivated.connect(self.set_current_imageitem)
+        tile.view.sigRangeChangedManually.connect(self.propagate_axes)
+        self.image_items.append(tile.image_item)
+        self.views.append(tile.view)
+        return tile
+
+    def _populate(self, tile: LibraryTile, index: int):
+        loader, label, generation = self._entries[index]
+        key = (index, generation)
+        image = self._thumbnails.get(key)
+        tile.setThumbnail(index, image, label, self._levels, self._lut,
+                          placeholder="Loading..." if loader is not None else "No preview")
+        if image is None:
+            if loader is not None:
+                self._request(key, loader)
+            return
+
+        if self.current_image_item is None:
+            self.set_current_imageitem(tile.image_item)
+        if self.link_button.isChecked() and self.current_view is not None and tile.view is not self.current_view:
+            tile.view.setRange(rect=self.current_view.viewRect(), padding=0)
+
+    def _request(self, key, loader):
+        if key not in self._loading:
+            self._queue[key] = loader
+            self._queue.move_to_end(key)
+            self._load_next()
+
+    def _load_next(self):
+        visible = self.grid.visibleRange()
+        while self._queue and len(self._loading) < self.max_loading:
+            # Newest requests first; those of entries that have since scrolled out of view (or changed) are dropped,
+            # and made again if they're scrolled back into view
+            key, loader = self._queue.popitem()
+            index, generation = key
+            if index not in visible or self._entries[index][2] != generation:
+                continue
+            self._loading.add(key)
+            threads.QThreadFuture(self._load_thumbnail, loader, self.thumbnail_size,
+                                  callback_slot=partial(self._thumbnail_loaded, key),
+                                  except_slot=lambda ex, key=key: threads.invoke_in_main_thread(
+                                      self._thumbnail_failed, key),
+                                  showBusy=False).start()
+
+    @staticmethod
+    def _load_thumbnail(loader, size):
+        image, label = loader()
+        return thumbnail(image, size), label
+
+    def _thumbnail_loaded(self, key, image, label):
+        if sip.isdeleted(self):
+            return
+        self._loading.discard(key)
+        index, generation = key
+        if self._entries[index][2] == generation:
+            self._entries[index][1] = label
+            self._thumbnails.put(key, image)
+            tile = self.grid.tileAt(index)
+            if tile is not None:
+                self._populate(tile, index)
+        self._load_next()
+
+    def _thumbnail_failed(self, key):
+        if sip.isdeleted(self):
+            return
+        self._loading.discard(key)
+        index, generation = key
+        if self._entries[index][2] == generation:
+            # Don't retry it
+            self._entries[index][0] = None
+            tile = self.grid.tileAt(index)
+            if tile is not None:
+                self._populate(tile, index)
+        msg.logMessage(f"Could not load the preview of {self._entries[index][1]}.", level=msg.WARNING)
+        self._load_next()
 
 
 class LibraryView(QAbstractItemView):
@@ -265,8 +518,9 @@ class LibraryView(QAbstractItemView):
         super(LibraryView, self).__init__(parent)
         self._libraryWidget = LibraryWidget()
         self._libraryWidget.setParent(self)
-        self.scrollbar = self._libraryWidget.scroll_widget.verticalScrollBar()  # type: QScrollBar
-        self.scrollbar.valueChanged.connect(self.checkViewport)
+        self.scrollbar = self._libraryWidget.grid.verticalScrollBar()  # type: QScrollBar
+        self._libraryWidget.grid.sigVisibleRangeChanged.connect(self.checkViewport)
+        self._checking = False
         ###########self._indexToTabMap = OrderedDict()
 
         self.setLayout(QVBoxLayout())
@@ -285,25 +539,32 @@ class LibraryView(QAbstractItemView):
             # check if more runs need to be cached to fill the viewport
             self.checkViewport()
 
-    def checkViewport(self):
-        # if the scrollbar is near its max
-        while self.scrollbar.value() == self.scrollbar.maximum() and self.model().canFetchMore(QModelIndex()):
-            # Fetch more items from the model
-            self.model().fetchMore(QModelIndex())
+    def checkViewport(self, *args):
+        if self._checking or not self.model():
+            return
+        self._checking = True
+        try:
+            # Fetch more items from the model while there aren't enough to fill the viewport (and one more row)
+            grid = self._libraryWidget.grid
+            while (grid.visibleRange(clip=False).stop + grid.columns() > len(self._libraryWidget)
+                   and self.model().canFetchMore(QModelIndex())):
+                self.model().fetchMore(QModelIndex())
+        finally:
+            self._checking = False
 
     def dataChanged(self, topLeft: QModelIndex, bottomRight: QModelIndex, roles=None):
         """
         Re-implements the QAbstractItemView.dataChanged() slot.
 
-        When the data attached to the Qt.CheckStateRole has been changed, this will either render a Hint or remove the
-        Hint visualization.
+        The library's entries for the changed rows are (re)set to load their previews; only those in view are loaded,
+        in the background.
 
         Parameters
         ----------
         topLeft
-            For now, the only index we are concerned with, which corresponds to the item's check state changing.
+            The first row changed.
         bottomRight
-            (Unused right now)
+            The row after the last row changed.
         roles
             List of roles attached to the data state change.
 
@@ -312,19 +573,36 @@ class LibraryView(QAbstractItemView):
             roles = []
         if self.model():
             # empty list indicates ALL roles have changed (see documentation)
+            rows = []
             for row in range(topLeft.row(), bottomRight.row()):
                 if row >= self.model().rowCount(QModelIndex()) and self.model().canFetchMore(QModelIndex()):  # ensure that the item we retrieve is always cached
                     self.model().fetchMore(QModelIndex())
+                if row >= len(self.model()._cache):
+                    break
 
                 catalog = self.model()._cache[row]
                 if catalog:
-                    stream, field = guess_stream_field(catalog)
-                    data = np.squeeze(np.asarray(normalize_labels(getattr(catalog, stream).to_dask()[field])[self.slice].compute()))
-
-                    self._libraryWidget.update_image(row, data, f"({catalog.name})[{stream}]<{field}>")
+                    self._libraryWidget.set_entry(row, partial(self.load_preview, catalog, dict(self.slice)), catalog.name)
+                    rows.append(row)
+            self._libraryWidget.refresh(rows)
 
         super(LibraryView, self).dataChanged(topLeft, bottomRight, roles)
 
+    @staticmethod
+    def load_preview(catalog, slice: dict, size: int = 256):
+        """
+        Return the (image, label) previewing *catalog*: its first frame, downsampled (by averaging, before it's read)
+        to about *size* pixels on a side. This reads data, so it's called in the background.
+        """
+        stream, field = guess_stream_field(catalog)
+        data = da.asarray(normalize_labels(getattr(catalog, stream).to_dask()[field])[slice].squeeze().data)
+        while data.ndim > 2:
+            data = data[0]
+        factors = {axis: -(-data.shape[axis] // size) for axis in range(data.ndim)}
+        if any(factor > 1 for factor in factors.values()):
+            data = da.coarsen(np.mean, data, factors, trim_excess=True)
+        return np.asarray(data.compute()), f"({catalog.name})[{stream}]<{field}>"
+
     def horizontalOffset(self):
         return 0
 
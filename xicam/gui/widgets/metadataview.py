@@ -1,6 +1,7 @@
 from pyqtgraph.parametertree import ParameterTree
 from pyqtgraph.parametertree.parameterTypes import GroupParameter
 from collections import deque, OrderedDict, defaultdict
+from functools import partial
 from queue import Queue
 from qtpy.QtGui import QStandardItem, QStandardItemModel, QGuiApplication
 from qtpy.QtWidgets import QProgressBar, QWidget, QVBoxLayout, QTreeWidgetItem
@@ -13,6 +14,7 @@ import warnings
 from typing import Iterable, Sequence
 from databroker.core import BlueskyRun
 from xicam.core import msg, threads
+from xicam.core.data.batching import EventPageBatcher
 from xicam.gui.patches.PyQtGraph import CounterGroupParameter, LazyGroupParameter, from_dict
 
 
@@ -99,6 +101,10 @@ class MetadataWidget(QWidget):
         self.progress_bar.hide()
         self.progress_bar.setRange(0, 0)
 
+        # Live events are packed into event_pages, so each page is inserted as one item; pages can be flushed from the
+        # batcher's timer thread, so they're always consumed as events in the GUI thread (which also keeps them in order)
+        self._batcher = EventPageBatcher(partial(threads.invoke_as_event, self._consume))
+
         self.reset()
 
     def make_child(self, name, doc):
@@ -108,6 +114,9 @@ class MetadataWidget(QWidget):
         return child
 
     def doc_consumer(self, name, doc):
+        self._batcher(name, doc)
+
+    def _consume(self, name, doc):
         child = self.make_child(name, doc)
         self.insert_queue.put((name, child))
         if not self.insert_timer.isActive():
@@ -240,8 +249,12 @@ class MDVConusumer(MetadataView):
         super().__init__(*args, **kwargs)
         self._buffers = {}
         self._descriptor_map = {}
+        self._batcher = EventPageBatcher(partial(threads.invoke_as_event, self._consume))
 
     def doc_consumer(self, name, doc):
+        self._batcher(name, doc)
+
+    def _consume(self, name, doc):
         if name == "start":
             uid = doc["uid"]
             item = QStandardItem(doc["uid"])
@@ -250,7 +263,7 @@ class MDVConusumer(MetadataView):
             self.selectionmodel.setCurrentIndex(self.headermodel.indexFromItem(item), QItemSelectionModel.ClearAndSelect)
         elif name == "descriptor":
             uid = self._descriptor_map[doc["uid"]] = doc["run_start"]
-        elif name == "event":
+        elif name in ("event", "event_page"):
             uid = self._descriptor_map[doc["descriptor"]]
         elif name == "stop":
             uid = doc["run_start"]
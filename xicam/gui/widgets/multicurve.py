@@ -0,0 +1,249 @@
+import itertools
+import math
+
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph import functions as fn
+from qtpy.QtCore import QRectF
+from qtpy.QtGui import QPainter, QPainterPath
+
+
+def peak_decimate(x: np.ndarray, ys: np.ndarray, bin_width: float):
+    """
+    Reduce curves *ys* (one per row), sampled at increasing *x*, to their minimum and maximum in each bin of
+    *bin_width*; bins are aligned to multiples of *bin_width*, and empty bins are dropped.
+
+    Returns (x, ys) with two samples per bin (the bin's minimum, then its maximum) at the x of the bin's first sample.
+    """
+    bins = np.floor(x / bin_width)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    decimated = np.empty((ys.shape[0], 2 * len(starts)))
+    # fmin/fmax skip NaNs unless a whole bin is NaN
+    decimated[:, 0::2] = np.fmin.reduceat(ys, starts, axis=1)
+    decimated[:, 1::2] = np.fmax.reduceat(ys, starts, axis=1)
+    return np.repeat(x[starts], 2), decimated
+
+
+def _polyline(x: np.ndarray, y: np.ndarray):
+    """A QPolygonF through the points, or, if some aren't finite, a QPainterPath skipping them."""
+    if not np.isfinite(y).all():
+        return fn.arrayToQPath(x, y, connect="finite")
+    polygon = fn.create_qpolygonf(len(x))
+    points = fn.ndarray_from_qpolygonf(polygon)
+    points[:, 0] = x
+    points[:, 1] = y
+    return polygon
+
+
+class _CurveGroup(object):
+    """Curves sharing x, and the polylines last built to draw them."""
+
+    def __init__(self, x: np.ndarray, ys: np.ndarray, keys, log_mode=(False, False)):
+        self.x = x
+        self.ys = ys
+        self.keys = list(keys)
+        self.setLogMode(*log_mode)
+
+    def setLogMode(self, x_log: bool, y_log: bool):
+        x, ys = self.x, self.ys
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if x_log:
+                x = np.where(x > 0, np.log10(x), np.nan)
+            if y_log:
+                ys = np.where(ys > 0, np.log10(ys), np.nan)
+        finite = np.isfinite(x)
+        if not finite.all():
+            x, ys = x[finite], ys[:, finite]
+        if len(x) > 1 and x[0] > x[-1]:
+            x, ys = x[::-1], ys[:, ::-1]
+        self.display_x = x
+        self.display_ys = ys
+        self.increasing = bool(np.all(np.diff(x) >= 0))
+        self.bounds = [(np.nanmin(x), np.nanmax(x)) if x.size else (np.nan, np.nan),
+                       (np.nanmin(ys), np.nanmax(ys)) if np.isfinite(ys).any() else (np.nan, np.nan)]
+        self._cached = None  # (bin width, x range, polylines)
+
+    def polylines(self, x_min: float, x_max: float, bin_width: float, margin: float = 0.25):
+        """The polylines to draw x_min..x_max; bins of *bin_width* are used if there are over two samples per bin."""
+        x = self.display_x
+        if not self.increasing or not len(x):
+            if self._cached is None:
+                self._cached = None, (-np.inf, np.inf), [_polyline(x, y) for y in self.display_ys]
+            return self._cached[2]
+
+        lo, hi = np.searchsorted(x, [x_min, x_max])
+        if hi - lo <= 2 * (x_max - x_min) / bin_width:
+            bin_width = None
+        if self._cached is not None:
+            cached_width, (cached_min, cached_max), polylines = self._cached
+            if cached_width == bin_width and cached_min <= x_min and x_max <= cached_max:
+                return polylines
+
+        # Build a little beyond the view, so that panning doesn't rebuild on every step
+        width = x_max - x_min
+        lo, hi = np.searchsorted(x, [x_min - margin * width, x_max + margin * width])
+        # One sample beyond each end, so that lines leave the view
+        lo, hi = max(lo - 1, 0), min(hi + 1, len(x))
+        x, ys = x[lo:hi], self.display_ys[:, lo:hi]
+        if bin_width is not None:
+            x, ys = peak_decimate(x, ys, bin_width)
+        covered = (x_min - margin * width if lo > 0 else -np.inf, x_max + margin * width if hi < len(self.display_x)
+                   else np.inf)
+        self._cached = bin_width, covered, [_polyline(x, y) for y in ys]
+        return self._cached[2]
+
+
+class MultiCurveItem(pg.GraphicsObject):
+    """
+    Draws many curves in one item, each as a single polyline; restyling a curve only swaps its pen.
+
+    Curves are added in groups sharing x (e.g. the rows of a 2-D y). Where a group has more than two samples per
+    ``pixels_per_bin`` pixels in view, it's drawn as the minimum and maximum of each such bin, so peaks are kept. The bin
+    width is quantized (in quarter octaves) and bins are aligned to the data, so small zooms and pans reuse the curves
+    already built.
+    """
+
+    def __init__(self, pixels_per_bin: int = 2):
+        super(MultiCurveItem, self).__init__()
+        self.pixels_per_bin = pixels_per_bin
+        self._groups = {}
+        self._pens = {}  # key -> QPen
+        self._hidden = set()
+        self._log_mode = (False, False)
+        self._ids = itertools.count()
+        self._bounds = None
+
+    def __len__(self):
+        return len(self._pens)
+
+    def addCurves(self, x, ys, pens=None):
+        """Add a curve for each row of *ys* (or *ys* itself, if 1-D), sampled at *x*; return their keys."""
+        ys = np.atleast_2d(np.asarray(ys, dtype=float))
+        x = np.arange(ys.shape[1], dtype=float) if x is None else np.asarray(x, dtype=float).ravel()
+        group = next(self._ids)
+        keys = [(group, row) for row in range(len(ys))]
+        self._groups[group] = _CurveGroup(x, ys, keys, self._log_mode)
+        pens = list(pens or ())
+        for row, key in enumerate(keys):
+            self._pens[key] = fn.mkPen(pens[row]) if row < len(pens) else fn.mkPen()
+        self._boundsChanged()
+        return keys
+
+    def removeCurves(self, keys):
+        keys = set(keys)
+        for group_id, group in list(self._groups.items()):
+            rows = [row for row, key in enumerate(group.keys) if key not in keys]
+            if len(rows) == len(group.keys):
+                continue
+            if rows:
+                self._groups[group_id] = _CurveGroup(group.x, group.ys[rows], [group.keys[row] for row in rows],
+                                                     self._log_mode)
+            else:
+                del self._groups[group_id]
+        for key in keys:
+            self._pens.pop(key, None)
+            self._hidden.discard(key)
+        self._boundsChanged()
+
+    def pen(self, key):
+        return self._pens[key]
+
+    def setPen(self, key, pen):
+        pen = fn.mkPen(pen)
+        if pen != self._pens[key]:
+            self._pens[key] = pen
+            self.update()
+
+    def isCurveVisible(self, key):
+        return key not in self._hidden
+
+    def setCurveVisible(self, key, visible: bool):
+        if visible:
+            self._hidden.discard(key)
+        else:
+            self._hidden.add(key)
+        self.update()
+
+    def setLogMode(self, x_log: bool, y_log: bool):
+        if (x_log, y_log) == self._log_mode:
+            return
+        self._log_mode = (x_log, y_log)
+        for group in self._groups.values():
+            group.setLogMode(x_log, y_log)
+        self._boundsChanged()
+
+    def _boundsChanged(self):
+        self._bounds = None
+        self.prepareGeometryChange()
+        self.informViewBoundsChanged()
+        self.update()
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        bounds = [group.bounds[ax] for group in self._groups.values()
+                  if np.isfinite(group.bounds[ax]).all()]
+        if not bounds:
+            return None, None
+        return float(min(bound[0] for bound in bounds)), float(max(bound[1] for bound in bounds))
+
+    def boundingRect(self):
+        if self._bounds is None:
+            (x_min, x_max), (y_min, y_max) = self.dataBounds(0), self.dataBounds(1)
+            if x_min is None or y_min is None:
+                self._bounds = QRectF()
+            else:
+                self._bounds = QRectF(x_min, y_min, x_max - x_min, y_max - y_min)
+        return self._bounds
+
+    def paint(self, p, *args):
+        view = self.getViewBox()
+        if view is None or not self._groups:
+            return
+        (x_min, x_max), _ = view.viewRange()
+        pixel_width = view.viewPixelSize()[0]
+        # Quantize the bin width, so that it only changes with zooms of more than a quarter octave
+        bin_width = 2 ** (math.ceil(4 * math.log2(pixel_width * self.pixels_per_bin)) / 4) if pixel_width > 0 else 1
+
+        p.setRenderHint(QPainter.Antialiasing, bool(pg.getConfigOption("antialias")))
+        for group in self._groups.values():
+            for key, polyline in zip(group.keys, group.polylines(x_min, x_max, bin_width)):
+                if key in self._hidden:
+                    continue
+                p.setPen(self._pens[key])
+                if isinstance(polyline, QPainterPath):
+                    p.drawPath(polyline)
+                else:
+                    p.drawPolyline(polyline)
+
+
+class CurveHandle(object):
+    """
+    Some curves of a MultiCurveItem, styled together; stands in for a PlotDataItem where one is expected, e.g. as a
+    legend entry.
+    """
+
+    def __init__(self, item: MultiCurveItem, keys, name: str = None):
+        self.item = item
+        self.keys = list(keys)
+        self._name = name
+
+    def name(self):
+        return self._name
+
+    @property
+    def opts(self):
+        return {"pen": self.item.pen(self.keys[0])}
+
+    def setPen(self, *args, **kwargs):
+        pen = fn.mkPen(*args, **kwargs)
+        for key in self.keys:
+            self.item.setPen(key, pen)
+
+    def isVisible(self):
+        return any(self.item.isCurveVisible(key) for key in self.keys)
+
+    def setVisible(self, visible: bool):
+        for key in self.keys:
+            self.item.setCurveVisible(key, visible)
+
+    def remove(self):
+        self.item.removeCurves(self.keys)
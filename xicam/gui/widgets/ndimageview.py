@@ -1,4 +1,5 @@
 import itertools
+import uuid
 from functools import partial
 import copy
 from itertools import zip_longest
@@ -7,12 +8,16 @@ from pyqtgraph import ImageView, InfiniteLine, mkPen, ScatterPlotItem, ImageItem
 from qtpy.QtGui import QTransform, QPolygonF
 from qtpy.QtWidgets import QLabel, QErrorMessage, QSizePolicy, QPushButton, QHBoxLayout, QVBoxLayout, QComboBox, \
     QWidget, QMenu, QAction, QGridLayout, QFrame
-from qtpy.QtCore import Qt, Signal, Slot, QSize, QPointF, QRectF, QObjectCleanupHandler, QSignalBlocker
+from qtpy import sip
+from qtpy.QtCore import Qt, Signal, Slot, QSize, QPointF, QRectF, QObjectCleanupHandler, QSignalBlocker, QTimer
 from xarray import DataArray
+import dask
 import numpy as np
 from typing import Tuple, Dict
 from xicam.gui.widgets.ROI import BetterCrosshairROI
-from xicam.core import threads
+from xicam.core import msg, threads
+from xicam.core.data.cache import FrameCache
+from xicam.gui.widgets.imagestatistics import image_statistics
 
 # TODO: block efficient subsampling
 
@@ -31,6 +36,10 @@ class NDImageView(QWidget):
      |- SliceableGraphicsView
      |- SlieablePanel
     ...
+
+    Data stays lazy: each panel only asks for the slice it displays, and only when that slice changes. Slices of dask
+    arrays are computed in the background (those requested together, in one compute) and cached; when ``prefetch`` is
+    set, the neighboring slices along the dimension being scrubbed are then read ahead.
     """
 
     def __init__(self):
@@ -44,6 +53,16 @@ class NDImageView(QWidget):
         self.data = None
         self.histogram_subsampling_axes = None
         self.histogram_max_sample_size = 1e6
+        self.prefetch = True
+
+        self._token = None  # identifies the data in slice keys
+        self._slice_cache = FrameCache(max_bytes=256 * 2 ** 20)
+        self._pending = {}  # panel -> (key, lazy slice)
+        self._loading = False
+        self._prefetching = False
+        self._scrub_dims = []
+        self._reset_crosshairs = False
+        self._histogram = None
 
         self.graphics_view = SliceablePanel(parent=self)
         self.graphics_view.toggleHorizontalSlice(True)
@@ -60,6 +79,9 @@ class NDImageView(QWidget):
         self.setStyleSheet('NDImageView {background-color:black;}')
 
     def setData(self, data: DataArray, view_dims=None, slc=None, reset_crosshairs=True):
+        if data is not self.data:
+            self._token = uuid.uuid4().hex
+            self._slice_cache.clear()
         self.data = data
 
         full_slc = {dim: (data.coords[dim].max()-data.coords[dim].min())/2 for dim in data.dims}
@@ -75,10 +97,103 @@ class NDImageView(QWidget):
         self.graphics_view.setData(data, view_dims=view_dims, slc=full_slc)
 
         if reset_crosshairs:
-            self.resetCrosshairs()
+            # Once the slices being loaded are shown
+            self._reset_crosshairs = True
+            self._resetCrosshairsWhenLoaded()
 
         self.sigImageChanged.emit()
 
+    def sliceKey(self, view_dims, indices: Dict[str, int]):
+        return self._token, tuple(view_dims), tuple(sorted(indices.items()))
+
+    def loadSlice(self, panel: "SliceablePanel", key, data: DataArray):
+        """Show *data*, a (lazy) slice of the data, in *panel*, computing it in the background if it's lazy."""
+        panel.wanted_key = key
+        if data.chunks is None:
+            panel.showSlice(key, data)
+            return
+        cached = self._slice_cache.get(key)
+        if cached is not None:
+            panel.showSlice(key, cached)
+            return
+        # Collect the panels' requests, so that they're computed together
+        self._pending[panel] = key, data
+        QTimer.singleShot(0, self._loadPending)
+
+    def _loadPending(self):
+        if sip.isdeleted(self) or self._loading or not self._pending:
+            return
+        requests, self._pending = self._pending, {}
+        self._loading = True
+        threads.QThreadFuture(self._computeSlices, list(requests.items()),
+                              callback_slot=self._slicesLoaded,
+                              except_slot=self._slicesFailed,
+                              showBusy=False).start()
+
+    @staticmethod
+    def _computeSlices(requests):
+        slices = dask.compute(*(data for _, (_, data) in requests))
+        return [(panel, key, data) for (panel, (key, _)), data in zip(requests, slices)]
+
+    def _slicesLoaded(self, results):
+        if sip.isdeleted(self):
+            return
+        self._loading = False
+        for panel, key, data in results:
+            self._slice_cache.put(key, data)
+            # Only show the latest slice requested
+            if panel.wanted_key == key:
+                panel.showSlice(key, data)
+
+        if self._pending:
+            self._loadPending()
+        else:
+            self._prefetchNeighbors([panel for panel, _, _ in results])
+        self._resetCrosshairsWhenLoaded()
+
+    def _slicesFailed(self, ex):
+        if sip.isdeleted(self):
+            return
+        self._loading = False
+        self._pending.clear()
+        # So that these slices are requested again
+        for panel in self.findChildren(SliceablePanel):
+            if panel.wanted_key != panel.shown_key:
+                panel.wanted_key = panel.shown_key
+        msg.logMessage("Could not load a slice of the data.", level=msg.WARNING)
+
+    def _prefetchNeighbors(self, panels):
+        if not self.prefetch or self._prefetching:
+            return
+        requests = {}
+        for panel in panels:
+            for key, data in panel.neighbors(self._scrub_dims):
+                if data.chunks is not None and key not in self._slice_cache:
+                    requests[key] = data
+        if not requests:
+            return
+
+        self._prefetching = True
+        threads.QThreadFuture(lambda: list(zip(requests, dask.compute(*requests.values()))),
+                              callback_slot=self._neighborsLoaded,
+                              except_slot=self._neighborsFailed,
+                              showBusy=False).start()
+
+    def _neighborsLoaded(self, results):
+        if sip.isdeleted(self):
+            return
+        self._prefetching = False
+        for key, data in results:
+            self._slice_cache.put(key, data)
+
+    def _neighborsFailed(self, ex):
+        self._prefetching = False
+
+    def _resetCrosshairsWhenLoaded(self):
+        if self._reset_crosshairs and not self._pending and not self._loading:
+            self._reset_crosshairs = False
+            self.resetCrosshairs()
+
     def resetCrosshairs(self):
         for child in self.findChildren(SliceablePanel):
             child.resetCrosshair()
@@ -87,8 +202,13 @@ class NDImageView(QWidget):
         self.setData(self.data, view_dims, slc, reset_crosshairs=False)
 
     def updateSlicing(self, slice):
-        for widget in self.findChildren(SliceablePanel):
+        self._scrub_dims = list(slice)
+        panels = self.findChildren(SliceablePanel)
+        for widget in panels:
             widget.updateSlicing(slice)
+        if not self._pending and not self._loading:
+            # Every slice was cached; read ahead from here
+            self._prefetchNeighbors(panels)
 
     def setLookupTable(self, lut):
         self.lut = lut
@@ -100,6 +220,13 @@ class NDImageView(QWidget):
         for image_item in self.getImageItems():
             image_item.setLevels(levels)
 
+    def getLevels(self):
+        if self.levels is not None:
+            return self.levels
+        if self._histogram is not None:
+            return self._histogram[0][0], self._histogram[0][-1]
+        return 0, 1
+
     def getImageItems(self):
         return [child.image_item for child in self.findChildren(SliceableGraphicsView)]
 
@@ -125,35 +252,25 @@ class NDImageView(QWidget):
                 This method is also used when automatically computing levels.
                 """
         if self.data is None:
-            return None,
-
-        subsample_axes = self.histogram_subsampling_axes
-        if not subsample_axes:
-            subsample_axes = self.data.dims
-
-        # slices = {axis:slice() for axis in self.data.dims}
-
-        while subsample_axes:
-            required_subsampling_factor = max(np.prod(self.data.shape) / self.histogram_max_sample_size, 1.)
-            subsampling_per_axis = int(np.round(required_subsampling_factor ** (1 / len(subsample_axes))))
-
-            for axis in subsample_axes:
-                # if this axis can't be subsampled (not wide enough)
-                if subsampling_per_axis>self.data.shape[self.data.dims.index(axis)]:
-                    subsample_axes.remove(axis)
-                    continue
-            if subsample_axes:
-                break
-        else:
-            raise ValueError('A suitable subsampling over the given axes could not be found.')
-
-        chunking = {axis:slice(None, None, subsampling_per_axis) for axis in subsample_axes}
-        print('chunking:', chunking)
-        subsampled_data = self.data[chunking]
-
-        hist = np.histogram(subsampled_data)
-
-        return hist[1][:-1], hist[0]
+            return None, None
+
+        axes = None
+        if self.histogram_subsampling_axes:
+            axes = [self.data.dims.index(axis) for axis in self.histogram_subsampling_axes]
+
+        # Computed in the background; the histogram widget is asked to update again once it's ready
+        hist = image_statistics.histogram(self.data,
+                                          callback=self._histogramReady,
+                                          max_sample_size=self.histogram_max_sample_size,
+                                          axes=axes)
+        if hist is None:
+            return None, None
+        return hist
+
+    def _histogramReady(self, hist):
+        if hist is not None and hist[0] is not None and not sip.isdeleted(self):
+            self._histogram = hist
+            self.lut_widget.item.imageChanged()
 
     def channels(self):
         ...
@@ -180,6 +297,8 @@ class SliceablePanel(QWidget):
         self.data = None
         self.slice = {}
         self.view_dims = None
+        self.wanted_key = None  # the key of the slice requested last
+        self.shown_key = None
 
         self.layout().addWidget(self.full_view, 1, 0, 1, 1)
 
@@ -203,6 +322,7 @@ class SliceablePanel(QWidget):
         parent = self.parent()
         while not isinstance(parent, NDImageView):
             parent = parent.parent()
+        self._viewer = parent
 
         self.sigSlicingChanged.connect(parent.updateSlicing)
         self.full_view.sigCrosshairMoved.connect(self._sliceChangedByCrosshair)
@@ -218,16 +338,43 @@ class SliceablePanel(QWidget):
         slc = {key: value for key, value in zip(view_dims, pos)}  # TODO: unify crosshair interface (by passing values through sigs)
         self.sigSlicingChanged.emit(slc)
 
+    def sliceIndices(self) -> Dict[str, int]:
+        """The index (nearest to the slicing position) into each dim that isn't viewed."""
+        return {dim: int(self.data.indexes[dim].get_indexer([np.asarray(value).item()], method='nearest')[0])
+                for dim, value in self.slice.items() if dim not in self.view_dims and dim in self.data.dims}
+
     @property
     def sliced_data(self):
-        slc = {key: value for key, value in self.slice.items() if key not in self.view_dims}
-        data = self.data.sel(**slc, method='nearest').transpose(*self.view_dims)
-        return data
+        # Lazy, if the data is
+        return self.data.isel(self.sliceIndices()).transpose(*self.view_dims)
+
+    def neighbors(self, dims):
+        """The keys and (lazy) slices one step away from the current slice along each of *dims* that isn't viewed."""
+        indices = self.sliceIndices()
+        for dim in dims:
+            if dim not in indices:
+                continue
+            for index in (indices[dim] - 1, indices[dim] + 1):
+                if 0 <= index < self.data.sizes[dim]:
+                    neighbor = dict(indices, **{dim: index})
+                    yield (self._viewer.sliceKey(self.view_dims, neighbor),
+                           self.data.isel(neighbor).transpose(*self.view_dims))
+
+    def requestSlice(self):
+        indices = self.sliceIndices()
+        key = self._viewer.sliceKey(self.view_dims, indices)
+        if key == self.wanted_key:
+            return  # this slice is already shown, or being loaded
+        self._viewer.loadSlice(self, key, self.data.isel(indices).transpose(*self.view_dims))
+
+    def showSlice(self, key, data: DataArray):
+        self.shown_key = key
+        self.full_view.setData(data)
 
     def updateSlicing(self, slc):
         self.slice.update(slc)
 
-        self.full_view.setData(self.sliced_data)
+        self.requestSlice()
 
         self.updateCrosshair(slc)
 
@@ -249,7 +396,7 @@ class SliceablePanel(QWidget):
         self.view_dims = view_dims
         self.slice = slc
 
-        self.full_view.setData(self.sliced_data)
+        self.requestSlice()
 
         if self.right_view:
             self.right_view.setData(data, view_dims=self.getViewDims('right'), slc=slc)
@@ -0,0 +1,166 @@
+import math
+
+import numpy as np
+from pyqtgraph import ImageItem, Point
+from qtpy.QtCore import QRectF, QPointF
+
+from xicam.core import threads
+
+
+def downsample2(image: np.ndarray) -> np.ndarray:
+    """Halve both (leading) image dimensions by averaging 2x2 blocks; an odd last row/column is dropped."""
+    h, w = image.shape[0] // 2, image.shape[1] // 2
+    blocks = image[: h * 2, : w * 2].reshape((h, 2, w, 2) + image.shape[2:])
+    downsampled = blocks.mean(axis=(1, 3))
+    if image.dtype.kind in "uib":
+        downsampled = np.rint(downsampled)
+    return downsampled.astype(image.dtype, copy=False)
+
+
+class ImagePyramid(object):
+    """
+    Successively 2x-downsampled copies of an image, down to ``min_size`` pixels along the shorter side.
+
+    Level n holds the image downsampled by 2**n; only level 0 (the image itself) exists until ``build`` is called.
+    """
+
+    def __init__(self, image: np.ndarray, min_size: int = 256):
+        self.levels = [image]
+        self.min_size = min_size
+
+    def build(self):
+        while min(self.levels[-1].shape[:2]) // 2 >= self.min_size:
+            self.levels.append(downsample2(self.levels[-1]))
+        return self
+
+    def level(self, downsample: int):
+        """Return (factor, array) for the built level closest to, but not coarser than, *downsample*."""
+        index = min(max(0, int(math.log2(max(downsample, 1)))), len(self.levels) - 1)
+        return 2 ** index, self.levels[index]
+
+
+class PyramidImageItem(ImageItem):
+    """
+    An ImageItem that renders only what's visible, at the resolution it's displayed at.
+
+    Each new image gets an ImagePyramid built on a background thread. On render, the visible region is snapped out to
+    a grid of ``tileSize``-pixel tiles at the pyramid level matching the current zoom, and only those tiles are
+    converted to a QImage; until the pyramid is ready, the full image is strided instead. The tiles are re-rendered
+    only when the zoom level or the set of visible tiles changes, so render cost scales with screen pixels rather than
+    detector pixels.
+    """
+
+    tileSize = 256
+
+    def __init__(self, *args, **kwargs):
+        self.pyramid = None
+        self._tileKey = None
+        self._renderRect = None
+        super(PyramidImageItem, self).__init__(*args, **kwargs)
+
+    def setImage(self, image=None, autoLevels=None, **kargs):
+        if image is not None and image is not self.image:
+            image = np.asarray(image)
+            self._tileKey = None
+            if image.ndim == 2 and min(image.shape) >= 2 * self.tileSize:
+                self.pyramid = ImagePyramid(image, min_size=self.tileSize)
+                threads.QThreadFuture(self.pyramid.build, callback_slot=self._pyramidBuilt, showBusy=False).start()
+            else:
+                self.pyramid = None
+        super(PyramidImageItem, self).setImage(image, autoLevels, **kargs)
+
+    def _pyramidBuilt(self, pyramid):
+        # Re-render at the proper level if the pyramid is still current
+        if pyramid is self.pyramid:
+            self._tileKey = None
+            self._renderRequired = True
+            self.update()
+
+    def _screenScale(self):
+        o = self.mapToDevice(QPointF(0, 0))
+        x = self.mapToDevice(QPointF(1, 0))
+        y = self.mapToDevice(QPointF(0, 1))
+        if o is None or x is None or y is None:
+            return None
+        return min(Point(x - o).length(), Point(y - o).length())
+
+    def _tiles(self):
+        """Return (key, downsample, level array or None, (x0, x1, y0, y1) in level pixels) for the visible tiles."""
+        view = self.getViewBox()
+        if self.pyramid is None or view is None:
+            return None
+        scale = self._screenScale()
+        # Not viewRect(): ImageItem never invalidates its cache of it
+        visible = self.mapRectFromView(view.viewRect())
+        if not scale or visible is None:
+            return None
+
+        downsample = 2 ** max(0, int(math.floor(math.log2(1 / scale)))) if scale < 1 else 1
+        factor, level = self.pyramid.level(downsample)
+        if factor != downsample:
+            # The level isn't built yet; stride the full-resolution image instead
+            level = None
+
+        width, height = self.width() // downsample, self.height() // downsample
+        tile = self.tileSize
+        x0 = max(0, int(visible.left() / downsample) // tile * tile)
+        y0 = max(0, int(visible.top() / downsample) // tile * tile)
+        x1 = min(width, -(-int(math.ceil(visible.right() / downsample)) // tile) * tile)
+        y1 = min(height, -(-int(math.ceil(visible.bottom() / downsample)) // tile) * tile)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return (downsample, level is not None, x0, x1, y0, y1), downsample, level, (x0, x1, y0, y1)
+
+    def viewTransformChanged(self):
+        if self.pyramid is None:
+            return super(PyramidImageItem, self).viewTransformChanged()
+        tiles = self._tiles()
+        if tiles is None or tiles[0] != self._tileKey:
+            self._renderRequired = True
+            self.update()
+
+    def render(self):
+        tiles = self._tiles()
+        if tiles is None:
+            self._renderRect = None
+            self._tileKey = None
+            return super(PyramidImageItem, self).render()
+
+        key, downsample, level, (x0, x1, y0, y1) = tiles
+        if level is None:
+            level = self.image[::downsample, ::downsample]
+        if self.axisOrder == "col-major":
+            region = level[x0:x1, y0:y1]
+        else:
+            region = level[y0:y1, x0:x1]
+
+        # Render just the region by presenting it as the image for the duration of the base class's render
+        image, autoDownsample = self.image, self.autoDownsample
+        nanState = self._imageHasNans, self._imageNanLocations
+        self.image, self.autoDownsample = region, False
+        self._imageHasNans, self._imageNanLocations = None, None
+        try:
+            super(PyramidImageItem, self).render()
+        finally:
+            self.image, self.autoDownsample = image, autoDownsample
+            self._imageHasNans, self._imageNanLocations = nanState
+
+        self._renderRect = QRectF(x0 * downsample, y0 * downsample, (x1 - x0) * downsample, (y1 - y0) * downsample)
+        self._tileKey = key
+
+    def paint(self, p, *args):
+        if self.image is None:
+            return
+        if self._renderRequired:
+            self.render()
+            if self._unrenderable:
+                return
+        if self._renderRect is None:
+            return super(PyramidImageItem, self).paint(p, *args)
+
+        if self.paintMode is not None:
+            p.setCompositionMode(self.paintMode)
+        p.drawImage(self._renderRect, self.qimage)
+        if self.border is not None:
+            p.setPen(self.border)
+            p.drawRect(self.boundingRect())
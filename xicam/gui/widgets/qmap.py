@@ -0,0 +1,99 @@
+"""
+Per-pixel q, chi and 2-theta maps of a detector, for cursor readouts; built in the background and cached per geometry
+and image shape, with a per-pixel calculation to fall back on until they're ready.
+"""
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+import numpy as np
+from camsaxs.remesh_bbox import alpha, phi, q_from_angles
+from pyFAI.geometry import Geometry
+
+from xicam.core import msg, threads
+from xicam.gui.widgets.remesh import _q_from_geometry, geometry_key
+
+
+def pixel_q(geometry: Geometry, row: int, col: int):
+    """
+    Return (q, chi, 2-theta) of one pixel, computed directly.
+
+    q is the (q_parallel, q_z) vector of camsaxs' ``q_from_geometry`` (transmission); angles are in radians.
+    """
+    d1, d2 = np.array([row]), np.array([col])
+    r_z, r_y, r_x = geometry.calc_pos_zyx(d1=d1, d2=d2)
+    q_x, q_y, q_z = q_from_angles(phi(r_x, r_y, r_z), alpha(r_x, r_y, r_z), geometry.wavelength) * 1e-10
+    return np.array([q_x[0], q_y[0]]), float(geometry.chi(d1, d2)[0]), float(geometry.tth(d1, d2)[0])
+
+
+class QMap(object):
+    """The q vector, chi and 2-theta of every pixel of an image of one shape, with one geometry."""
+
+    def __init__(self, shape: Tuple[int, int], geometry: Geometry):
+        self.shape = tuple(shape)
+        self.q = _q_from_geometry(self.shape, geometry, False, 0)
+        d1, d2 = np.indices(self.shape)
+        self.chi = geometry.chi(d1, d2)
+        self.two_theta = geometry.tth(d1, d2)
+
+    def at(self, row: int, col: int):
+        return self.q[row, col], float(self.chi[row, col]), float(self.two_theta[row, col])
+
+
+class QMapCache(object):
+    """
+    An LRU cache of QMaps, keyed by geometry (by value) and image shape.
+
+    ``lookup`` never blocks on building a map: on a miss it starts building one on a background thread, and meanwhile
+    computes the requested pixel directly.
+    """
+
+    def __init__(self, max_maps: int = 4):
+        self.max_maps = max_maps
+        self._maps = OrderedDict()
+        self._building = set()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._maps)
+
+    def get(self, shape: Tuple[int, int], geometry: Geometry):
+        """Return the QMap for *shape* and *geometry* if it's built; otherwise start building it and return None."""
+        key = (geometry_key(geometry), tuple(shape))
+        with self._lock:
+            q_map = self._maps.get(key)
+            if q_map is not None:
+                self._maps.move_to_end(key)
+                return q_map
+            if key not in self._building:
+                self._building.add(key)
+                threads.QThreadFuture(QMap, tuple(shape), geometry,
+                                      callback_slot=lambda q_map: self._store(key, q_map),
+                                      except_slot=lambda *_: self._failed(key),
+                                      showBusy=False).start()
+        return None
+
+    def lookup(self, shape: Tuple[int, int], geometry: Geometry, row: int, col: int):
+        """Return (q, chi, 2-theta) of one pixel; see ``pixel_q``."""
+        q_map = self.get(shape, geometry)
+        if q_map is not None:
+            return q_map.at(row, col)
+        return pixel_q(geometry, row, col)
+
+    def clear(self):
+        with self._lock:
+            self._maps.clear()
+
+    def _store(self, key, q_map):
+        with self._lock:
+            self._building.discard(key)
+            self._maps[key] = q_map
+            while len(self._maps) > self.max_maps:
+                self._maps.popitem(last=False)
+
+    def _failed(self, key):
+        # The key stays in _building, so that the build isn't retried on every lookup
+        msg.logMessage("Could not build the q map for a geometry; falling back to per-pixel q.", level=msg.WARNING)
+
+
+q_maps = QMapCache()
@@ -0,0 +1,137 @@
+"""
+Cached Ewald-sphere remeshing: the resampling of detector pixels onto a regular (q_parallel, q_z) grid depends only on
+the geometry and the image shape, so it's built once as a sparse matrix and applied to every frame.
+"""
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+import numpy as np
+import scipy.sparse
+from camsaxs import remesh_bbox
+from pyFAI.geometry import Geometry
+
+# camsaxs' q_from_geometry is memoized by geometry identity (which doesn't notice in-place changes); use it unwrapped
+_q_from_geometry = getattr(remesh_bbox.q_from_geometry, "__wrapped__", remesh_bbox.q_from_geometry)
+
+
+def geometry_key(geometry: Geometry):
+    """A hashable key of everything about *geometry* that affects the pixel -> q mapping."""
+    detector = geometry.detector
+    config = geometry.get_config() if hasattr(geometry, "get_config") else geometry.getPyFAI()
+    return (tuple(sorted((name, repr(value)) for name, value in config.items())),
+            geometry.wavelength,
+            type(detector).__name__,
+            tuple(detector.shape or ()))
+
+
+def _bin_fractions(position: np.ndarray, start: float, width: float, bins: int):
+    """
+    Split a box of +/- one bin ``width`` around each position over the (up to 3) bins it overlaps.
+
+    Return (bin indices, overlap fractions), each of shape (3, pixels); bins out of range have a fraction of 0.
+    """
+    lower = (position - start) / width - 1
+    first = np.floor(lower)
+    index = first[None, :] + np.arange(3)[:, None]
+    overlap = np.clip(np.minimum(lower + 2, index + 1) - np.maximum(lower, index), 0, 1) / 2
+    overlap[(index < 0) | (index >= bins)] = 0
+    return np.clip(index, 0, bins - 1).astype(np.int64), overlap
+
+
+class RemeshMap(object):
+    """
+    The remeshing of images of one shape, with one geometry, onto a regular (q_h, q_v) grid.
+
+    As in camsaxs' ``remesh``, each pixel is spread over the bins its box (+/- one bin around its q) overlaps, in
+    proportion to the overlap, and each bin averages the pixels spread onto it. The pixel -> bin fractions are held as
+    a sparse matrix, so remeshing a frame is one sparse matrix-vector product.
+    """
+
+    def __init__(self, shape: Tuple[int, int], geometry: Geometry, reflection: bool, alphai: float):
+        self.input_shape = tuple(shape)
+        q = _q_from_geometry(self.input_shape, geometry, reflection, alphai)
+        q_h = q[:, :, 0].ravel()
+        q_v = q[:, :, 1].ravel()
+
+        range_h = q_h.min(), q_h.max()
+        range_v = q_v.min(), q_v.max()
+        bin_size = min((range_h[1] - range_h[0]) / shape[1], (range_v[1] - range_v[0]) / shape[0])
+        bins = int((range_h[1] - range_h[0]) / bin_size), int((range_v[1] - range_v[0]) / bin_size)
+        width_h = (range_h[1] - range_h[0]) / bins[0]
+        width_v = (range_v[1] - range_v[0]) / bins[1]
+
+        index_h, fraction_h = _bin_fractions(q_h, range_h[0], width_h, bins[0])
+        index_v, fraction_v = _bin_fractions(q_v, range_v[0], width_v, bins[1])
+
+        # Each pixel contributes to the 3x3 bins around it; outputs are laid out (q_v, q_h)
+        rows = (index_v[:, None, :] * bins[0] + index_h[None, :, :]).ravel()
+        weights = (fraction_v[:, None, :] * fraction_h[None, :, :]).ravel()
+        columns = np.broadcast_to(np.arange(q_h.size), (3, 3, q_h.size)).ravel()
+        keep = weights > 0
+        self.matrix = scipy.sparse.csr_matrix((weights[keep], (rows[keep], columns[keep])),
+                                              shape=(bins[0] * bins[1], q_h.size))
+        self.matrix.sum_duplicates()
+        self.counts = np.asarray(self.matrix.sum(axis=1)).ravel()
+
+        self.output_shape = bins[1], bins[0]
+        self.q_h, self.q_v = np.meshgrid(range_h[0] + (np.arange(bins[0]) + 0.5) * width_h,
+                                         range_v[0] + (np.arange(bins[1]) + 0.5) * width_v)
+
+    @property
+    def nbytes(self):
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+
+    def apply(self, image: np.ndarray) -> np.ndarray:
+        image = np.asarray(image, dtype=np.float64)
+        if image.shape != self.input_shape:
+            raise ValueError(f"This remesh map is for images of shape {self.input_shape}, not {image.shape}.")
+        sums = self.matrix @ image.ravel()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            remeshed = np.where(self.counts > 0, sums / self.counts, 0)
+        return remeshed.reshape(self.output_shape)
+
+
+class RemeshMapCache(object):
+    """An LRU cache of RemeshMaps, keyed by geometry (by value), image shape, reflection and incidence angle."""
+
+    def __init__(self, max_maps: int = 4):
+        self.max_maps = max_maps
+        self._maps = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._maps)
+
+    def get(self, shape: Tuple[int, int], geometry: Geometry, reflection: bool, alphai: float) -> RemeshMap:
+        key = (geometry_key(geometry), tuple(shape), bool(reflection), float(alphai))
+        with self._lock:
+            remesh_map = self._maps.get(key)
+            if remesh_map is not None:
+                self._maps.move_to_end(key)
+                return remesh_map
+
+        remesh_map = RemeshMap(shape, geometry, reflection, alphai)
+        with self._lock:
+            self._maps[key] = remesh_map
+            while len(self._maps) > self.max_maps:
+                self._maps.popitem(last=False)
+        return remesh_map
+
+    def clear(self):
+        with self._lock:
+            self._maps.clear()
+
+
+remesh_maps = RemeshMapCache()
+
+
+def remesh(image: np.ndarray, geometry: Geometry, reflection: bool, alphai: float):
+    """
+    Remesh *image* onto a regular (q_h, q_v) grid, reusing the cached map for its geometry and shape.
+
+    A drop-in for camsaxs' ``remesh`` with the default bins and ranges; returns (image, q_h, q_v).
+    """
+    image = np.asarray(image)
+    remesh_map = remesh_maps.get(image.shape, geometry, reflection, alphai)
+    return remesh_map.apply(image), remesh_map.q_h, remesh_map.q_v